@@ -0,0 +1,244 @@
+"""
+Offline benchmarks of the RAG workflow and the ingestion scripts.
+
+The compiled create_workflow() graph runs against the local stand-ins of
+benchmarks/stand_ins.py, so no API key or network access is needed. Latencies of
+the stand-ins are configurable to model faster or slower services.
+
+    python benchmarks/run_benchmarks.py --concurrency 1 4 16 --output results.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "src"), str(ROOT / "scripts"), str(ROOT / "benchmarks")]
+WORKDIR = tempfile.mkdtemp(prefix="rag-benchmarks-")
+
+# Configuration is read at import time, so it is set before importing the project
+os.environ.setdefault("GOOGLE_API_KEY", "offline")
+os.environ.setdefault("LLM_MODEL", "offline")
+os.environ.update({
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "TRACE_PATH": os.path.join(WORKDIR, "traces.jsonl"),
+    "EMBEDDING_CACHE_PATH": os.path.join(WORKDIR, "embeddings.sqlite"),
+    "STOCK_STORE_DIR": os.path.join(WORKDIR, "stock_store"),
+    "DATA_PATH": os.path.join(WORKDIR, "stock_csv"),
+    "NEWS_HTTP_CACHE_PATH": os.path.join(WORKDIR, "news_http_cache"),
+})
+
+import stand_ins  # noqa: E402
+from utils import build_stock_store  # noqa: E402
+
+QUESTIONS = [
+    "What was the closing price of SFBT?",
+    "What is the average closing price of BIAT?",
+    "What is the latest volume of POULINA?",
+    "What dividend did SFBT propose?",
+    "How did the TUNINDEX close this week?",
+    "Which company announced a capital increase on the BVMT?",
+    "What happened on the Tunis stock exchange with DELICE shares?",
+    "Why did SAH shares trade heavily this session?",
+    "What is the weather in Tunis today?",
+    "Who won the last football world cup?",
+    "Explain what an index fund is",
+    "What is the population of Tunisia?",
+]
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0}
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+    }
+
+
+def run_question(app, question):
+    """
+    Run one question through the workflow.
+
+    Returns:
+        result (dict): Latency, time to first token, LLM calls, context tokens, loops and route of the request.
+    """
+    started = time.perf_counter()
+    first_token = None
+    trace, state = {}, {}
+    for mode, output in app.stream({"question": question}, stream_mode=["updates", "custom"]):
+        if mode == "custom":
+            if "token" in output and first_token is None:
+                first_token = time.perf_counter() - started
+            trace = output.get("trace", trace)
+        else:
+            for value in output.values():
+                state.update(value or {})
+    return {
+        "question": question,
+        "seconds": time.perf_counter() - started,
+        "first_token_seconds": first_token,
+        "llm_calls": trace.get("llm_calls", state.get("budget", {}).get("llm_calls", 0)),
+        "prompt_tokens": trace.get("prompt_tokens", 0),
+        "context_tokens": trace.get("context_tokens", 0),
+        "context_tokens_saved": trace.get("context_tokens_saved", 0),
+        "loops": state.get("budget", {}).get("loops", 0),
+        "datasource": state.get("datasource"),
+        "budget_exhausted": state.get("budget_exhausted", ""),
+    }
+
+
+def benchmark_workflow(app, concurrency, repeat):
+    """
+    Run the question corpus repeat times with concurrency requests in flight.
+
+    Returns:
+        summary (dict): Latency distributions, LLM calls and loops per question, and throughput.
+    """
+    questions = QUESTIONS * repeat
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(partial(run_question, app), questions))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "seconds": elapsed,
+        "throughput": len(results) / elapsed,
+        "latency": percentiles([r["seconds"] for r in results]),
+        "first_token": percentiles([r["first_token_seconds"] for r in results if r["first_token_seconds"]]),
+        "llm_calls_per_question": float(np.mean([r["llm_calls"] for r in results])),
+        "prompt_tokens_per_question": float(np.mean([r["prompt_tokens"] for r in results])),
+        "context_tokens_per_question": float(np.mean([r["context_tokens"] for r in results])),
+        "context_tokens_saved_per_question": float(np.mean([r["context_tokens_saved"] for r in results])),
+        "loops_per_question": float(np.mean([r["loops"] for r in results])),
+        "budget_exhausted": sum(1 for r in results if r["budget_exhausted"]),
+        "routes": {s: sum(1 for r in results if r["datasource"] == s) for s in {r["datasource"] for r in results}},
+    }
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_articles(directory, count):
+    """Write synthetic article pages and serve them on a local port."""
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        Path(directory, f"article-{i}.html").write_text(stand_ins.article_html(i), encoding="utf-8")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark_ingestion(stock_dir, articles):
+    """
+    Time the stock chunking paths on the synthetic CSVs and process_urls on local
+    article pages, cold and then from the HTTP cache.
+    """
+    import stock_data_preprocessing
+    import news_scraper
+
+    results = {}
+    started = time.perf_counter()
+    splits = stock_data_preprocessing.process_stock_data(stock_dir)
+    results["process_stock_data"] = {"seconds": time.perf_counter() - started, "chunks": len(splits)}
+
+    started = time.perf_counter()
+    chunks = list(stock_data_preprocessing.stream_stock_chunks(stock_dir))
+    results["stream_stock_chunks"] = {"seconds": time.perf_counter() - started, "chunks": len(chunks)}
+
+    server = serve_articles(os.path.join(WORKDIR, "articles"), articles)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    listed = [
+        {"title": f"Article {i}", "link": f"{base}/article-{i}.html", "date": "01/01/2024", "source": "news"}
+        for i in range(articles)
+    ]
+    for run in ("process_urls_cold", "process_urls_cached"):
+        started = time.perf_counter()
+        docs = news_scraper.process_urls(listed)
+        results[run] = {"seconds": time.perf_counter() - started, "documents": len(docs)}
+    server.shutdown()
+    return results
+
+
+def print_report(report):
+    print(f"\nStand-in latencies: {report['latencies']}")
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'TTFT p50':>9} {'LLM calls':>10} {'ctx tokens':>11} {'saved':>6} {'loops':>6}")
+    for run in report["workflow"]:
+        print(
+            f"{run['concurrency']:>11} {run['throughput']:>8.2f} {run['latency']['p50']:>8.3f} "
+            f"{run['latency']['p95']:>8.3f} {run['first_token']['p50']:>9.3f} "
+            f"{run['llm_calls_per_question']:>10.2f} {run['context_tokens_per_question']:>11.0f} "
+            f"{run['context_tokens_saved_per_question']:>6.0f} {run['loops_per_question']:>6.2f}"
+        )
+    print(f"Routes: {report['workflow'][0]['routes']}")
+    for name, result in report.get("ingestion", {}).items():
+        count = result.get("chunks", result.get("documents"))
+        print(f"{name:>22}: {result['seconds']:.3f}s for {count} items")
+
+
+def main(concurrency, repeat, llm_latency, embed_latency, vector_latency, search_latency,
+         ingestion, articles, output, verbose):
+    stock_dir = os.environ["DATA_PATH"]
+    stand_ins.write_stock_csvs(stock_dir)
+    build_stock_store(stock_dir, os.environ["STOCK_STORE_DIR"])
+
+    import rag_system
+
+    stand_ins.install(
+        rag_system,
+        llm_latency=llm_latency,
+        embed_latency=embed_latency,
+        vector_latency=vector_latency,
+        search_latency=search_latency,
+    )
+    app = rag_system.create_workflow()
+    report = {
+        "latencies": {"llm": llm_latency, "embeddings": embed_latency,
+                      "vector_store": vector_latency, "web_search": search_latency},
+        "workflow": [],
+    }
+    # Node output is silenced unless asked for, it would drown the report
+    with nullcontext() if verbose else redirect_stdout(io.StringIO()):
+        run_question(app, QUESTIONS[0])
+        for n in concurrency:
+            report["workflow"].append(benchmark_workflow(app, n, repeat))
+        if ingestion:
+            report["ingestion"] = benchmark_ingestion(stock_dir, articles)
+
+    print_report(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the RAG workflow and ingestion.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Requests in flight per run")
+    parser.add_argument("--repeat", type=int, default=2, help="Passes over the question corpus per run")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per stand-in LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Seconds per stand-in embedding call")
+    parser.add_argument("--vector-latency", type=float, default=0.02, help="Seconds per stand-in vector query")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Seconds per stand-in web search")
+    parser.add_argument("--no-ingestion", dest="ingestion", action="store_false", help="Skip the ingestion benchmarks")
+    parser.add_argument("--articles", type=int, default=50, help="Synthetic articles for process_urls")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Show the node output")
+    args = parser.parse_args()
+    main(args.concurrency, args.repeat, args.llm_latency, args.embed_latency, args.vector_latency,
+         args.search_latency, args.ingestion, args.articles, args.output, args.verbose)
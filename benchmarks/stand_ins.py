@@ -0,0 +1,318 @@
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from datetime import date, timedelta
+from typing import Callable
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+
+WORD = re.compile(r"\w+", re.UNICODE)
+TICKERS = ["SFBT", "BIAT", "POULINA", "DELICE", "SAH"]
+NEWS_TOPICS = [
+    "{ticker} reports a rise in its annual revenue and proposes a higher dividend.",
+    "The TUNINDEX closed the week up, driven by {ticker} and the banking sector.",
+    "{ticker} announces a capital increase approved by the general assembly.",
+    "The Tunis stock exchange (BVMT) saw heavy trading on {ticker} shares this session.",
+]
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    Deterministic chat model with a configurable latency.
+
+    The responder maps the last message of the rendered prompt, which holds the chain
+    inputs, to the reply text. Replies carry token usage counted in words over the
+    whole prompt, so traces see realistic numbers.
+    """
+
+    responder: Callable[[str], str]
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self):
+        return "local-stand-in"
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(m.content) for m in messages)
+        reply = self.responder(str(messages[-1].content))
+        usage = {
+            "input_tokens": len(WORD.findall(prompt)),
+            "output_tokens": len(WORD.findall(reply)),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return reply, usage
+
+    def _generate(self, messages, stop=None, run_manager: CallbackManagerForLLMRun = None, **kwargs):
+        time.sleep(self.latency)
+        reply, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _stream(self, messages, stop=None, run_manager: CallbackManagerForLLMRun = None, **kwargs):
+        # Half of the latency before the first token, the rest spread over the tokens
+        time.sleep(self.latency / 2)
+        reply, usage = self._reply(messages)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency / 2 / len(words))
+            token = word if i == len(words) - 1 else word + " "
+            chunk = AIMessageChunk(content=token, usage_metadata=usage if i == 0 else None)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=chunk)
+
+
+def _field(prompt, name):
+    # Prompts of graph_nodes render their inputs as "Name: value" lines
+    match = re.search(rf"{name}\s*:\s*(.+)", prompt, re.IGNORECASE)
+    return match.group(1).strip() if match else ""
+
+
+def _overlap(question, text):
+    question_words = {w for w in WORD.findall(question.lower()) if len(w) > 3}
+    return len(question_words & set(WORD.findall(text.lower())))
+
+
+def route_responder(prompt):
+    question = prompt.lower()
+    if any(word in question for word in ("price", "prix", "volume", "average", "closing")):
+        return json.dumps({"datasource": "stock_data"})
+    if any(word in question for word in ("bvmt", "tunindex", "bourse", "dividend", "shares", "stock")):
+        return json.dumps({"datasource": "vectorstore"})
+    return json.dumps({"datasource": "web_search"})
+
+
+def document_grade_responder(prompt):
+    # The retrieved document is the relevant one when it shares a word with the question
+    question = _field(prompt, "User question")
+    return json.dumps({"binary_score": "yes" if _overlap(question, prompt.replace(question, "")) else "no"})
+
+
+def stock_query_responder(prompt):
+    ticker = next((t for t in TICKERS if t.lower() in prompt.lower()), TICKERS[0])
+    aggregation = "mean" if "average" in prompt.lower() else "last"
+    return json.dumps({"ticker": ticker, "field": "close", "aggregation": aggregation,
+                       "start_date": None, "end_date": None})
+
+
+def generation_responder(prompt):
+    context = _field(prompt, "Context")
+    sentence = context.split(".")[0] if context else "no information was found"
+    return f"Based on the retrieved information, {sentence.strip()}."
+
+
+def rewrite_responder(prompt):
+    return _field(prompt, "Here is the initial question") or "Tunisian stock market news"
+
+
+def structured_chain(chain, schema, responder, latency):
+    """Keep the prompt of a graph_nodes chain and answer with a stand-in structured model."""
+    model = LocalChatModel(responder=responder, latency=latency)
+    return chain.first | model | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+def text_chain(chain, responder, latency):
+    """Keep the prompt and output parser of a graph_nodes chain around a stand-in model."""
+    return chain.first | LocalChatModel(responder=responder, latency=latency) | chain.last
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings, so questions and texts sharing words are close."""
+
+    def __init__(self, size=256, latency=0.01):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+class InMemoryVectorStore:
+    """Brute-force vector store with the query and write methods the graph and BulkWriter use."""
+
+    def __init__(self, embeddings, latency=0.02):
+        self.embeddings = embeddings
+        self.latency = latency
+        self._vectors, self._documents, self._ids = [], [], []
+        self._lock = threading.Lock()
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embeddings.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self, texts, vectors, metadatas=None, ids=None):
+        texts = list(texts)
+        ids = ids or [hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] for text in texts]
+        with self._lock:
+            for i, (text, vector) in enumerate(zip(texts, vectors)):
+                self._vectors.append(vector)
+                self._documents.append(
+                    Document(id=ids[i], page_content=text, metadata=(metadatas or [{}] * len(texts))[i]))
+                self._ids.append(ids[i])
+        return list(ids)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        from utils import matches_filter
+
+        time.sleep(self.latency)
+        with self._lock:
+            if not self._vectors:
+                return []
+            scores = np.asarray(self._vectors, dtype=np.float32) @ np.asarray(embedding, dtype=np.float32)
+            documents = list(self._documents)
+        if filter:
+            scores = np.where([matches_filter(d.metadata, filter) for d in documents], scores, -np.inf)
+        top = [i for i in np.argsort(-scores)[:k] if np.isfinite(scores[i])]
+        return [(documents[i], float(scores[i])) for i in top]
+
+
+class CannedWebSearch:
+    """Stand-in for TavilySearchResults returning fixed results after a delay."""
+
+    def __init__(self, max_results=3, latency=0.3):
+        self.max_results = max_results
+        self.latency = latency
+
+    def invoke(self, inputs):
+        time.sleep(self.latency)
+        query = inputs["query"] if isinstance(inputs, dict) else inputs
+        return [
+            {"url": f"https://example.com/search/{i}", "content": f"Result {i} about {query}: canned web content."}
+            for i in range(self.max_results)
+        ]
+
+
+def write_stock_csvs(directory, tickers=TICKERS, days=750):
+    """
+    Write one synthetic daily stock CSV per ticker, in the raw data column layout.
+
+    Returns:
+        paths: CSV paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    dates = [date(2021, 1, 1) + timedelta(days=i) for i in range(days)]
+    paths = []
+    for ticker in tickers:
+        close = 10 + np.cumsum(rng.normal(0, 0.1, days))
+        df = pd.DataFrame({
+            "stock": ticker,
+            "date": [d.strftime("%d/%m/%Y") for d in dates],
+            "ouverture": close + rng.normal(0, 0.05, days),
+            "plus_haut": close + 0.2,
+            "plus_bas": close - 0.2,
+            "cloture": close,
+            "volume": rng.integers(1_000, 100_000, days).astype(float),
+        })
+        path = os.path.join(directory, f"{ticker}_history.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def news_documents(count=40):
+    """Synthetic news articles as vector store documents, one every week back from today."""
+    from utils import date_range_metadata
+
+    return [
+        Document(
+            page_content=NEWS_TOPICS[i % len(NEWS_TOPICS)].format(ticker=TICKERS[i % len(TICKERS)]),
+            metadata={
+                "link": f"https://example.com/news/{i}",
+                "source": "news",
+                "title": f"Article {i}",
+                "tickers": [TICKERS[i % len(TICKERS)]],
+                **date_range_metadata(date.today() - timedelta(weeks=i)),
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def article_html(i):
+    """Synthetic article page with the content block the news scraper extracts."""
+    body = " ".join(NEWS_TOPICS[j % len(NEWS_TOPICS)].format(ticker=TICKERS[(i + j) % len(TICKERS)]) for j in range(20))
+    return f"<html><body><div class='header'>menu</div><div class='inarticle txtbig'><p>{body}</p></div></body></html>"
+
+
+def install(rag_system, llm_latency=0.05, embed_latency=0.01, vector_latency=0.02, search_latency=0.3):
+    """
+    Replace the LLM chains, embeddings, vector store and web search used by rag_system
+    with the local stand-ins. The stock store is used as is, and the BM25 index is a
+    temporary one over the same synthetic news.
+
+    Args:
+        rag_system: The imported rag_system module.
+
+    Returns:
+        vector_store (InMemoryVectorStore): Store of the retrieve node, filled with synthetic news.
+    """
+    import graph_nodes
+    import graph_nodes.docs_grader as docs_grader
+    from graph_nodes import local_router
+    from graph_nodes.answer_grader import GradeAnswer
+    from graph_nodes.docs_grader import GradeDocuments
+    from graph_nodes.generation_grader import GradeGeneration
+    from graph_nodes.hallucination_grader import GradeHallucinations
+    from graph_nodes.query_router import RouteQuery
+    from graph_nodes.stock_query_parser import StockQuery
+    from utils import BM25Index, WebSearch
+
+    grounded = lambda prompt: json.dumps({"binary_score": "yes"})
+    replacements = {
+        "question_router": structured_chain(graph_nodes.question_router, RouteQuery, route_responder, llm_latency),
+        "retrieval_grader": structured_chain(
+            graph_nodes.retrieval_grader, GradeDocuments, document_grade_responder, llm_latency),
+        "question_rewriter": text_chain(graph_nodes.question_rewriter, rewrite_responder, llm_latency),
+        "generation_chain": text_chain(graph_nodes.generation_chain, generation_responder, llm_latency),
+        "hallucination_grader_agent": structured_chain(
+            graph_nodes.hallucination_grader_agent, GradeHallucinations, grounded, llm_latency),
+        "answer_grader_agent": structured_chain(graph_nodes.answer_grader_agent, GradeAnswer, grounded, llm_latency),
+        "generation_grader_agent": structured_chain(
+            graph_nodes.generation_grader_agent, GradeGeneration,
+            lambda prompt: json.dumps({"grounded": "yes", "answers_question": "yes"}), llm_latency),
+        "stock_query_parser": structured_chain(
+            graph_nodes.stock_query_parser, StockQuery, stock_query_responder, llm_latency),
+    }
+    for name, chain in replacements.items():
+        setattr(rag_system, name, chain)
+    docs_grader.retrieval_grader = replacements["retrieval_grader"]
+
+    embeddings = HashEmbeddings(latency=embed_latency)
+    vector_store = InMemoryVectorStore(embeddings, latency=vector_latency)
+    vector_store.add_texts(
+        [d.page_content for d in news_documents()], metadatas=[d.metadata for d in news_documents()])
+    rag_system.get_embeddings = lambda task_type: embeddings
+    rag_system.get_vector_store = lambda index_name: vector_store
+    bm25_index = BM25Index(tempfile.mkdtemp(prefix="bm25-"))
+    bm25_index.add(vector_store._ids, [d.page_content for d in vector_store._documents],
+                   [d.metadata for d in vector_store._documents])
+    rag_system.get_bm25_index = lambda index_name: bm25_index
+    rag_system.record_query_time = lambda index_name, seconds: None
+    local_router.get_embeddings = lambda task_type: embeddings
+    web_search = WebSearch(CannedWebSearch(latency=search_latency))
+    rag_system.get_web_search = lambda: web_search
+    return vector_store
@@ -1,6 +1,11 @@
-from .docs_grader import retrieval_grader
+from .docs_grader import retrieval_grader, grade_documents_batch
 from .query_rewriter import question_rewriter
 from .generator import generation_chain
 from .query_router import question_router
 from .hallucination_grader import hallucination_grader_agent
 from .answer_grader import answer_grader_agent
+from .stock_query_parser import stock_query_parser
+from .generation_grader import generation_grader_agent
+from .local_router import local_question_router
+from .prerank import document_preranker, record_samples
+from .registry import get_chain, registered_chains
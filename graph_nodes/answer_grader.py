@@ -1,14 +1,10 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
-import dotenv
-import os
+from .llm import get_chat_model
+from .registry import register, LazyChain
 
 
-dotenv.load_dotenv()
-model_name=os.environ.get("LLM_MODEL")
-
 class GradeAnswer(BaseModel):
     """Binary score to assess answer addresses question."""
 
@@ -17,10 +13,6 @@ class GradeAnswer(BaseModel):
     )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-structured_llm_grader = llm.with_structured_output(GradeAnswer)
-
 # Prompt
 system = """You are a grader assessing whether an answer addresses / resolves a question \n 
      Give a binary score 'yes' or 'no'. Yes' means that the answer resolves the question."""
@@ -31,4 +23,11 @@ answer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-answer_grader_agent = answer_prompt | structured_llm_grader
\ No newline at end of file
+
+@register("answer_grader_agent")
+def build_answer_grader():
+    # LLM with function call
+    return answer_prompt | get_chat_model().with_structured_output(GradeAnswer)
+
+
+answer_grader_agent = LazyChain("answer_grader_agent")
@@ -1,15 +1,14 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 
-from dotenv import load_dotenv
-import os
+import random
+import threading
+import time
 
+from .llm import get_chat_model, grader_api_key
+from .registry import register, LazyChain
 
-load_dotenv()
-
-model_name= os.getenv("LLM_MODEL")
-api_key= os.getenv("GOOGLE_API_KEY_1")
 
 class GradeDocuments(BaseModel):
         """ Binary score for relevence check for retrived documents"""
@@ -18,12 +17,6 @@ class GradeDocuments(BaseModel):
             description="Documents are relevent to the question, 'yes' or 'no' "
         )
 
-chat_model = ChatGoogleGenerativeAI(model=model_name, temperature=0, google_api_key=api_key )
-
-
-
-# Apply structured output to the model
-structured_llm_grader = chat_model.with_structured_output(GradeDocuments)
 
 system= """You are a grader assessing relevance of a retrieved document to a user question. \n 
     If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
@@ -37,4 +30,97 @@ grade_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-retrieval_grader = grade_prompt | structured_llm_grader
\ No newline at end of file
+
+@register("retrieval_grader")
+def build_retrieval_grader():
+    # LLM with function call
+    return grade_prompt | get_chat_model(grader_api_key).with_structured_output(GradeDocuments)
+
+
+retrieval_grader = LazyChain("retrieval_grader")
+
+# Client errors worth another attempt: request timeout and rate limit
+RETRYABLE_STATUS = {408, 429}
+
+
+def _is_retryable(error):
+    """Rate limits, timeouts, server and network errors are retried, other client errors are not."""
+    while error is not None:
+        status = getattr(error, "status_code", None) or getattr(error, "code", None)
+        if isinstance(status, int):
+            return status in RETRYABLE_STATUS or status >= 500
+        error = error.__cause__
+    return True
+
+def _grade_with_retry(inputs, retries, backoff, on_graded=None, may_retry=None):
+    """
+    Grade one document, retrying failed calls with exponential backoff and jitter and
+    falling back to 'no'. Non-retryable errors are not retried.
+    """
+    started = time.perf_counter()
+    grade = "no"
+    attempts = 0
+    for attempt in range(retries + 1):
+        if attempt and may_retry and not may_retry():
+            break
+        attempts += 1
+        try:
+            grade = retrieval_grader.invoke(inputs).binary_score
+            break
+        except Exception as e:
+            print(f"Grading attempt {attempt + 1} failed: {e}")
+            if not _is_retryable(e):
+                break
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    if on_graded:
+        on_graded(grade)
+    return grade, time.perf_counter() - started, attempts
+
+
+def grade_documents_batch(question, documents, max_concurrency=5, retries=1, backoff=0.5, on_graded=None,
+                          max_calls=None):
+    """
+    Grade documents concurrently with the retrieval grader.
+
+    Args:
+        question (str): User question.
+        documents (list[Document]): Documents to grade.
+        max_concurrency (int): Maximum number of grader calls in flight.
+        retries (int): Extra attempts for a document whose grading call failed.
+        backoff (float): Seconds before the first retry, doubled for each later one.
+        on_graded (callable): Optional callback called with each grade as soon as it is known.
+        max_calls (int): Optional cap on grader calls, retries included. Every document
+            gets its first attempt, retries share what is left.
+
+    Returns:
+        grades (list[str]): 'yes' or 'no' for each document, in input order.
+        stats (dict): Wall-clock time, summed per-call time, time saved and grader calls made.
+    """
+    started = time.perf_counter()
+    spare_calls = [None if max_calls is None else max_calls - len(documents)]
+    lock = threading.Lock()
+
+    def may_retry():
+        with lock:
+            if spare_calls[0] is None:
+                return True
+            if spare_calls[0] <= 0:
+                return False
+            spare_calls[0] -= 1
+            return True
+
+    grader = RunnableLambda(lambda inputs: _grade_with_retry(inputs, retries, backoff, on_graded, may_retry))
+    results = grader.batch(
+        [{"question": question, "document": d} for d in documents],
+        config={"max_concurrency": max_concurrency},
+    )
+    wall_time = time.perf_counter() - started
+    sequential_time = sum(elapsed for _, elapsed, _ in results)
+    stats = {
+        "wall_time": wall_time,
+        "sequential_time": sequential_time,
+        "time_saved": max(sequential_time - wall_time, 0.0),
+        "llm_calls": sum(attempts for _, _, attempts in results),
+    }
+    return [grade for grade, _, _ in results], stats
@@ -0,0 +1,39 @@
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from .llm import get_chat_model
+from .registry import register, LazyChain
+
+
+class GradeGeneration(BaseModel):
+    """Binary scores for grounding and answer relevance of a generation."""
+
+    grounded: str = Field(
+        description="Answer is grounded in the facts, 'yes' or 'no'"
+    )
+    answers_question: str = Field(
+        description="Answer addresses the question, 'yes' or 'no'"
+    )
+
+
+# Prompt
+system = """You are a grader assessing an LLM generation against a set of retrieved facts and a user question. \n 
+     Give two binary scores 'yes' or 'no'. \n
+     grounded: 'yes' means that the answer is grounded in / supported by the set of facts. \n
+     answers_question: 'yes' means that the answer resolves the question."""
+
+generation_grade_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Set of facts: \n\n {documents} \n\n User question: {question} \n\n LLM generation: {generation}"),
+    ]
+)
+
+
+@register("generation_grader_agent")
+def build_generation_grader():
+    # LLM with function call
+    return generation_grade_prompt | get_chat_model().with_structured_output(GradeGeneration)
+
+
+generation_grader_agent = LazyChain("generation_grader_agent")
@@ -1,11 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
-import dotenv
-import os
 
-dotenv.load_dotenv()
-model_name = os.environ.get("LLM_MODEL")
+from .llm import get_chat_model
+from .registry import register, LazyChain
 
 
 prompt = ChatPromptTemplate.from_messages(
@@ -28,6 +25,10 @@ prompt = ChatPromptTemplate.from_messages(
 ]
 )
 
-generative_llm= ChatGoogleGenerativeAI(model=model_name, temperature=0)
 
-generation_chain= prompt | generative_llm | StrOutputParser()
\ No newline at end of file
+@register("generation_chain")
+def build_generation_chain():
+    return prompt | get_chat_model() | StrOutputParser()
+
+
+generation_chain = LazyChain("generation_chain")
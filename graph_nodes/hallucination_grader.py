@@ -1,14 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
-import dotenv
-import os
-
-
-dotenv.load_dotenv()
-model_name= os.getenv("LLM_MODEL")
+from .llm import get_chat_model
+from .registry import register, LazyChain
 
 
 class GradeHallucinations(BaseModel):
@@ -19,10 +13,6 @@ class GradeHallucinations(BaseModel):
     )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-structured_llm_grader = llm.with_structured_output(GradeHallucinations)
-
 # Prompt
 system = """You are a grader assessing whether an LLM generation is grounded in / supported by a set of retrieved facts. \n 
      Give a binary score 'yes' or 'no'. 'Yes' means that the answer is grounded in / supported by the set of facts. """
@@ -34,4 +24,11 @@ hallucination_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-hallucination_grader_agent = hallucination_prompt | structured_llm_grader
+
+@register("hallucination_grader_agent")
+def build_hallucination_grader():
+    # LLM with function call
+    return hallucination_prompt | get_chat_model().with_structured_output(GradeHallucinations)
+
+
+hallucination_grader_agent = LazyChain("hallucination_grader_agent")
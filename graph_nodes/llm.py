@@ -0,0 +1,29 @@
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+
+
+# Configuration of every graph_nodes chain, loaded once
+load_dotenv()
+model_name = os.getenv("LLM_MODEL")
+grader_api_key = os.getenv("GOOGLE_API_KEY_1")
+# Local decisions taken without an LLM call
+local_router_threshold = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.8"))
+prerank_accept_threshold = float(os.getenv("PRERANK_ACCEPT_THRESHOLD", "0.85"))
+prerank_reject_threshold = float(os.getenv("PRERANK_REJECT_THRESHOLD", "0.15"))
+prerank_samples_path = os.getenv("PRERANK_SAMPLES_PATH", "")
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(api_key=None):
+    """
+    Return the process-wide chat model client shared by the graph_nodes chains.
+
+    Args:
+        api_key (str): Google API key of the client, defaults to GOOGLE_API_KEY.
+            Chains using another key get their own client.
+    """
+    # Imported here, the Google client library is slow to import and only needed for a first LLM call
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model_name, temperature=0, google_api_key=api_key)
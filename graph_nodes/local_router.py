@@ -0,0 +1,134 @@
+import re
+import time
+import numpy as np
+
+from utils import get_embeddings, known_tickers, find_tickers
+from .llm import local_router_threshold
+
+
+# Terms only used about the Tunis stock exchange, enough to answer from the news index
+TUNISIAN_MARKET_KEYWORDS = re.compile(
+    r"\b(bvmt|tunindex|tunindex20|bourse de tunis|tunis stock exchange|cmf|dinars?|tnd)\b",
+    re.IGNORECASE,
+)
+TUNISIA = re.compile(r"\b(tunis|tunisi\w*)\b", re.IGNORECASE)
+# Market words of any exchange, which alone could be a question about Wall Street
+MARKET_KEYWORDS = re.compile(
+    r"\b(bourse|action(s|naires?)?|dividendes?|capitalisation|s[ée]ance|cotation|stock market|"
+    r"shares?|stocks?|dividends?|market)\b",
+    re.IGNORECASE,
+)
+# Confidence of a generic market question, below the threshold so the LLM router decides
+generic_market_confidence = 0.6
+NUMERIC_KEYWORDS = re.compile(
+    r"\b(price|prix|cours|closing|opening|close|open|cl[oô]ture|ouverture|volume|average|moyenne|"
+    r"highest|lowest|maximum|minimum|max|min|total|change|variation|performance)\b",
+    re.IGNORECASE,
+)
+YEAR = re.compile(r"\b(20[1-2]\d)\b")
+DATE = re.compile(r"\b\d{1,2}/\d{1,2}/(20[1-2]\d)\b")
+
+# Example questions per datasource, used as centroids of the embedding classifier
+PROTOTYPES = {
+    "stock_data": [
+        "What was the closing price of SFBT yesterday?",
+        "Average closing price of BIAT in 2023",
+        "Highest price of Poulina last month",
+        "Trading volume of Attijari Bank on 12/03/2024",
+    ],
+    "vectorstore": [
+        "Latest news about the Tunis stock exchange",
+        "How did the TUNINDEX perform this week?",
+        "Why did Tunisian bank shares fall?",
+        "What are the recent announcements of listed Tunisian companies?",
+    ],
+    "web_search": [
+        "What is the weather in Paris?",
+        "Who won the football match last night?",
+        "Explain how neural networks work",
+        "What is the population of Japan?",
+    ],
+}
+
+
+class LocalRouter:
+    """
+    Rule and embedding based router used before the LLM router.
+
+    Tickers, company names and Tunisian market terms give high-confidence decisions.
+    Market words that could be about any exchange are left to the LLM router. Otherwise
+    the query embedding is compared with the centroids of example questions per datasource.
+    """
+
+    def __init__(self, threshold=local_router_threshold):
+        self.threshold = threshold
+        self._centroids = None
+
+    def warm_up(self):
+        """Embed the example questions and load the known tickers ahead of the first question."""
+        known_tickers()
+        if self._centroids is None:
+            embeddings = get_embeddings("RETRIEVAL_QUERY")
+            centroids = {}
+            for datasource, questions in PROTOTYPES.items():
+                vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                centroid = vectors.mean(axis=0)
+                centroids[datasource] = centroid / np.linalg.norm(centroid)
+            self._centroids = centroids
+
+    def _classify_embedding(self, embedding):
+        self.warm_up()
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        datasources = list(self._centroids)
+        similarities = np.array([self._centroids[d] @ query for d in datasources])
+        # Softmax over scaled similarities turns the margin between classes into a confidence
+        weights = np.exp((similarities - similarities.max()) * 20)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        return datasources[best], float(probabilities[best])
+
+    def route(self, question, embedding=None):
+        """
+        Route a question without calling an LLM.
+
+        Args:
+            question (str): User question.
+            embedding (list[float]): Query embedding of the question, when available.
+
+        Returns:
+            datasource (str | None): 'stock_data', 'vectorstore' or 'web_search', or None
+                when the confidence is below the threshold.
+            confidence (float): Confidence of the decision.
+        """
+        started = time.perf_counter()
+        tickers = find_tickers(question, known_tickers())
+        numeric = bool(NUMERIC_KEYWORDS.search(question))
+        in_range = bool(YEAR.search(question) or DATE.search(question))
+
+        generic_market = bool(MARKET_KEYWORDS.search(question))
+        if tickers and numeric:
+            datasource, confidence, reason = "stock_data", 0.95, f"tickers {tickers} with a numeric question"
+        elif tickers or TUNISIAN_MARKET_KEYWORDS.search(question) or (generic_market and TUNISIA.search(question)):
+            datasource, confidence, reason = "vectorstore", 0.9, "ticker or Tunisian market keyword"
+        elif generic_market:
+            datasource, confidence, reason = "vectorstore", generic_market_confidence, "generic market keyword"
+        elif embedding is not None:
+            datasource, confidence = self._classify_embedding(embedding)
+            reason = "embedding classifier"
+            if in_range and datasource != "web_search":
+                confidence = min(1.0, confidence + 0.1)
+        else:
+            datasource, confidence, reason = None, 0.0, "no signal"
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        decided = datasource if confidence >= self.threshold else None
+        print(
+            f"---LOCAL ROUTER: {datasource} ({reason}), confidence {confidence:.2f}, "
+            f"{'accepted' if decided else 'LLM fallback'}, {elapsed_ms:.1f}ms---"
+        )
+        return decided, confidence
+
+
+local_question_router = LocalRouter()
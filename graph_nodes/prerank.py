@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+import numpy as np
+
+from utils import find_tickers, known_tickers, register_counter
+from utils.bm25_index import tokenize
+from utils.query_filters import date_key, parse_date_range
+from .llm import prerank_accept_threshold, prerank_reject_threshold, prerank_samples_path
+
+
+STOPWORDS = frozenset(
+    "a an and are at be by did do does for from had has have how in is it its of on or the this to was "
+    "were what when which who why will with au aux avec ce ces dans de des du en est et la le les pour "
+    "quel quelle quels que qui sur un une".split()
+)
+# Hand-set logistic weights; the accept and reject thresholds are what calibrate_thresholds fits
+WEIGHTS = {
+    "bias": -4.0,
+    "dense": 4.0,
+    "coverage": 4.0,
+    "bm25": 0.5,
+    "ticker_match": 2.0,
+    "ticker_mismatch": -3.0,
+    "date_overlap": 1.0,
+    "date_disjoint": -2.0,
+}
+
+# Pre-ranker decisions since the process started
+prerank_counts = {"accepted": 0, "rejected": 0, "graded": 0}
+register_counter(
+    "prerank_documents", "Documents accepted, rejected or left to the LLM grader by the pre-ranker.",
+    "decision", prerank_counts,
+)
+_samples_lock = threading.Lock()
+
+
+def _stems(text):
+    # Six-letter prefixes are a cheap stemmer for English and French ("proposes", "propose")
+    return {token[:6] for token in tokenize(text) if token not in STOPWORDS and len(token) > 1}
+
+
+class DocumentPreRanker:
+    """
+    CPU-only relevance model used before the LLM retrieval grader.
+
+    Each document gets a relevance probability from its retrieval scores and lexical
+    features shared with the question: term coverage, tickers and dates. Documents
+    above accept_threshold are kept and below reject_threshold dropped without a
+    grader call; only the borderline ones are sent to the LLM.
+    """
+
+    def __init__(self, accept_threshold=prerank_accept_threshold, reject_threshold=prerank_reject_threshold):
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+
+    def features(self, question, document, scores=None):
+        """
+        Features of a question and document pair.
+
+        Args:
+            question (str): User question.
+            document (Document): Retrieved document.
+            scores (dict): Retrieval scores of the document, 'dense' cosine similarity
+                and 'bm25' score, either may be missing.
+
+        Returns:
+            dict: Feature values keyed like WEIGHTS.
+        """
+        scores = scores or {}
+        question_terms = _stems(question)
+        document_terms = _stems(document.page_content)
+        coverage = len(question_terms & document_terms) / len(question_terms) if question_terms else 0.0
+
+        features = {
+            "bias": 1.0,
+            # Without a dense score the document sits halfway, so the lexical features decide
+            "dense": scores.get("dense") if scores.get("dense") is not None else 0.5,
+            "coverage": coverage,
+            "bm25": float(np.log1p(scores.get("bm25") or 0.0)),
+            "ticker_match": 0.0,
+            "ticker_mismatch": 0.0,
+            "date_overlap": 0.0,
+            "date_disjoint": 0.0,
+        }
+
+        question_tickers = set(find_tickers(question, known_tickers()))
+        if question_tickers:
+            document_tickers = set(document.metadata.get("tickers") or find_tickers(document.page_content, known_tickers()))
+            if question_tickers & document_tickers:
+                features["ticker_match"] = 1.0
+            elif document_tickers:
+                features["ticker_mismatch"] = 1.0
+
+        dates = parse_date_range(question)
+        start, end = document.metadata.get("start"), document.metadata.get("end")
+        if dates and start and end:
+            overlaps = start <= date_key(dates[1]) and end >= date_key(dates[0])
+            features["date_overlap" if overlaps else "date_disjoint"] = 1.0
+        return features
+
+    def probability(self, features):
+        z = sum(WEIGHTS[name] * value for name, value in features.items())
+        return float(1 / (1 + np.exp(-z)))
+
+    def rank(self, question, documents, scores=None):
+        """
+        Sort documents into accepted, rejected and borderline ones.
+
+        Args:
+            question (str): User question.
+            documents (list[Document]): Retrieved documents.
+            scores (list[dict]): Retrieval scores per document, in the same order.
+
+        Returns:
+            verdicts (list[str]): 'yes', 'no' or 'grade' for each document, in input order.
+            probabilities (list[float]): Relevance probability of each document.
+            features (list[dict]): Features of each document.
+        """
+        started = time.perf_counter()
+        scores = scores if scores and len(scores) == len(documents) else [None] * len(documents)
+        features = [self.features(question, d, s) for d, s in zip(documents, scores)]
+        probabilities = [self.probability(f) for f in features]
+        verdicts = [
+            "yes" if p >= self.accept_threshold else "no" if p <= self.reject_threshold else "grade"
+            for p in probabilities
+        ]
+
+        accepted, rejected = verdicts.count("yes"), verdicts.count("no")
+        prerank_counts["accepted"] += accepted
+        prerank_counts["rejected"] += rejected
+        prerank_counts["graded"] += verdicts.count("grade")
+        print(
+            f"---PRE-RANK: {accepted} accepted, {rejected} rejected, {verdicts.count('grade')} borderline, "
+            f"{accepted + rejected} grader calls avoided, {(time.perf_counter() - started) * 1000:.1f}ms---"
+        )
+        return verdicts, probabilities, features
+
+
+def record_samples(question, probabilities, features, grades):
+    """
+    Append LLM-graded documents with their pre-ranker probability to PRERANK_SAMPLES_PATH,
+    the samples calibrate_thresholds learns from. Does nothing when the path is unset.
+    """
+    if not prerank_samples_path:
+        return
+    with _samples_lock, open(prerank_samples_path, "a", encoding="utf-8") as f:
+        for probability, feature, grade in zip(probabilities, features, grades):
+            f.write(json.dumps({
+                "question": question, "probability": probability, "features": feature, "grade": grade,
+            }) + "\n")
+
+
+def calibrate_thresholds(samples, precision=0.95, min_samples=20):
+    """
+    Pick the widest thresholds whose decisions agree with the LLM grader often enough.
+
+    Args:
+        samples (list[dict]): Samples with the 'probability' and 'grade' of a document.
+        precision (float): Required share of 'yes' grades above the accept threshold,
+            and of 'no' grades below the reject threshold.
+        min_samples (int): Minimum number of samples on each side of a threshold.
+
+    Returns:
+        accept_threshold (float | None): Lowest such accept threshold, None if none qualifies.
+        reject_threshold (float | None): Highest such reject threshold, None if none qualifies.
+    """
+    ranked = sorted((s["probability"], s["grade"] == "yes") for s in samples)
+    accept_threshold, reject_threshold = None, None
+
+    relevant = 0
+    for i in range(len(ranked) - 1, -1, -1):
+        relevant += ranked[i][1]
+        count = len(ranked) - i
+        if count >= min_samples and relevant / count >= precision:
+            accept_threshold = ranked[i][0]
+
+    irrelevant = 0
+    for i, (probability, is_relevant) in enumerate(ranked):
+        irrelevant += not is_relevant
+        if i + 1 >= min_samples and irrelevant / (i + 1) >= precision:
+            reject_threshold = probability
+
+    if accept_threshold is not None and reject_threshold is not None and reject_threshold >= accept_threshold:
+        reject_threshold = None
+    return accept_threshold, reject_threshold
+
+
+document_preranker = DocumentPreRanker()
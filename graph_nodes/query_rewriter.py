@@ -1,14 +1,9 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-import dotenv
-import os
 
+from .llm import get_chat_model
+from .registry import register, LazyChain
 
-dotenv.load_dotenv()
-model_name = os.environ.get("LLM_MODEL")
-
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
 
 system = """You a question re-writer that converts an input question to a better version that is optimized \n 
      for vectorstore retrieval. Look at the input and try to reason about the underlying semantic intent / meaning and then re-write the question. \n
@@ -23,4 +18,10 @@ re_write_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-question_rewriter = re_write_prompt | llm | StrOutputParser()
\ No newline at end of file
+
+@register("question_rewriter")
+def build_question_rewriter():
+    return re_write_prompt | get_chat_model() | StrOutputParser()
+
+
+question_rewriter = LazyChain("question_rewriter")
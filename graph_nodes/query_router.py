@@ -1,33 +1,29 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI 
 from pydantic import BaseModel, Field
-
 from typing import Literal
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-model_name = os.getenv('LLM_MODEL')
+from .llm import get_chat_model
+from .registry import register, LazyChain
+
 
 # Data model
 class RouteQuery(BaseModel):
     """Route a user query to the most relevant datasource."""
 
-    datasource: Literal["vectorstore", "web_search"] = Field(
+    datasource: Literal["vectorstore", "web_search", "stock_data"] = Field(
         ...,
-        description="Given a user question choose to route it to web search or a vectorstore.",
+        description="Given a user question choose to route it to web search, a vectorstore or the stock price data.",
     )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-structured_llm_router = llm.with_structured_output(RouteQuery)
-
 # Prompt
-system = """You are an expert at routing a user question to a vectorstore or web search.
+system = """You are an expert at routing a user question to stock data, a vectorstore or web search.
+The stock data contains daily opening, high, low and closing prices and volumes of Tunisian stocks, from 2010 to 2025.
+Use stock_data for numeric questions about one stock: a price on a given day, or an average, minimum, maximum,
+total or change over a period.
 The vectorstore contains documents related to stock data in Tunisia for different Tunisian stocks, from 2010 to 2025.
 The vectorstore also contains information about latetst news related to the Tunisian economy and stock market.
-Use the vectorstore for questions on these topics. Otherwise, use web-search."""
+Use the vectorstore for other questions on these topics. Otherwise, use web-search."""
 route_prompt = ChatPromptTemplate.from_messages(
     [
         ("system", system),
@@ -35,4 +31,11 @@ route_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-question_router = route_prompt | structured_llm_router
\ No newline at end of file
+
+@register("question_router")
+def build_question_router():
+    # LLM with function call
+    return route_prompt | get_chat_model().with_structured_output(RouteQuery)
+
+
+question_router = LazyChain("question_router")
@@ -0,0 +1,57 @@
+import threading
+
+
+# Chain builders by name, filled by the @register decorator of each graph_nodes module
+_builders = {}
+_chains = {}
+_lock = threading.Lock()
+
+
+def register(name):
+    """Register the function building a chain under a name."""
+    def decorator(builder):
+        _builders[name] = builder
+        return builder
+    return decorator
+
+
+def get_chain(name):
+    """
+    Return the process-wide chain registered under a name, building it on first use.
+
+    Args:
+        name (str): Registered chain name, e.g. 'question_router'.
+
+    Returns:
+        Runnable: The built chain.
+    """
+    chain = _chains.get(name)
+    if chain is None:
+        with _lock:
+            if name not in _chains:
+                _chains[name] = _builders[name]()
+            chain = _chains[name]
+    return chain
+
+
+def registered_chains():
+    """Names of the registered chains."""
+    return list(_builders)
+
+
+class LazyChain:
+    """
+    Module-level handle of a registered chain.
+
+    Attribute access, such as invoke or stream, builds the chain through get_chain,
+    so importing graph_nodes creates no LLM client.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_chain(self.name), attribute)
+
+    def __repr__(self):
+        return f"LazyChain({self.name!r})"
@@ -0,0 +1,55 @@
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+
+from .llm import get_chat_model
+from .registry import register, LazyChain
+
+
+# Data model
+class StockQuery(BaseModel):
+    """Structured query over daily stock prices."""
+
+    ticker: str = Field(
+        ...,
+        description="Ticker of the stock the question is about, chosen from the available tickers.",
+    )
+    field: Literal["open", "high", "low", "close", "volume"] = Field(
+        "close",
+        description="Price column or volume the question asks about.",
+    )
+    aggregation: Literal["value", "first", "last", "mean", "min", "max", "sum", "change", "count"] = Field(
+        "value",
+        description="'value' for a single day, otherwise the aggregate computed over the date range.",
+    )
+    start_date: Optional[str] = Field(
+        None,
+        description="First day of the range in YYYY-MM-DD format, empty for a single day or the whole history.",
+    )
+    end_date: Optional[str] = Field(
+        None,
+        description="Last day of the range, or the day of a single-day question, in YYYY-MM-DD format.",
+    )
+
+
+# Prompt
+system = """You convert questions about Tunisian stock prices into a structured query.
+Available tickers: {tickers}.
+Today is {today}. Resolve relative dates such as 'yesterday' or 'last month' against today.
+Use 'value' for a price on one day, and an aggregation (mean, min, max, sum, change, count, first, last)
+over a date range for questions about a period."""
+stock_query_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "{question}"),
+    ]
+)
+
+
+@register("stock_query_parser")
+def build_stock_query_parser():
+    # LLM with function call
+    return stock_query_prompt | get_chat_model().with_structured_output(StockQuery)
+
+
+stock_query_parser = LazyChain("stock_query_parser")
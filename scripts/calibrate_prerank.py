@@ -0,0 +1,37 @@
+import argparse
+import json
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from graph_nodes.prerank import calibrate_thresholds
+
+load_dotenv()
+
+
+def main(samples_path, precision, min_samples):
+    with open(samples_path, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    accept, reject = calibrate_thresholds(samples, precision=precision, min_samples=min_samples)
+    print(f"{len(samples)} graded samples, {sum(s['grade'] == 'yes' for s in samples)} relevant")
+    for name, threshold, kept in (
+        ("PRERANK_ACCEPT_THRESHOLD", accept, lambda p: p >= accept),
+        ("PRERANK_REJECT_THRESHOLD", reject, lambda p: p <= reject),
+    ):
+        if threshold is None:
+            print(f"{name}: no threshold reaches a precision of {precision}")
+            continue
+        decided = sum(kept(s["probability"]) for s in samples)
+        print(f"{name}= {threshold:.3f}  ({decided / len(samples):.0%} of the samples decided without the LLM)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit the pre-ranker thresholds on documents graded by the LLM with PRERANK_MODE=shadow.")
+    parser.add_argument("--samples", default=os.getenv("PRERANK_SAMPLES_PATH"), help="JSONL file of graded samples")
+    parser.add_argument("--precision", type=float, default=0.95,
+                        help="Required agreement with the LLM grader on each side")
+    parser.add_argument("--min-samples", type=int, default=20, help="Minimum samples on each side of a threshold")
+    args = parser.parse_args()
+    main(args.samples, args.precision, args.min_samples)
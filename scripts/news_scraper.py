@@ -1,18 +1,22 @@
-import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup, SoupStrainer
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import asyncio
 import os
+import random
 from dotenv import load_dotenv
 import argparse
 
 from langchain_core.documents import Document
-from langchain_community.document_loaders import WebBaseLoader
 
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(os.getcwd()) / '..'))
-from utils import get_pinecone_vector_store
-from utils import PAGE_URL, NEWS_BASE_URL
+from utils import get_vector_store, get_bm25_index, BulkWriter, NewsDeduplicator, article_id
+from utils import find_tickers, date_range_metadata
+from utils import PAGE_URL, NEWS_BASE_URL, NEWS_PAGE_URL_TEMPLATE
 
 
 
@@ -20,25 +24,105 @@ load_dotenv()
 
 embedding_model = os.getenv("EMBEDDING_MODEL")
 index_name = os.getenv("INDEX_NAME")
+user_agent = os.getenv("USER_AGENT")
+http_cache_path = os.getenv("NEWS_HTTP_CACHE_PATH", ".cache/news_http_cache")
+per_host_concurrency = int(os.getenv("NEWS_PER_HOST_CONCURRENCY", "8"))
+max_listing_pages = int(os.getenv("NEWS_MAX_LISTING_PAGES", "50"))
+listing_retries = int(os.getenv("NEWS_LISTING_RETRIES", "3"))
+listing_retry_backoff = float(os.getenv("NEWS_LISTING_RETRY_BACKOFF", "1.0"))
+dedup_index_path = os.getenv("NEWS_DEDUP_INDEX_PATH", ".cache/news_dedup.sqlite")
+dedup_max_distance = int(os.getenv("NEWS_DEDUP_MAX_DISTANCE", "3"))
 
+# Listing pages change during the day, published articles do not
+LISTING_EXPIRE_SECONDS = 600
+ARTICLE_EXPIRE_SECONDS = 30 * 24 * 3600
 
-def get_articles(date):
+
+def get_session():
     """
-    Scrape articles from the target page.
-    
+    Create a pooled HTTP session with an on-disk response cache.
+
+    Expired responses that carry ETag or Last-Modified headers are revalidated with
+    conditional requests instead of being downloaded again.
+
     Returns:
-        articles: List of article objects with title, source, and date.
-        
+        session: requests_cache CachedSession.
     """
-    # Send request and parse
-    response = requests.get(PAGE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    session = requests_cache.CachedSession(
+        http_cache_path,
+        backend="sqlite",
+        cache_control=True,
+        urls_expire_after={
+            f"{PAGE_URL}*": LISTING_EXPIRE_SECONDS,
+            "*": ARTICLE_EXPIRE_SECONDS,
+        },
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=per_host_concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    return session
 
-    # Get today's date in DD/MM/YYYY format
-    if not date:
-        date = datetime.now().strftime('%d/%m/%Y')
-        print(f"Using today's date: {date}")
 
+async def fetch_all(session, urls):
+    """
+    Fetch URLs concurrently, with at most per_host_concurrency requests per host.
+
+    Args:
+        session: HTTP session shared by all requests.
+        urls (list[str]): URLs to fetch.
+
+    Returns:
+        pages: Response text per URL, None for failed requests.
+    """
+    semaphores = {}
+
+    async def fetch(url):
+        host = urlparse(url).netloc
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(per_host_concurrency))
+        async with semaphore:
+            try:
+                response = await asyncio.to_thread(session.get, url, timeout=30)
+                response.raise_for_status()
+                return response.text
+            except Exception as e:
+                print(f"Error fetching {url}: {e}")
+                return None
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def fetch_listing_pages(session, urls):
+    """
+    Fetch listing pages, retrying failed ones with exponential backoff and jitter.
+
+    Args:
+        session: HTTP session.
+        urls (list[str]): Listing page URLs.
+
+    Returns:
+        pages: Response text per URL, None for pages that failed every attempt.
+    """
+    pages = await fetch_all(session, urls)
+    for attempt in range(listing_retries):
+        failed = [i for i, html in enumerate(pages) if html is None]
+        if not failed:
+            break
+        await asyncio.sleep(listing_retry_backoff * 2 ** attempt * (1 + random.random()))
+        for i, html in zip(failed, await fetch_all(session, [urls[i] for i in failed])):
+            pages[i] = html
+    return pages
+
+
+def parse_articles(html):
+    """
+    Parse the articles table of a listing page.
+
+    Returns:
+        articles: List of article objects with title, link, source, and date.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
     articles = []
     # Locate the specific table
     table = soup.find("table", class_="tablesorter tbl100_6 tbl3 mt37")
@@ -51,84 +135,179 @@ def get_articles(date):
 
             if date_span and link_tag:
                 article_date = date_span.text.strip().split(" ")[0]
-                if article_date == date:
-                    article_url = link_tag["href"]
-                    full_url = NEWS_BASE_URL + article_url
-                    article={
-                        "title": link_tag.text.strip(),
-                        "link": full_url,
-                        "date": article_date,
-                        "source": "news"
-                    }
-                    articles.append(article)   
-                    
+                article_url = link_tag["href"]
+                full_url = NEWS_BASE_URL + article_url
+                article={
+                    "title": link_tag.text.strip(),
+                    "link": full_url,
+                    "date": article_date,
+                    "source": "news"
+                }
+                articles.append(article)
+
     else:
         print("Articles Table not found on the page.")
 
     return articles
 
 
-def process_urls(articles) -> list[Document]:
+async def get_articles_async(session, from_date, to_date):
     """
-    Load data from a list of URLs.
-    
+    Walk the paginated listing until it reaches articles older than from_date.
+
+    After the first page, pages are fetched per_host_concurrency at a time. A page that
+    still fails after its retries is skipped, the walk only stops on an empty listing
+    page or on articles older than from_date.
+
     Args:
-        urls (Sequence): Sequence of URLs to load data from.
-    
+        session: HTTP session.
+        from_date (datetime): First day of the range.
+        to_date (datetime): Last day of the range.
+
     Returns:
-        splits: List of documents.
-        
+        articles: Articles published between from_date and to_date.
     """
+    articles = []
+    page = 1
+    while page <= max_listing_pages:
+        # The first page alone covers the daily run, backfills then fetch pages in windows
+        window = 1 if page == 1 else per_host_concurrency
+        pages = range(page, min(page + window, max_listing_pages + 1))
+        urls = [PAGE_URL if p == 1 else NEWS_PAGE_URL_TEMPLATE.format(page=p) for p in pages]
+        reached_start = False
+        for p, html in zip(pages, await fetch_listing_pages(session, urls)):
+            if html is None:
+                print(f"Skipping listing page {p} after {listing_retries + 1} failed attempts")
+                continue
+            listed = parse_articles(html)
+            if not listed:
+                reached_start = True
+                break
+            for article in listed:
+                article_date = datetime.strptime(article["date"], '%d/%m/%Y')
+                if from_date <= article_date <= to_date:
+                    articles.append(article)
+                elif article_date < from_date:
+                    reached_start = True
+        if reached_start:
+            break
+        page += len(pages)
+
+    unique = {article["link"]: article for article in articles}
+    return list(unique.values())
+
+
+def get_articles(date=None, from_date=None, to_date=None):
+    """
+    Scrape articles from the target page.
+
+    Args:
+        date (str): Articles date in dd/mm/YYYY format, defaults to today.
+        from_date (str): First day of a backfill range in dd/mm/YYYY format.
+        to_date (str): Last day of a backfill range in dd/mm/YYYY format, defaults to today.
+
+    Returns:
+        articles: List of article objects with title, source, and date.
+
+    """
+    # Get today's date in DD/MM/YYYY format
+    if not date and not from_date:
+        date = datetime.now().strftime('%d/%m/%Y')
+        print(f"Using today's date: {date}")
+
+    start = datetime.strptime(from_date or date, '%d/%m/%Y')
+    end = datetime.strptime(to_date or date, '%d/%m/%Y') if (to_date or date) else datetime.now()
+    end = end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1) - timedelta(microseconds=1)
+
+    with get_session() as session:
+        return asyncio.run(get_articles_async(session, start, end))
+
+
+async def process_urls_async(session, articles) -> list[Document]:
     bs4_strainer = SoupStrainer(class_=("inarticle txtbig"))
-    loader = WebBaseLoader(
-        web_paths=[article["link"] for article in articles],
-        bs_kwargs={"parse_only": bs4_strainer},
-    )
-    docs = loader.load()
-    for i, doc in enumerate(docs):
-        doc.page_content = doc.page_content.replace("\n", " ").replace("\r", " ").strip().strip("Tweet")
-        # Extract the title and date from the corresponding article
-        article = articles[i]
-        doc.metadata = {
-            "title": article["title"],
-            "date": article["date"],
-            "link": article["link"],
-            "source": article["source"],
-        }
+    pages = await fetch_all(session, [article["link"] for article in articles])
+
+    docs = []
+    for article, html in zip(articles, pages):
+        if html is None:
+            continue
+        soup = BeautifulSoup(html, "html.parser", parse_only=bs4_strainer)
+        page_content = soup.get_text().replace("\n", " ").replace("\r", " ").strip().strip("Tweet")
+        docs.append(Document(
+            page_content=page_content,
+            metadata={
+                "title": article["title"],
+                "date": article["date"],
+                "link": article["link"],
+                "source": article["source"],
+                # Ticker and date fields let retrieval filter articles by company and period
+                "tickers": find_tickers(article["title"] + " " + page_content),
+                **date_range_metadata(datetime.strptime(article["date"], '%d/%m/%Y').date()),
+            },
+        ))
 
     return docs
 
+
+def process_urls(articles) -> list[Document]:
+    """
+    Load data from a list of URLs.
+
+    Args:
+        articles (list[dict]): Articles returned by get_articles.
+
+    Returns:
+        splits: List of documents.
+
+    """
+    with get_session() as session:
+        return asyncio.run(process_urls_async(session, articles))
+
 def store_docs(docs):
     """
-    Store documents in Pinecone VectorStore.
-    
+    Store documents in the configured VectorStore.
+
+    Documents get ids derived from their canonical URL, so storing an article twice
+    overwrites it instead of adding a copy. Stored documents are also added to the
+    BM25 index.
+
     Args:
         docs (list[Document]): List of documents to store.
-        
+
+    Returns:
+        ids: Ids of the stored documents.
     """
-    vector_store = get_pinecone_vector_store(index_name)
-    
-    try:
-        vector_store.add_documents(docs)
-        print(f"Stored {len(docs)} documents in Pinecone.")
-    except Exception as e:
-        print(f"Error storing documents in Pinecone: {e}")
+    vector_store = get_vector_store(index_name)
+    ids, stats = BulkWriter(vector_store).write_documents(docs, ids=[article_id(d.metadata["link"]) for d in docs])
+    if stats["failed_batches"]:
+        print(f"Error storing batches {stats['failed_batches']} in the vector store.")
+    stored = set(ids)
+    kept = [(article_id(d.metadata["link"]), d) for d in docs if article_id(d.metadata["link"]) in stored]
+    get_bm25_index(index_name).add([i for i, _ in kept], [d.page_content for _, d in kept], [d.metadata for _, d in kept])
+    return ids
+
 
 
+def main(date, from_date=None, to_date=None):
+    dedup = NewsDeduplicator(dedup_index_path, max_distance=dedup_max_distance)
+    articles = dedup.filter_articles(get_articles(date, from_date, to_date))
 
-def main(date):
-    articles = get_articles(date)
-    
-    if len(articles) > 0: 
-    # Process the articles and store them in Pinecone
-        docs = process_urls(articles)
-        store_docs(docs)
+    if len(articles) > 0:
+    # Process the articles and store them in the vector store
+        fetched = process_urls(articles)
+        docs = dedup.filter_docs(fetched)
+        stored = set(store_docs(docs))
+        dedup.mark_stored([d for d in docs if article_id(d.metadata["link"]) in stored])
+        kept = {id(d) for d in docs}
+        dedup.mark_duplicates([d for d in fetched if id(d) not in kept])
 
     else:
-        print("No articles found for today.")
+        print("No articles found for the requested dates.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download and Storing automation for news articles.")
     parser.add_argument("--date", required=False, help="Articles date in dd/mm/YYYY format")
+    parser.add_argument("--from", dest="from_date", required=False, help="First day of a backfill in dd/mm/YYYY format")
+    parser.add_argument("--to", dest="to_date", required=False, help="Last day of a backfill in dd/mm/YYYY format, defaults to today")
     args = parser.parse_args()
-    main(args.date)    
\ No newline at end of file
+    main(args.date, args.from_date, args.to_date)
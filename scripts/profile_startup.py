@@ -0,0 +1,88 @@
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_MODULES = ["utils", "graph_nodes", "rag_system", "runtime", "news_scraper", "stock_data_preprocessing"]
+
+BUILD_CHAINS = """
+import time
+started = time.perf_counter()
+from graph_nodes import get_chain, registered_chains
+for name in registered_chains():
+    get_chain(name)
+print(f"{time.perf_counter() - started:.6f}")
+"""
+
+
+def environment():
+    env = dict(os.environ)
+    paths = [str(ROOT), str(ROOT / "src"), str(ROOT / "scripts")]
+    env["PYTHONPATH"] = os.pathsep.join(paths + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    return env
+
+
+def profile_import(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        total (float): Cumulative import time of the module in seconds.
+        packages (dict): Self import time per top-level package in seconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=environment(), cwd=ROOT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total = 0.0
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, dict(packages)
+
+
+def profile_chains():
+    """Seconds to build every registered graph_nodes chain, imports included."""
+    result = subprocess.run(
+        [sys.executable, "-c", BUILD_CHAINS], capture_output=True, text=True, env=environment(), cwd=ROOT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(modules, top, chains):
+    for module in modules:
+        try:
+            total, packages = profile_import(module)
+        except RuntimeError as e:
+            print(f"{module}: import failed ({e})")
+            continue
+        print(f"{module}: {total:.3f}s")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            print(f"    {package:<32} {seconds:.3f}s")
+    if chains:
+        print(f"Building all graph_nodes chains: {profile_chains():.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of the project entry points.")
+    parser.add_argument("--profile-startup", dest="modules", nargs="*", default=DEFAULT_MODULES,
+                        help="Modules to import, each in a fresh interpreter")
+    parser.add_argument("--top", type=int, default=8, help="Slowest packages listed per module")
+    parser.add_argument("--chains", action="store_true", help="Also time building every graph_nodes chain")
+    args = parser.parse_args()
+    main(args.modules or DEFAULT_MODULES, args.top, args.chains)
@@ -1,67 +1,293 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 
 from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import argparse
+import hashlib
+import json
 import os
 import pandas as pd
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(os.getcwd()) / '..' / '..'))
-from utils import get_pinecone_vector_store
+from utils import get_vector_store, get_bm25_index, build_stock_store, BulkWriter, date_range_metadata, parse_dates
 
 load_dotenv()
 index_name = os.getenv("INDEX_NAME")
+ingest_workers = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+ingest_batch_size = int(os.getenv("INGEST_BATCH_SIZE", "400"))
+ingest_read_rows = int(os.getenv("INGEST_READ_ROWS", "5000"))
+ingest_manifest_path = os.getenv("INGEST_MANIFEST_PATH", ".cache/stock_manifest.json")
+
+
+def format_stock_rows(df):
+    """
+    Format stock rows as sentences with vectorized string operations.
+
+    Args:
+        df (DataFrame): Rows with stock, date, ouverture, cloture and volume columns.
+
+    Returns:
+        lines (Series): One sentence per row.
+    """
+    return (
+        "Stock " + df["stock"].astype(str)
+        + " on date " + df["date"].astype(str)
+        + ", opening price " + df["ouverture"].map("{:.2f}".format)
+        + ", closing price " + df["cloture"].map("{:.2f}".format)
+        + ", volume " + df["volume"].map("{:,.2f}".format) + "."
+    )
+
+
+def iter_file_chunks(file_path, chunk_size=1024, read_rows=5000):
+    """
+    Yield text chunks of one stock CSV file without loading it whole.
+
+    Rows are read in blocks of read_rows and packed greedily into newline-separated
+    chunks of at most chunk_size characters. Packing restarts at the first row of the
+    file, so appending new rows to a date-sorted file leaves earlier chunks unchanged.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        chunk_size (int): Maximum number of characters per chunk.
+        read_rows (int): Number of CSV rows read at a time.
+
+    Yields:
+        chunk (dict): Deterministic id, text, ticker and first/last date of the chunk.
+    """
+    def make_chunk(lines, rows):
+        ticker, start_date = rows[0]
+        end_date = rows[-1][1]
+        return {
+            "id": f"{ticker}-{start_date}-{end_date}",
+            "text": "\n".join(lines),
+            "ticker": ticker,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+
+    lines, rows, length = [], [], 0
+    for df in pd.read_csv(file_path, chunksize=read_rows):
+        # Rows without a valid date are dropped, as in the columnar stock store
+        dates = parse_dates(df["date"])
+        df = df[dates.notna()]
+        dates = dates[dates.notna()].dt.strftime("%Y-%m-%d")
+        tickers = df["stock"].astype(str).str.upper()
+        for line, ticker, date in zip(format_stock_rows(df), tickers, dates):
+            added = len(line) + (1 if lines else 0)
+            if lines and length + added > chunk_size:
+                yield make_chunk(lines, rows)
+                lines, rows, length = [], [], 0
+                added = len(line)
+            lines.append(line)
+            rows.append((ticker, date))
+            length += added
+    if lines:
+        yield make_chunk(lines, rows)
+
+
+def chunk_metadata(chunk):
+    """
+    Metadata stored with a stock chunk, so retrieval can filter on its ticker and dates.
+
+    Args:
+        chunk (dict): Chunk as produced by iter_file_chunks.
+
+    Returns:
+        metadata (dict): Ticker, date range, year and source of the chunk.
+    """
+    return {
+        "ticker": chunk["ticker"],
+        "tickers": [chunk["ticker"]],
+        **date_range_metadata(date.fromisoformat(chunk["start_date"]), date.fromisoformat(chunk["end_date"])),
+        "source": "stock_data",
+        "link": "",
+    }
+
+
+def _chunk_file(file_path):
+    return list(iter_file_chunks(file_path, read_rows=ingest_read_rows))
+
+
+def stream_stock_chunks(stock_data_dir, workers=ingest_workers):
+    """
+    Chunk every stock CSV file of a directory across a process pool.
+
+    At most two files per worker are in flight, so memory does not grow with the
+    number of files.
+
+    Args:
+        stock_data_dir (str): Directory containing stock data CSV files.
+        workers (int): Number of worker processes.
+
+    Yields:
+        chunk (dict): Chunk as produced by iter_file_chunks.
+    """
+    files = [os.path.join(stock_data_dir, file) for file in sorted(os.listdir(stock_data_dir))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for file_path in files:
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_chunk_file, file_path))
+        while pending:
+            yield from pending.popleft().result()
 
 
 def process_stock_data(stock_data_dir):
     """
-    Load data from a CSV file.
+    Load data from the stock CSV files of a directory.
+
+    Chunks never span two files, so each one belongs to a single ticker.
     
     Args:
-        file_path (str): Path to the CSV file.
+        stock_data_dir (str): Directory containing stock data CSV files.
     
     Returns:
-        stock_data: List of Documents.
+        stock_data: List of Documents with their chunk id and metadata.
     """
     stock_data = []
-    for file in os.listdir(stock_data_dir):
-        file_path = os.path.join(stock_data_dir, file)
-        df= pd.read_csv(file_path)
-        df['text']= df.apply(lambda row: f"Stock {row['stock']} on date {row['date']}, opening price {row['ouverture']:.2f}, closing price {row['cloture']:.2f}, volume {row['volume']:,.2f}.", axis=1)
-        stock_data += df['text'].tolist()
-
-    stock_data = "\n".join(stock_data)
-    text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n"],
-            chunk_size=1024,  
-            chunk_overlap=0,      
-        )
-    splits = text_splitter.split_text(stock_data)
- 
-    return splits
-
-def preprocess_stock_data(data_path):
+    for file in sorted(os.listdir(stock_data_dir)):
+        for chunk in iter_file_chunks(os.path.join(stock_data_dir, file), read_rows=ingest_read_rows):
+            stock_data.append(Document(id=chunk["id"], page_content=chunk["text"], metadata=chunk_metadata(chunk)))
+
+    return stock_data
+
+def preprocess_stock_data(data_path, output_path, skip_rows=4000):
+    """
+    Add the stock column to raw CSVs and drop their oldest rows, without touching the originals.
+
+    Args:
+        data_path (str): Directory containing the raw stock data CSV files.
+        output_path (str): Directory the preprocessed CSV files are written to.
+        skip_rows (int): Number of leading rows dropped from each file.
+    """
+    if os.path.abspath(data_path) == os.path.abspath(output_path):
+        raise ValueError("output_path must differ from data_path, preprocessing does not rewrite raw files")
+    os.makedirs(output_path, exist_ok=True)
     for filename in os.listdir(data_path):
         stock_name=filename.split('_')[0]
         file_path = os.path.join(data_path, filename)
         df = pd.read_csv(file_path)
         df['stock'] = stock_name
-        df= df[4000:]
-        df.to_csv(file_path, index=False)
+        df= df[skip_rows:]
+        df.to_csv(os.path.join(output_path, filename), index=False)
 
-def store_stock_data(stock_data_dir):
+
+def load_manifest(path=ingest_manifest_path):
+    """Load the chunk id to content hash manifest of previously stored chunks."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=ingest_manifest_path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def store_stock_data(stock_data_dir, streaming=True, batch_size=ingest_batch_size):
     """
-    Store stock data in Pinecone VectorStore.
+    Store stock data in the configured VectorStore.
     
+    In streaming mode chunks get deterministic ids and only chunks whose content hash
+    differs from the manifest are embedded and upserted. Chunks of the manifest that no
+    longer exist, such as the previous last chunk of a file that grew, are deleted.
+    The BM25 index gets the same changes, and unchanged chunks it is missing are added.
+
     Args:
         stock_data_dir (str): Directory containing stock data CSV files.
-        
+        streaming (bool): Chunk files in parallel and write bounded batches as they are
+            produced, instead of chunking the whole corpus first.
+        batch_size (int): Number of chunks written per vector store call in streaming mode.
+
+    Returns:
+        ids: Ids of the chunks written in this run.
     """
-    vector_store = get_pinecone_vector_store(index_name)
-    stock_data = process_stock_data(stock_data_dir)
-    try:
-        ids = vector_store.add_documents(stock_data)
-    except Exception as e:
-        print(f"Error adding documents: {e}")  
-        ids = []
-
-    return ids
\ No newline at end of file
+    vector_store = get_vector_store(index_name)
+    if not streaming:
+        stock_data = process_stock_data(stock_data_dir)
+        try:
+            ids = vector_store.add_texts(
+                [d.page_content for d in stock_data],
+                metadatas=[d.metadata for d in stock_data],
+                ids=[d.id for d in stock_data],
+            )
+        except Exception as e:
+            print(f"Error adding documents: {e}")  
+            ids = []
+        return ids
+
+    manifest = load_manifest()
+    bm25_index = get_bm25_index(index_name)
+    writer = BulkWriter(vector_store)
+    seen, ids, batch, lexical_only = set(), [], [], []
+
+    def write(batch):
+        written, _ = writer.write(
+            [c["text"] for c in batch], metadatas=[c["metadata"] for c in batch], ids=[c["id"] for c in batch])
+        stored = set(written)
+        manifest.update((c["id"], c["hash"]) for c in batch if c["id"] in stored)
+        save_manifest(manifest)
+        kept = [c for c in batch if c["id"] in stored]
+        bm25_index.add([c["id"] for c in kept], [c["text"] for c in kept], [c["metadata"] for c in kept])
+        return written
+
+    for chunk in stream_stock_chunks(stock_data_dir):
+        seen.add(chunk["id"])
+        # Metadata is part of the hash, so chunks stored before it changed are written again
+        chunk["metadata"] = chunk_metadata(chunk)
+        content = chunk["text"] + json.dumps(chunk["metadata"], sort_keys=True)
+        chunk["hash"] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if manifest.get(chunk["id"]) == chunk["hash"]:
+            if chunk["id"] not in bm25_index:
+                lexical_only.append(chunk)
+            continue
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            # Writing synchronously holds back the chunk producer until the batch is stored
+            ids += write(batch)
+            batch = []
+    if batch:
+        ids += write(batch)
+    if lexical_only:
+        bm25_index.add(
+            [c["id"] for c in lexical_only], [c["text"] for c in lexical_only], [c["metadata"] for c in lexical_only])
+        print(f"Added {len(lexical_only)} stored chunks missing from the BM25 index")
+
+    stale = [chunk_id for chunk_id in manifest if chunk_id not in seen]
+    if stale:
+        vector_store.delete(ids=stale)
+        bm25_index.delete(stale)
+        for chunk_id in stale:
+            del manifest[chunk_id]
+        save_manifest(manifest)
+    print(f"{len(seen)} stock chunks: {len(ids)} new or changed, {len(seen) - len(ids)} unchanged, {len(stale)} removed")
+
+    return ids
+
+
+def main(stock_data_dir, store_vectors, build_store, preprocess_output=None):
+    if preprocess_output:
+        preprocess_stock_data(stock_data_dir, preprocess_output)
+        stock_data_dir = preprocess_output
+    if build_store:
+        # Columnar store used by the stock_query node for numeric questions
+        build_stock_store(stock_data_dir)
+    if store_vectors:
+        ids = store_stock_data(stock_data_dir)
+        print(f"Stored {len(ids)} stock data chunks in the vector store.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexing automation for stock data CSV files.")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_PATH"), help="Directory containing stock data CSV files")
+    parser.add_argument("--store-vectors", action="store_true", help="Embed the stock data and store it in the vector store")
+    parser.add_argument("--build-store", action="store_true", help="Build the columnar stock store used for numeric questions")
+    parser.add_argument("--preprocess-output", help="Preprocess the raw CSVs into this directory first and index the result")
+    args = parser.parse_args()
+    main(args.data_dir, args.store_vectors, args.build_store, args.preprocess_output)
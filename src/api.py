@@ -0,0 +1,254 @@
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+# Importable as a script from any directory, and as src.api from the repo root
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+from runtime import get_runtime
+from utils import render_metrics, get_vector_store_stats
+
+
+load_dotenv()
+api_max_concurrency = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+api_max_queue = int(os.getenv("API_MAX_QUEUE", "64"))
+api_queue_timeout = float(os.getenv("API_QUEUE_TIMEOUT", "30"))
+
+
+class Question(BaseModel):
+    question: str
+
+
+class AdmissionController:
+    """
+    Bound the requests running the graph and the requests waiting for a slot.
+
+    Requests beyond max_queue waiting ones, or waiting longer than queue_timeout, are
+    rejected with 503 so the load balancer can retry them on another process.
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(503, "Too many queued requests", headers={"Retry-After": "1"})
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(503, "Timed out waiting for a free slot", headers={"Retry-After": "1"})
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+
+class WorkflowStreamingResponse(StreamingResponse):
+    """
+    Streaming response that stops its workflow run once sent, or once sending fails.
+
+    The run is stopped by the response itself rather than by its body generator,
+    which never runs when the client disconnects before the body is iterated.
+    """
+
+    def __init__(self, content, run, **kwargs):
+        super().__init__(content, **kwargs)
+        self.run = run
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.run.stop()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # One compiled graph per process, shared by every request and warmed before the first one
+    runtime = get_runtime()
+    await asyncio.to_thread(runtime.warm_up)
+    app.state.workflow = runtime.workflow
+    app.state.admission = AdmissionController(api_max_concurrency, api_max_queue, api_queue_timeout)
+    # Graph nodes are synchronous, each running request gets a worker thread so their LLM and IO waits overlap
+    app.state.executor = ThreadPoolExecutor(max_workers=api_max_concurrency, thread_name_prefix="rag")
+    yield
+    app.state.executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Tunisian Stock Market Adaptive RAG", lifespan=lifespan)
+
+
+class WorkflowRun:
+    """
+    One run of the workflow on a worker thread, holding an admission slot until it ends.
+
+    The graph nodes are synchronous, so the run streams the graph on the executor and
+    hands its events to the event loop. The slot is released when the worker thread
+    finishes, not when the response does, so API_MAX_CONCURRENCY bounds the graphs
+    actually running. A stopped run, such as one whose client went away, leaves the
+    graph at its next event.
+    """
+
+    def __init__(self, request, question, admission):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.stopped = threading.Event()
+        workflow = request.app.state.workflow
+        self.future = self.loop.run_in_executor(request.app.state.executor, self._produce, workflow, question)
+        self.future.add_done_callback(lambda _: admission.release())
+
+    def _produce(self, workflow, question):
+        put = lambda event: self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        try:
+            for event in workflow.stream({"question": question}, stream_mode=["updates", "custom"]):
+                if self.stopped.is_set():
+                    print("---CLIENT GONE, STOPPING THE WORKFLOW---")
+                    break
+                put(event)
+        except Exception as e:
+            put(("error", str(e)))
+        finally:
+            put(None)
+
+    def stop(self):
+        self.stopped.set()
+
+    async def events(self):
+        """
+        Yield the stream events of the run on the event loop.
+
+        Yields:
+            (mode, output): 'updates' and 'custom' events of the graph, then ('error', message) on failure.
+        """
+        try:
+            while (event := await self.queue.get()) is not None:
+                yield event
+        finally:
+            # Also reached on GeneratorExit and CancelledError, when the consumer is gone
+            self.stop()
+
+
+async def start_workflow(request, question):
+    """Wait for an admission slot and start a WorkflowRun holding it."""
+    admission = request.app.state.admission
+    await admission.acquire()
+    try:
+        return WorkflowRun(request, question, admission)
+    except BaseException:
+        admission.release()
+        raise
+
+
+def sources(documents):
+    return [{"link": d.metadata.get("link", ""), "source": d.metadata.get("source", "")} for d in documents]
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/ask")
+async def ask(request: Request, body: Question):
+    """
+    Answer a question as server-sent events: 'progress', 'generation_start' and 'token'
+    while the graph runs, 'trace' when tracing is enabled, then 'answer' or 'error'.
+    """
+    run = await start_workflow(request, body.question)
+
+    async def events():
+        started = time.perf_counter()
+        generation, documents = "", []
+        async for mode, output in run.events():
+            if mode == "error":
+                yield sse("error", {"detail": output})
+                return
+            if mode == "custom":
+                for key in ("progress", "token", "trace"):
+                    if key in output:
+                        yield sse(key, output[key])
+                if output.get("event") == "generation_start":
+                    yield sse("generation_start", {})
+                continue
+            for value in output.values():
+                if value and value.get("generation"):
+                    generation = value["generation"]
+                if value and "documents" in value:
+                    documents = value["documents"]
+        yield sse("answer", {
+            "generation": generation,
+            "sources": sources(documents),
+            "seconds": time.perf_counter() - started,
+        })
+
+    try:
+        return WorkflowStreamingResponse(
+            events(), run, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    except BaseException:
+        run.stop()
+        raise
+
+
+@app.post("/invoke")
+async def invoke(request: Request, body: Question):
+    """Answer a question with a single JSON response."""
+    run = await start_workflow(request, body.question)
+    try:
+        started = time.perf_counter()
+        state = {}
+        async for mode, output in run.events():
+            if mode == "error":
+                raise HTTPException(500, output)
+            if mode == "updates":
+                for value in output.values():
+                    state.update(value or {})
+        return JSONResponse({
+            "generation": state.get("generation", ""),
+            "sources": sources(state.get("documents", [])),
+            "seconds": time.perf_counter() - started,
+        })
+    finally:
+        run.stop()
+
+
+@app.get("/health")
+async def health(request: Request):
+    admission = request.app.state.admission
+    return {"status": "ok", "in_flight": admission.in_flight, "queued": admission.queued,
+            "rejected": admission.rejected, "vector_store": get_vector_store_stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the RAG workflow over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
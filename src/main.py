@@ -4,13 +4,22 @@ import gc
 import tempfile
 import os
 import base64
-import torch
 
 
 
-from rag_system import create_workflow
+from runtime import get_runtime
+from utils import metrics_summary
 
-torch.classes.__path__ = []
+
+@st.cache_resource
+def load_runtime():
+    # Cached for the whole server process, every browser session shares it
+    runtime = get_runtime()
+    runtime.warm_up()
+    return runtime
+
+
+runtime = load_runtime()
 
 
 st.header("Tunisian Stock Market Agentic RAG :chart_with_upwards_trend: :flag-tn:")
@@ -24,9 +33,6 @@ if "messages" not in st.session_state:
 if "pdf_tool" not in st.session_state:
     st.session_state.pdf_tool = None 
 
-if "agents" not in st.session_state:
-    st.session_state.agents = None    
-
 
 def reset_chat():
     st.session_state.messages = [{"role": "assistant", "content": "Let's start chatting! 👇"}]
@@ -72,6 +78,9 @@ with st.sidebar:
 
     st.button("Clear Chat", on_click=reset_chat)
 
+    show_trace = st.checkbox("Show request breakdown")
+    trace_panel = st.empty()
+
 
 
 # ===========================
@@ -91,37 +100,72 @@ if prompt := st.chat_input("Ask a question about Tunisian stock market and relat
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # 2. Build or reuse the Crew (only once after PDF is loaded)
-    if st.session_state.agents is None:
-        st.session_state.agents = create_workflow()    
-
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
+        progress_placeholder = st.empty()
         message_placeholder = st.empty()
         full_response = "" 
-
-        # Get the complete response first
-        with st.spinner("Thinking..."):
-            inputs = {"question": prompt}
-            for output in st.session_state.agents.stream(inputs):
+        result = ""
+        started = time.perf_counter()
+        first_token_seconds = None
+
+        # Stream node progress and generated tokens while the graph runs its graders
+        inputs = {"question": prompt}
+        for mode, output in runtime.workflow.stream(inputs, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                if "trace" in output:
+                    st.session_state.last_trace = output["trace"]
+                if "progress" in output:
+                    progress_placeholder.caption(f"{output['progress'].capitalize()}...")
+                if output.get("event") == "generation_start":
+                    # The graph may regenerate an answer the graders rejected
+                    full_response = ""
+                if "token" in output:
+                    if first_token_seconds is None:
+                        first_token_seconds = time.perf_counter() - started
+                    full_response += output["token"]
+                    message_placeholder.markdown(full_response + "▌")
+            else:
                 for key, value in output.items():
-                    continue
-            result = value["generation"]
-                
-        words = result.split(' ')
-        # Simulate stream of response with milliseconds delay
-        for i, word in enumerate(words):
-            full_response += word
-            if i < len(words) - 1:  # Don't add newline to the last line
-                full_response += ' '
-            
-            # Add a blinking cursor to simulate typing
-            message_placeholder.markdown(full_response + "▌")
-            time.sleep(0.20)
+                    if value and value.get("generation"):
+                        result = value["generation"]
 
+        full_response = result or full_response
         message_placeholder.markdown(full_response)
+        if first_token_seconds is not None:
+            print(f"Time to first token: {first_token_seconds:.2f}s")
+            progress_placeholder.caption(
+                f"First token after {first_token_seconds:.2f}s, answered in {time.perf_counter() - started:.2f}s"
+            )
+        else:
+            progress_placeholder.empty()
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": full_response})
 
+if show_trace and st.session_state.get("last_trace"):
+    trace = st.session_state.last_trace
+    summary = metrics_summary()
+    with trace_panel.container():
+        st.caption(
+            f"Last request: {trace['seconds']:.2f}s, {trace['llm_calls']} LLM calls, "
+            f"{trace['prompt_tokens']} prompt / {trace['completion_tokens']} completion tokens, "
+            f"{trace['retries']} retries, {trace['loops']} loops, "
+            f"~{trace.get('context_tokens', 0)} context tokens (~{trace.get('context_tokens_saved', 0)} saved by packing)"
+        )
+        st.dataframe(
+            [
+                {
+                    "node": span["node"],
+                    "seconds": round(span["seconds"], 3),
+                    "LLM calls": span["llm_calls"],
+                    "tokens": span["prompt_tokens"] + span["completion_tokens"],
+                    "p50": round(summary.get(span["node"], {}).get("p50", 0.0), 3),
+                    "p95": round(summary.get(span["node"], {}).get("p95", 0.0), 3),
+                }
+                for span in trace["spans"]
+            ],
+            hide_index=True,
+        )
+
 
        
\ No newline at end of file
@@ -1,23 +1,93 @@
 from typing import List, TypedDict
 from langgraph.graph import StateGraph, END,  START
+from langgraph.config import get_stream_writer
 from langchain_core.documents import Document
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 
 import os
+import threading
+import time
+from datetime import date
 from dotenv import load_dotenv
 
 
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(os.getcwd()) / '..' / '..'))
-from utils import get_pinecone_vector_store
+from utils import (
+    get_vector_store,
+    invalidate_vector_store,
+    record_query_time,
+    get_embeddings,
+    get_bm25_index,
+    reciprocal_rank_fusion,
+    parse_query_filters,
+    get_web_search,
+    canonicalize_url,
+    estimate_tokens,
+    pack_context,
+    get_stock_store,
+    format_stock_result,
+    SemanticCache,
+    new_budget,
+    charge,
+    exhausted,
+    remaining_llm_calls,
+    record_exhaustion,
+    RequestTracer,
+    start_metrics_server,
+)
 from graph_nodes import *
 
 load_dotenv()
-embedding_model = os.getenv("EMBEDDING_MODEL")
 index_name = os.getenv("INDEX_NAME")
+grader_mode = os.getenv("GRADER_MODE", "concurrent")
+grader_max_concurrency = int(os.getenv("GRADER_MAX_CONCURRENCY", "5"))
+grader_retries = int(os.getenv("GRADER_RETRIES", "1"))
+grader_retry_backoff = float(os.getenv("GRADER_RETRY_BACKOFF", "0.5"))
+generation_grader_mode = os.getenv("GENERATION_GRADER_MODE", "fused")
+grading_policy = os.getenv("GRADING_POLICY", "skip_structured")
+tracing_enabled = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+metrics_port = int(os.getenv("METRICS_PORT") or 0)
+hybrid_retrieval = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "20"))
+metadata_filters_enabled = os.getenv("METADATA_FILTERS_ENABLED", "true").lower() == "true"
+rrf_k = int(os.getenv("RRF_K", "60"))
+retrieve_k = 5
+local_router_enabled = os.getenv("LOCAL_ROUTER_ENABLED", "true").lower() == "true"
+prerank_mode = os.getenv("PRERANK_MODE", "shadow")
+semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+semantic_cache_path = os.getenv("SEMANTIC_CACHE_PATH", ".cache/semantic_cache.sqlite")
+semantic_cache_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+semantic_cache_max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+semantic_cache_ttls = {
+    "news": int(os.getenv("SEMANTIC_CACHE_TTL_NEWS", "3600")),
+    "default": int(os.getenv("SEMANTIC_CACHE_TTL_DEFAULT", "86400")),
+    "historical": int(os.getenv("SEMANTIC_CACHE_TTL_HISTORICAL", str(30 * 86400))),
+}
+FALLBACK_ANSWER = "I'm sorry, I couldn't find the information you're looking for."
+# LLM calls of one generation and its grading, kept in reserve by the steps before it
+GENERATION_LLM_CALLS = 1 + (1 if generation_grader_mode == "fused" else 2)
+# LLM calls between a rewrite and the next generation at most: the rewrite, routing and stock query parsing
+REWRITE_LLM_CALLS = 3
+
+
+def stream_writer():
+    """Return the custom stream writer of the current graph run, or a no-op outside of one."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda event: None
+
+
+def report_progress(**event):
+    """
+    Send a custom stream event, such as node progress or a generated token.
+
+    Events reach callers streaming with stream_mode="custom".
+    """
+    stream_writer()(event)
+
 
 class State(TypedDict):
     """
@@ -27,11 +97,32 @@ class State(TypedDict):
         question: question
         generation: LLM generation
         documents: list of documents
+        document_scores: dense and BM25 retrieval scores of each document
+        datasource: datasource chosen by the router
+        filters: metadata filter built from the tickers and dates of the question
+        seen_urls: canonical URLs of the web results already used by the request
+        context: packed documents sent to the generation and its graders
+        context_tokens: estimated context tokens sent by the request, packed and unpacked
+        generation_grade: verdict of the generation graders
+        best_generation: latest generation found grounded in the documents
+        budget: time, LLM call and loop budget of the request
+        budget_exhausted: limit that stopped the request, if any
     """
     question: str
     embedded_question: List[float] = []
+    embedded_for: str = ""
     documents: List[Document]= []
+    document_scores: List[dict] = []
     generation :str =""
+    datasource: str = ""
+    filters: dict = {}
+    seen_urls: List[str] = []
+    context: str = ""
+    context_tokens: dict = {}
+    generation_grade: str = ""
+    best_generation: str = ""
+    budget: dict = {}
+    budget_exhausted: str = ""
 
 
 
@@ -45,108 +136,332 @@ def embed_question(state:State):
     Returns:
         state (dict): The state of the graph with the embedded question in a new key.
     """
+    report_progress(progress="embedding question")
     question = state["question"]
-    query_embeddings = GoogleGenerativeAIEmbeddings(model =embedding_model, task_type="RETRIEVAL_QUERY") 
-    q_embed = query_embeddings.embed_query(text=question)
-    return {"embedded_question": q_embed, "question": question}
+    if state.get("embedded_question") and state.get("embedded_for") == question:
+        return {"embedded_question": state["embedded_question"], "question": question}
+    q_embed = get_embeddings("RETRIEVAL_QUERY").embed_query(question)
+    return {"embedded_question": q_embed, "embedded_for": question, "question": question}
+
+def parse_query(state:State):
+    """
+    Build the metadata filter of the question from the tickers and dates it mentions.
+
+    Args:
+        state (State): The state of the graph.
+
+    Returns:
+        state (dict): The state of the graph with the filter in a new key, empty when
+            the question names no ticker or date.
+    """
+    if not metadata_filters_enabled:
+        return {"filters": {}}
+    started = time.perf_counter()
+    filters = parse_query_filters(state["question"])
+    if filters:
+        print(f"Parsed retrieval filter {filters} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return {"filters": filters}
+
+def search_vector_store(embedded_question, k, filters):
+    """
+    Query the vector store, rebuilding its handle once if the query fails.
+
+    Filtered results are topped up with unfiltered ones when fewer than retrieve_k
+    documents match, such as chunks stored before they carried metadata.
+
+    Returns:
+        list[tuple[Document, float]]: Documents and similarity scores, best first.
+    """
+    def search(**kwargs):
+        try:
+            return get_vector_store(index_name).similarity_search_by_vector_with_score(
+                embedding=embedded_question, k=k, **kwargs)
+        except Exception as e:
+            print(f"Vector store query failed, rebuilding the index handle: {e}")
+            invalidate_vector_store(index_name)
+            return get_vector_store(index_name).similarity_search_by_vector_with_score(
+                embedding=embedded_question, k=k, **kwargs)
+
+    if not filters:
+        return search()
+    documents = search(filter=filters)
+    if len(documents) < retrieve_k:
+        print(f"Only {len(documents)} documents match the filter, adding unfiltered results")
+        found = {d.id or d.page_content for d, _ in documents}
+        documents += [(d, score) for d, score in search() if (d.id or d.page_content) not in found]
+    return documents
 
 def retrieve(state):
     """
     Retrieve Documents
 
+    With HYBRID_RETRIEVAL, dense and BM25 candidates are fused by reciprocal rank, so
+    exact tokens such as tickers and dates are found even when the embedding misses them.
+    Both searches are restricted by the metadata filter of the question, if any.
+
     Args:
         state (State): The state of the graph.
 
     Returns:
         state(dict): The state of the graph with the retrieved documents in a new key.    
     """
+    report_progress(progress="retrieving documents")
     embedded_question= state["embedded_question"]
     question= state["question"]
-    vector_store = get_pinecone_vector_store(index_name)
-    documents = vector_store.similarity_search_by_vector_with_score(
-        embedding=embedded_question,
-        k=5,
-        )
-    documents = [d[0] for d in documents]
-    print(f"Retrieved {len(documents)} documents")
-    return {"documents": documents ,  "question": question }
+    filters = state.get("filters") or {}
+    k = hybrid_candidates if hybrid_retrieval else retrieve_k
+    started = time.perf_counter()
+    scored = search_vector_store(embedded_question, k, filters)
+    query_seconds = time.perf_counter() - started
+    record_query_time(index_name, query_seconds)
+    documents = [d for d, _ in scored]
+    # Scores are kept for the pre-ranker of grade_documents
+    dense_scores = {d.id or d.page_content: score for d, score in scored}
+    bm25_scores = {}
+    print(f"Retrieved {len(documents)} documents in {query_seconds:.3f}s")
+
+    if hybrid_retrieval:
+        started = time.perf_counter()
+        bm25_index = get_bm25_index(index_name)
+        lexical = bm25_index.search(question, k=hybrid_candidates, filter=filters)
+        if filters and len(lexical) < retrieve_k:
+            found = {d.id or d.page_content for d, _ in lexical}
+            lexical += [
+                (d, score) for d, score in bm25_index.search(question, k=hybrid_candidates)
+                if (d.id or d.page_content) not in found
+            ]
+        bm25_scores = {d.id or d.page_content: score for d, score in lexical}
+        if lexical:
+            fused = reciprocal_rank_fusion([documents, [d for d, _ in lexical]], k=retrieve_k, rrf_k=rrf_k)
+            dense_ids = {d.id or d.page_content for d in documents[:retrieve_k]}
+            documents = [d for d, _ in fused]
+            added = sum(1 for d in documents if (d.id or d.page_content) not in dense_ids)
+            print(f"Fused {len(lexical)} BM25 candidates in {time.perf_counter() - started:.3f}s, {added} new in the top {retrieve_k}")
+    documents = documents[:retrieve_k]
+    document_scores = [
+        {"dense": dense_scores.get(d.id or d.page_content), "bm25": bm25_scores.get(d.id or d.page_content)}
+        for d in documents
+    ]
+    return {"documents": documents, "document_scores": document_scores, "question": question}
 
 def grade_documents(state: State):
+        """
+        Keep the documents relevant to the question.
+
+        With PRERANK_MODE=on, the local pre-ranker accepts or rejects the clear cases
+        and only the borderline documents are sent to the LLM grader. With
+        PRERANK_MODE=shadow every document is graded by the LLM and the pre-ranker
+        probabilities are recorded as calibration samples.
+
+        The LLM grader gets at most the calls left in the budget after a generation and
+        its grading, retries included. Documents beyond that keep the pre-ranker verdict, or are kept when
+        the pre-ranker left them borderline or is off.
 
+        Args:
+            state (State): The state of the graph.
+
+        Returns:
+            state (dict): The relevant documents, their scores and the updated budget.
+        """
         print("---CHECK DOCUMENT RELEVNECE TO QUESTION ---")
         question = state['question']
         documents = state['documents']
-
-        filtered_docs=[]
-        for d in documents:
-
-            score = retrieval_grader.invoke(
-                {"question": question, "document": d}
+        scores = state.get('document_scores') or [None] * len(documents)
+        report_progress(progress=f"grading 0/{len(documents)}")
+
+        verdicts = ["grade"] * len(documents)
+        probabilities = features = None
+        if prerank_mode in ("on", "shadow"):
+            verdicts, probabilities, features = document_preranker.rank(question, documents, scores)
+        to_grade = [i for i, verdict in enumerate(verdicts) if verdict == "grade" or prerank_mode == "shadow"]
+        budget = state["budget"]
+        affordable = 0 if exhausted(budget) == "time" else max(0, remaining_llm_calls(budget) - GENERATION_LLM_CALLS)
+        if len(to_grade) > affordable:
+            print(f"---BUDGET: {affordable} of {len(to_grade)} documents graded by the LLM---")
+            for i in to_grade[affordable:]:
+                verdicts[i] = "no" if verdicts[i] == "no" else "yes"
+            to_grade = to_grade[:affordable]
+        pending = [documents[i] for i in to_grade]
+
+        if grader_mode == "concurrent" and pending:
+            graded = []
+            lock = threading.Lock()
+            writer = stream_writer()
+
+            def on_graded(grade):
+                with lock:
+                    graded.append(grade)
+                    writer({"progress": f"grading {len(graded)}/{len(pending)}"})
+
+            grades, stats = grade_documents_batch(
+                question,
+                pending,
+                max_concurrency=grader_max_concurrency,
+                retries=grader_retries,
+                backoff=grader_retry_backoff,
+                on_graded=on_graded,
+                max_calls=affordable,
             )
-            print(score)
-            grade= score.binary_score
-            if grade == "yes":
-                print(f"Document is relevant to the question")
-                filtered_docs.append(d)
-            else:
-                print(f"Document is not relevant to the question") 
-                continue
-        return {"documents": filtered_docs, "question": question }
+            llm_calls = stats["llm_calls"]
+            print(f"Graded in {stats['wall_time']:.2f}s, saved {stats['time_saved']:.2f}s over sequential grading")
+        else:
+            grades = []
+            llm_calls = len(pending)
+            for i, d in enumerate(pending):
+
+                score = retrieval_grader.invoke(
+                    {"question": question, "document": d}
+                )
+                report_progress(progress=f"grading {i + 1}/{len(pending)}")
+                print(score)
+                grade= score.binary_score
+                if grade == "yes":
+                    print(f"Document is relevant to the question")
+                else:
+                    print(f"Document is not relevant to the question") 
+                grades.append(grade)
+
+        if probabilities is not None:
+            record_samples(question, [probabilities[i] for i in to_grade], [features[i] for i in to_grade], grades)
+        for i, grade in zip(to_grade, grades):
+            verdicts[i] = grade
+        relevant = [i for i, verdict in enumerate(verdicts) if verdict == "yes"]
+        print(f"{len(relevant)}/{len(documents)} documents are relevant to the question, {len(pending)} graded by the LLM")
+        return {
+            "documents": [documents[i] for i in relevant],
+            "document_scores": [scores[i] for i in relevant],
+            "question": question,
+            "budget": charge(budget, llm_calls=llm_calls),
+        }
 
 def transform_query(state:State):
 
         print("rewriting question")
+        report_progress(progress="rewriting question")
         better_question = question_rewriter.invoke({"question": state["question"]})
-        return ({"question": better_question})
+        return ({"question": better_question, "budget": charge(state["budget"], llm_calls=1, loops=1)})
 
 def web_search(state):
     """
     Web search based on the re-phrased question.
 
+    Results already used earlier in the request, before a rewrite, are left out unless
+    the search found nothing new.
+
     Args:
         state (dict): The current graph state
 
     Returns:
-        state (dict): Updates documents key with appended web results
+        state (dict): One document per web result and the updated seen URLs.
     """
 
     print("---WEB SEARCH---")
+    report_progress(progress="searching the web")
     question = state["question"]
+    seen_urls = state.get("seen_urls") or []
 
     # Web search
-    web_search_tool = TavilySearchResults(k=3)
-    docs = web_search_tool.invoke({"query": question})
-    web_results = "\n".join([d["content"] for d in docs])
-    web_results = [Document(page_content=web_results, metadata = {"link": d["url"], "source":"web"}) for d in docs]
+    started = time.perf_counter()
+    web_results = get_web_search().search(question)
+    new_results = [d for d in web_results if canonicalize_url(d.metadata["link"]) not in seen_urls]
+    print(f"{len(web_results)} web results in {time.perf_counter() - started:.2f}s, {len(new_results)} not seen before")
+    if new_results:
+        web_results = new_results
+        seen_urls = seen_urls + [canonicalize_url(d.metadata["link"]) for d in new_results]
+
+    return {"documents": web_results, "document_scores": [], "seen_urls": seen_urls, "question": question}
+
 
-    return {"documents": web_results, "question": question}
+def stock_query(state: State):
+    """
+    Answer numeric stock questions from the columnar stock store.
+
+    Args:
+        state (State): The state of the graph.
+
+    Returns:
+        state (dict): The query result as a single document, or no documents when the
+            question could not be answered from the stock store.
+    """
+    print("---STOCK DATA QUERY---")
+    report_progress(progress="querying stock data")
+    question = state["question"]
+    store = get_stock_store()
+    query = stock_query_parser.invoke({
+        "question": question,
+        "tickers": ", ".join(store.tickers),
+        "today": date.today().isoformat(),
+    })
+    started = time.perf_counter()
+    result = store.query(
+        query.ticker,
+        field=query.field,
+        aggregation=query.aggregation,
+        start_date=query.start_date,
+        end_date=query.end_date,
+    )
+    budget = charge(state["budget"], llm_calls=1)
+    if result is None:
+        print(f"No stock data for {query}")
+        return {"documents": [], "document_scores": [], "question": question, "budget": budget}
+
+    print(f"Answered stock query in {(time.perf_counter() - started) * 1000:.1f}ms")
+    document = Document(
+        page_content=format_stock_result(result),
+        metadata={"link": "", "source": "stock_query"},
+    )
+    return {"documents": [document], "document_scores": [], "question": question, "budget": budget}
 
 
 def route_question(state):
     """
-    Route question to web search or RAG.
+    Route question to web search, RAG or the stock data.
+
+    The local router answers first; the LLM router is only called when its
+    confidence is below LOCAL_ROUTER_THRESHOLD. The first call of a request also
+    starts its budget.
 
     Args:
         state (dict): The current graph state
 
     Returns:
-        str: Next node to call
+        state (dict): The chosen datasource in a new key.
     """
 
     print("---ROUTE QUESTION---")
+    report_progress(progress="routing")
     question = state["question"]
-    source = question_router.invoke({"question": question})
-    if source.datasource == "web_search":
+    budget = state.get("budget") or new_budget()
+    update = {}
+    llm_calls = 0
+    datasource = None
+    if local_router_enabled:
+        # The embedding is kept in the state, so retrieval does not embed the question again
+        update = embed_question(state)
+        datasource, _ = local_question_router.route(question, update["embedded_question"])
+    if datasource is None:
+        datasource = question_router.invoke({"question": question}).datasource
+        llm_calls = 1
+    if datasource == "web_search":
         print("---ROUTE QUESTION TO WEB SEARCH---")
-        return "web_search"
-    elif source.datasource == "vectorstore":
+    elif datasource == "vectorstore":
         print("---ROUTE QUESTION TO RAG---")
-        return "vectorstore"
+    elif datasource == "stock_data":
+        print("---ROUTE QUESTION TO STOCK DATA---")
+    return {**update, "datasource": datasource, "budget": charge(budget, llm_calls=llm_calls)}
+
+def count_context_tokens(totals, packed, unpacked):
+    """Return a copy of the request's context token totals with one more prompt added."""
+    totals = totals or {}
+    return {"packed": totals.get("packed", 0) + packed, "unpacked": totals.get("unpacked", 0) + unpacked}
 
 def generate(state:State):
         """
         Generate a response based on the question and documents.
 
+        The documents are packed into a deduplicated context within CONTEXT_TOKEN_BUDGET,
+        kept in the state so the generation graders judge the same facts.
+
         Args:
             state (State): The state of the graph.
 
@@ -155,9 +470,53 @@ def generate(state:State):
         """
         question = state["question"]
         documents = state["documents"]
-        top_contexts = [(doc.page_content, doc.metadata['link'], doc.metadata['source']) for doc in documents]
-        generation = generation_chain.invoke({"question": question, "context": top_contexts})
-        return {"generation": generation, "question": question , "documents": documents }
+        context, stats = pack_context(documents, state.get("document_scores"))
+        print(
+            f"---CONTEXT: {stats['packed_documents']}/{stats['documents']} documents, "
+            f"~{stats['tokens']} tokens instead of ~{stats['unpacked_tokens']}---"
+        )
+        report_progress(progress="generating answer", event="generation_start")
+        # Stream tokens to the caller as they are produced
+        generation = ""
+        for token in generation_chain.stream({"question": question, "context": context}):
+            generation += token
+            report_progress(token=token)
+        return {
+            "generation": generation,
+            "question": question ,
+            "documents": documents,
+            "context": context,
+            "context_tokens": count_context_tokens(state.get("context_tokens"), stats["tokens"], stats["unpacked_tokens"]),
+            "budget": charge(state["budget"], llm_calls=1),
+        }
+
+def grade_generation(state):
+    """
+    Grade the generation and keep it as the best answer so far when it is grounded.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): The grader verdict, the best generation and the updated budget.
+    """
+    budget = state["budget"]
+    grade, llm_calls = grade_generation_v_documents_and_question(state)
+    update = {
+        "generation_grade": grade,
+        "budget": charge(budget, llm_calls=llm_calls, loops=1 if grade == "not useful" else 0),
+    }
+    if llm_calls:
+        # The grounding check sends the packed context once, whichever grader mode ran
+        update["context_tokens"] = count_context_tokens(
+            state.get("context_tokens"),
+            estimate_tokens(state.get("context") or ""),
+            estimate_tokens("\n\n".join(d.page_content for d in state["documents"])),
+        )
+    if grade in ("useful", "not useful"):
+        update["best_generation"] = state["generation"]
+    return update
+
 
 def grade_generation_v_documents_and_question(state):
     """
@@ -168,15 +527,43 @@ def grade_generation_v_documents_and_question(state):
 
     Returns:
         str: Decision for next node to call
+        int: Number of LLM calls made
     """
 
-    print("---CHECK HALLUCINATIONS---")
     question = state["question"]
     documents = state["documents"]
     generation = state["generation"]
+    context = state.get("context") or pack_context(documents, state.get("document_scores"))[0]
+
+    sources = {doc.metadata.get("source") for doc in documents}
+    if grading_policy == "web_only" and "web" not in sources:
+        print("---DECISION: GRADING SKIPPED, NO WEB DOCUMENTS---")
+        return "useful", 0
+    if grading_policy in ("web_only", "skip_structured") and sources == {"stock_query"}:
+        print("---DECISION: GRADING SKIPPED FOR STRUCTURED ANSWER---")
+        return "useful", 0
+
+    print("---CHECK HALLUCINATIONS---")
+    report_progress(progress="checking answer")
+
+    if generation_grader_mode == "fused":
+        # Grounding and answer relevance in a single structured call
+        score = generation_grader_agent.invoke({
+            "documents": context,
+            "question": question,
+            "generation": generation,
+        })
+        if score.grounded != "yes":
+            print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+            return "not supported", 1
+        if score.answers_question != "yes":
+            print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+            return "not useful", 1
+        print("---DECISION: GENERATION IS GROUNDED AND ADDRESSES QUESTION---")
+        return "useful", 1
 
     score = hallucination_grader_agent.invoke(
-        {"documents": documents, "generation": generation}
+        {"documents": context, "generation": generation}
     )
     grade = score.binary_score
 
@@ -189,64 +576,270 @@ def grade_generation_v_documents_and_question(state):
         grade = score.binary_score
         if grade == "yes":
             print("---DECISION: GENERATION ADDRESSES QUESTION---")
-            return "useful"
+            return "useful", 2
         else:
             print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
-            return "not useful"
+            return "not useful", 2
     else:
         print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
-        return "not supported"
+        return "not supported", 1
+
+def decide_after_grading_documents(state):
+    """
+    Generate from the relevant documents, or rewrite the question while the budget allows.
+
+    The budget is checked for the LLM calls of the next step and of the generation it
+    leads to, so no step starts that would overshoot BUDGET_MAX_LLM_CALLS.
+
+    Returns:
+        str: Next node to call
+    """
+    budget = state["budget"]
+    if len(state["documents"]) > 0:
+        return "generate" if remaining_llm_calls(budget) >= GENERATION_LLM_CALLS else "finalize"
+    if exhausted(budget) or remaining_llm_calls(budget) < REWRITE_LLM_CALLS + GENERATION_LLM_CALLS:
+        return "finalize"
+    return "transform_query"
+
+
+def decide_after_grading_generation(state):
+    """
+    Follow the generation grade, or stop once the budget is exhausted or cannot pay for
+    the regeneration or the rewrite and generation that would follow.
+
+    Returns:
+        str: Decision for next node to call
+    """
+    grade = state["generation_grade"]
+    budget = state["budget"]
+    if grade == "useful":
+        return grade
+    # An unhelpful answer is generated again, an ungrounded one rewrites the question
+    needed = GENERATION_LLM_CALLS if grade == "not useful" else REWRITE_LLM_CALLS + GENERATION_LLM_CALLS
+    if exhausted(budget) or remaining_llm_calls(budget) < needed:
+        return "finalize"
+    return grade
+
+
+def finalize(state):
+    """
+    Stop a request that ran out of budget with the best generation produced so far.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): The best grounded generation, or a fallback answer.
+    """
+    reason = exhausted(state["budget"]) or "llm_calls"
+    record_exhaustion(reason)
+    generation = state.get("best_generation") or FALLBACK_ANSWER
+    return {"generation": generation, "budget_exhausted": reason}
+
+
+class CachedWorkflow:
+    """
+    Compiled workflow behind a semantic answer cache.
+
+    Questions close enough to an already answered one, and naming the same tickers and
+    dates, return the cached generation and sources without running the graph. Other
+    calls are forwarded to the graph.
+    """
+
+    def __init__(self, app, cache):
+        self.app = app
+        self.cache = cache
+
+    def stream(self, inputs, *args, stream_mode="updates", **kwargs):
+        requested = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+
+        def emit(mode, payload):
+            return payload if isinstance(stream_mode, str) else (mode, payload)
+
+        question = inputs["question"]
+        embedded_question = embed_question({"question": question})["embedded_question"]
+        # Questions differing only in a ticker or date embed alike, so these must match too
+        filters = parse_query_filters(question)
+        hit = self.cache.lookup(embedded_question, filters)
+        if hit:
+            print(f"---SEMANTIC CACHE HIT (similarity {hit['similarity']:.3f})---")
+            cached = {
+                "question": question,
+                "generation": hit["generation"],
+                "documents": hit["documents"],
+            }
+            if "custom" in requested:
+                yield emit("custom", {"event": "generation_start"})
+                yield emit("custom", {"token": hit["generation"]})
+            if "updates" in requested:
+                yield emit("updates", {"semantic_cache": cached})
+            if "values" in requested:
+                yield emit("values", cached)
+            return
+
+        # Updates are always streamed internally to know the final answer to cache
+        modes = requested if "updates" in requested else requested + ["updates"]
+        final_state = {}
+        for mode, output in self.app.stream(
+            {**inputs, "embedded_question": embedded_question, "embedded_for": question},
+            *args,
+            stream_mode=modes,
+            **kwargs,
+        ):
+            if mode == "updates":
+                for value in output.values():
+                    final_state.update(value or {})
+            if mode in requested:
+                yield emit(mode, output)
+
+        # Answers cut short by the budget are not worth serving again
+        if final_state.get("generation") and not final_state.get("budget_exhausted"):
+            self.cache.store(
+                question,
+                embedded_question,
+                final_state["generation"],
+                final_state.get("documents", []),
+                filters,
+            )
+
+    def invoke(self, inputs, *args, **kwargs):
+        final_state = {}
+        for output in self.stream(inputs, *args, stream_mode="updates", **kwargs):
+            for value in output.values():
+                final_state.update(value or {})
+        return final_state
+
+    def __getattr__(self, name):
+        return getattr(self.app, name)
+
+
+class TracedWorkflow:
+    """
+    Compiled workflow that traces every request.
+
+    A RequestTracer is attached to the run's callbacks; when the run ends its trace is
+    recorded in the process metrics and the trace file, and emitted as a 'trace' custom
+    event to callers streaming custom events.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def stream(self, inputs, config=None, *, stream_mode="updates", **kwargs):
+        requested = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+
+        def emit(mode, payload):
+            return payload if isinstance(stream_mode, str) else (mode, payload)
+
+        tracer = RequestTracer(inputs["question"], edges=TRACED_EDGES)
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [tracer]
+
+        modes = requested if "updates" in requested else requested + ["updates"]
+        final_state = {}
+        for mode, output in self.app.stream(inputs, config, stream_mode=modes, **kwargs):
+            if mode == "updates":
+                for value in output.values():
+                    final_state.update(value or {})
+            if mode in requested:
+                yield emit(mode, output)
+
+        trace = tracer.finish(final_state)
+        print(
+            f"---TRACE {trace['request_id'][:8]}: {trace['seconds']:.2f}s, {trace['llm_calls']} LLM calls, "
+            f"{trace['prompt_tokens']}+{trace['completion_tokens']} tokens---"
+        )
+        if "custom" in requested:
+            yield emit("custom", {"trace": trace})
+
+    def invoke(self, inputs, config=None, **kwargs):
+        final_state = {}
+        for output in self.stream(inputs, config, stream_mode="updates", **kwargs):
+            for value in output.values():
+                final_state.update(value or {})
+        return final_state
+
+    def __getattr__(self, name):
+        return getattr(self.app, name)
+
+
+TRACED_EDGES = ("decide_after_grading_documents", "decide_after_grading_generation")
+
 
 def create_workflow():
 
     workflow = StateGraph(State)
-    workflow.add_conditional_edges(
-        START,
-        route_question,
-            {
-                "web_search": "web_search",
-                "vectorstore": "embed_question",
-            }   
-        )
+    workflow.add_edge(START, "route_question")
 
+    workflow.add_node("route_question", route_question)
     workflow.add_node("embed_question", embed_question)
+    workflow.add_node("parse_query", parse_query)
     workflow.add_node("retrieve", retrieve)
     workflow.add_node("web_search", web_search) 
+    workflow.add_node("stock_query", stock_query)
     workflow.add_node("grade_documents", grade_documents)
     workflow.add_node("transform_query", transform_query)
     workflow.add_node("generate", generate)
+    workflow.add_node("grade_generation", grade_generation)
+    workflow.add_node("finalize", finalize)
 
-    
+    workflow.add_conditional_edges(
+        "route_question",
+        lambda state: state["datasource"],
+            {
+                "web_search": "web_search",
+                "vectorstore": "embed_question",
+                "stock_data": "stock_query",
+            }   
+        )
     workflow.add_edge("web_search", "generate")
-    workflow.add_edge("embed_question","retrieve")
+    workflow.add_edge("embed_question","parse_query")
+    workflow.add_edge("parse_query","retrieve")
+    workflow.add_conditional_edges(
+        "stock_query",
+        lambda state: ("generate" if len(state["documents"]) > 0 else "embed_question"),
+        {
+            "embed_question": "embed_question",
+            "generate": "generate",
+        }
+    )
     workflow.add_edge("retrieve", "grade_documents")
     workflow.add_conditional_edges(
         "grade_documents",
-        lambda state: ("generate" if len(state["documents"]) > 0 else "transform_query"),
+        decide_after_grading_documents,
         {
             "transform_query": "transform_query",
             "generate": "generate",
+            "finalize": "finalize",
         }   
     )
+    workflow.add_edge("transform_query", "route_question")
+    workflow.add_edge("generate", "grade_generation")
     workflow.add_conditional_edges(
-        "transform_query",
-        route_question,
-            {
-                "web_search": "web_search",
-                "vectorstore": "retrieve",
-            }   
-        )
-    workflow.add_conditional_edges(
-        "generate",
-        grade_generation_v_documents_and_question,
+        "grade_generation",
+        decide_after_grading_generation,
         {
              "useful": END,
              "not useful": "generate",   
              "not supported": "transform_query",
-             
+             "finalize": "finalize",
         }
     )
+    workflow.add_edge("finalize", END)
 
     app = workflow.compile()
+    if semantic_cache_enabled:
+        cache = SemanticCache(
+            semantic_cache_path,
+            threshold=semantic_cache_threshold,
+            max_entries=semantic_cache_max_entries,
+            ttls=semantic_cache_ttls,
+        )
+        app = CachedWorkflow(app, cache)
+
+    if tracing_enabled:
+        app = TracedWorkflow(app)
+    if metrics_port:
+        start_metrics_server(metrics_port)
 
     return app
@@ -0,0 +1,68 @@
+from functools import lru_cache
+import os
+import time
+from dotenv import load_dotenv
+
+from rag_system import create_workflow
+from graph_nodes import local_question_router, get_chain, registered_chains
+from graph_nodes.llm import get_chat_model
+from utils import get_embeddings, get_vector_store, get_stock_store, get_web_search
+
+
+load_dotenv()
+index_name = os.getenv("INDEX_NAME")
+
+
+class Runtime:
+    """
+    Objects shared by every session and request of the process: the compiled graph,
+    the LLM client, the query embedding client and the vector store handle.
+
+    Sessions only keep their chat history, so memory and cold-start cost do not grow
+    with the number of users.
+    """
+
+    def __init__(self):
+        self.llm = get_chat_model()
+        self.workflow = create_workflow()
+        self.warmed_up = False
+
+    @property
+    def embeddings(self):
+        return get_embeddings("RETRIEVAL_QUERY")
+
+    @property
+    def vector_store(self):
+        # Looked up on each use, so a handle rebuilt after a failure is picked up
+        return get_vector_store(index_name)
+
+    def warm_up(self):
+        """
+        Open the connections and load the data the first question would otherwise wait for.
+
+        Failures are reported and skipped, the request that needs the resource retries it.
+        """
+        if self.warmed_up:
+            return
+        started = time.perf_counter()
+        steps = {
+            "chains": lambda: [get_chain(name) for name in registered_chains()],
+            "embeddings": lambda: self.embeddings.embed_query("Tunisian stock market"),
+            "vector store": lambda: self.vector_store,
+            "stock store": lambda: get_stock_store().tickers,
+            "local router": local_question_router.warm_up,
+            "web search client": get_web_search,
+        }
+        for name, step in steps.items():
+            try:
+                step()
+            except Exception as e:
+                print(f"Warm-up of the {name} failed: {e}")
+        self.warmed_up = True
+        print(f"Runtime warmed up in {time.perf_counter() - started:.2f}s")
+
+
+@lru_cache(maxsize=None)
+def get_runtime() -> Runtime:
+    """Return the process-wide runtime."""
+    return Runtime()
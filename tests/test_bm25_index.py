@@ -0,0 +1,108 @@
+from langchain_core.documents import Document
+
+from utils.bm25_index import BM25Index, reciprocal_rank_fusion
+
+
+def ids(results):
+    return [document.id for document, _ in results]
+
+
+def test_search_ranks_matching_documents(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(["a", "b", "c"], ["SFBT dividend 2023", "BIAT results", "SFBT dividend dividend"])
+    assert ids(index.search("sfbt dividend", k=2)) == ["c", "a"]
+    assert index.search("unknown words") == []
+
+
+def test_accents_and_case_are_ignored(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(["a"], ["Résultats de la Société"])
+    assert ids(index.search("resultats societe")) == ["a"]
+
+
+def test_add_replaces_an_existing_id(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(["a"], ["old text"])
+    index.add(["a"], ["new text"])
+    assert len(index) == 1
+    assert index.search("old") == []
+    assert index.search("new")[0][0].page_content == "new text"
+
+
+def test_delete_survives_a_reload(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(["a", "b"], ["SFBT dividend", "SFBT results"])
+    index.delete(["a"])
+    assert "a" not in index
+    assert ids(index.search("sfbt")) == ["b"]
+    assert ids(BM25Index(str(tmp_path)).search("sfbt")) == ["b"]
+
+
+def test_compaction_merges_segments_and_keeps_live_documents(tmp_path):
+    index = BM25Index(str(tmp_path), max_segments=2)
+    index.add(["a"], ["SFBT dividend"])
+    index.add(["b"], ["SFBT results"])
+    index.delete(["a"])
+    index.add(["c"], ["SFBT outlook"])
+    assert len(index.segments) == 1
+    assert sorted(ids(index.search("sfbt"))) == ["b", "c"]
+    assert not (tmp_path / "tombstones.jsonl").exists()
+
+
+def test_search_filters_on_metadata(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(
+        ["a", "b"], ["SFBT dividend", "SFBT dividend dividend"],
+        [{"tickers": ["SFBT"], "start": 20230101}, {"tickers": ["SFBT"], "start": 20240101}],
+    )
+    assert ids(index.search("dividend", filter={"start": {"$lte": 20231231}})) == ["a"]
+
+
+def test_search_picks_up_segments_written_by_another_process(tmp_path):
+    reader = BM25Index(str(tmp_path))
+    assert reader.search("sfbt") == []
+    writer = BM25Index(str(tmp_path))
+    writer.add(["a"], ["SFBT dividend"])
+    assert ids(reader.search("sfbt")) == ["a"]
+    writer.delete(["a"])
+    assert reader.search("sfbt") == []
+
+
+def test_reciprocal_rank_fusion_favours_documents_in_both_rankings():
+    a, b, c = (Document(id=i, page_content=i) for i in "abc")
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], k=2)
+    assert [document.id for document, _ in fused] == ["b", "a"]
+
+
+def test_ticker_and_date_filters_decode_only_the_returned_records(tmp_path, monkeypatch):
+    index = BM25Index(str(tmp_path))
+    metadatas = [{"tickers": ["SFBT" if i % 10 else "BIAT"], "start": 20230000 + i, "end": 20230000 + i}
+                 for i in range(1, 201)]
+    index.add([str(i) for i in range(1, 201)], ["dividend results"] * 200, metadatas)
+    decoded = []
+    record = type(index.segments[0]).record
+    monkeypatch.setattr(type(index.segments[0]), "record", lambda self, i: decoded.append(i) or record(self, i))
+    filter = {"$and": [{"tickers": {"$in": ["BIAT"]}}, {"start": {"$lte": 20230150}}, {"end": {"$gte": 20230100}}]}
+    assert sorted(ids(index.search("dividend", k=10, filter=filter))) == ["100", "110", "120", "130", "140", "150"]
+    assert len(decoded) == 6
+
+
+def test_array_filters_agree_with_matches_filter(tmp_path):
+    from utils.query_filters import matches_filter
+
+    index = BM25Index(str(tmp_path))
+    metadatas = [{"tickers": ["SFBT"], "start": 20230101, "end": 20230131}, {"tickers": ["BIAT", "SFBT"]},
+                 {"start": 20240101, "end": 20240101}, {}]
+    index.add(["a", "b", "c", "d"], ["dividend"] * 4, metadatas)
+    for filter in ({"tickers": "SFBT"}, {"tickers": {"$nin": ["SFBT"]}}, {"start": {"$gte": 20230601}},
+                   {"$or": [{"tickers": "BIAT"}, {"end": {"$lt": 20231231}}]}, {"source": {"$exists": False}}):
+        expected = [doc_id for doc_id, metadata in zip("abcd", metadatas) if matches_filter(metadata, filter)]
+        assert sorted(ids(index.search("dividend", k=10, filter=filter))) == expected
+
+
+def test_segments_without_filter_arrays_are_filtered_from_their_records(tmp_path):
+    BM25Index(str(tmp_path)).add(["a", "b"], ["dividend", "dividend"], [{"tickers": ["SFBT"]}, {"tickers": ["BIAT"]}])
+    segment = next(tmp_path.glob("segment-*"))
+    for name in ("starts.npy", "ends.npy", "tickers.json", "ticker_rows.npy"):
+        (segment / name).unlink()
+    assert ids(BM25Index(str(tmp_path)).search("dividend", filter={"tickers": {"$in": ["BIAT"]}})) == ["b"]
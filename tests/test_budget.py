@@ -0,0 +1,47 @@
+from utils.budget import charge, exhausted, exhaustion_counts, new_budget, record_exhaustion, remaining_llm_calls
+from utils.tracing import render_metrics
+
+
+def test_charge_returns_a_copy():
+    budget = new_budget(max_llm_calls=5)
+    charged = charge(budget, llm_calls=2, loops=1)
+    assert (budget["llm_calls"], budget["loops"]) == (0, 0)
+    assert (charged["llm_calls"], charged["loops"]) == (2, 1)
+
+
+def test_exhausted_reports_the_limit_reached():
+    assert exhausted(new_budget(max_seconds=60, max_llm_calls=5, max_loops=3)) is None
+    assert exhausted(new_budget(max_seconds=0)) == "time"
+    assert exhausted(charge(new_budget(max_llm_calls=2), llm_calls=2)) == "llm_calls"
+    assert exhausted(charge(new_budget(max_loops=1), loops=1)) == "loops"
+
+
+def test_remaining_llm_calls_never_goes_negative():
+    budget = new_budget(max_llm_calls=5)
+    assert remaining_llm_calls(charge(budget, llm_calls=3)) == 2
+    assert remaining_llm_calls(charge(budget, llm_calls=7)) == 0
+
+
+def test_grader_retries_stay_within_max_calls(monkeypatch):
+    import graph_nodes.docs_grader as docs_grader
+    from langchain_core.runnables import RunnableLambda
+
+    calls = []
+
+    def failing_grader(inputs):
+        calls.append(inputs)
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(docs_grader, "retrieval_grader", RunnableLambda(failing_grader))
+    grades, stats = docs_grader.grade_documents_batch("q", ["a", "b", "c"], retries=2, backoff=0, max_calls=4)
+    assert grades == ["no", "no", "no"]
+    assert len(calls) == stats["llm_calls"] == 4
+
+
+def test_exhaustion_is_exported_by_reason():
+    before = exhaustion_counts["loops"]
+    record_exhaustion("loops")
+    metrics = render_metrics()
+    assert "# TYPE rag_budget_exhausted_total counter" in metrics
+    assert f'rag_budget_exhausted_total{{reason="loops"}} {float(before + 1)}' in metrics
+    assert 'rag_budget_exhausted_total{reason="time"}' in metrics
@@ -0,0 +1,44 @@
+from utils.bulk_writer import BulkWriter
+from utils.local_vectorstore import LocalVectorStore
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[1.0, float(i)] for i, _ in enumerate(texts)]
+
+
+class TextOnlyStore:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.calls = 0
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("upsert failed")
+        self.embeddings.embed_documents(texts)
+        return list(ids)
+
+
+def test_each_text_is_embedded_once(tmp_path):
+    embeddings = CountingEmbeddings()
+    store = LocalVectorStore(str(tmp_path), embeddings)
+    ids, stats = BulkWriter(store, batch_size=2, max_workers=2).write(
+        ["a", "b", "c"], [{"n": 1}, {"n": 2}, {"n": 3}], ["1", "2", "3"])
+    assert sorted(ids) == ["1", "2", "3"]
+    assert embeddings.embedded == 3
+    assert len(store) == 3
+    assert stats["stored"] == 3 and stats["failed_batches"] == []
+
+
+def test_text_only_stores_are_retried_and_embed_in_add_texts():
+    embeddings = CountingEmbeddings()
+    store = TextOnlyStore(embeddings)
+    ids, stats = BulkWriter(store, batch_size=10, backoff=0).write(["a", "b"], ids=["1", "2"])
+    assert ids == ["1", "2"]
+    assert embeddings.embedded == 2
+    assert stats["batches"][0]["attempts"] == 2
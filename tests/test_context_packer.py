@@ -0,0 +1,48 @@
+from langchain_core.documents import Document
+
+from utils.context_packer import estimate_tokens, pack_context
+
+SENTENCES = [f"Sentence number {i} about the SFBT dividend of the year." for i in range(40)]
+
+
+def document(text, **metadata):
+    return Document(page_content=text, metadata={"source": "news", **metadata})
+
+
+def test_context_fits_the_budget():
+    documents = [document(" ".join(SENTENCES[i:i + 10]), title=f"Article {i}") for i in range(0, 40, 10)]
+    for budget in (100, 200, 400):
+        context, stats = pack_context(documents, budget=budget)
+        assert estimate_tokens(context) <= budget
+        assert stats["tokens"] == estimate_tokens(context)
+        assert stats["packed_documents"] < 4
+    _, stats = pack_context(documents, budget=10_000)
+    assert stats["packed_documents"] == 4
+
+
+def test_document_crossing_the_budget_is_cut_at_a_sentence():
+    context, _ = pack_context([document(" ".join(SENTENCES))], budget=120)
+    assert context.endswith(".")
+    assert SENTENCES[0] in context and SENTENCES[-1] not in context
+
+
+def test_fragments_below_the_minimum_are_left_out():
+    documents = [document(" ".join(SENTENCES[:8])), document(" ".join(SENTENCES[20:30]))]
+    _, stats = pack_context(documents, budget=140)
+    assert stats["packed_documents"] == 1
+
+
+def test_repeated_rows_and_sentences_are_sent_once():
+    rows = [f"Stock SFBT on date 0{i}/01/2023, closing price 1{i}.00." for i in range(1, 6)]
+    documents = [document("\n".join(rows[:3]), ticker="SFBT"), document("\n".join(rows[1:]), ticker="SFBT")]
+    context, stats = pack_context(documents, budget=10_000)
+    assert all(context.count(row) == 1 for row in rows)
+    assert stats["tokens"] < stats["unpacked_tokens"] + 40
+
+
+def test_documents_are_ordered_by_dense_score():
+    documents = [document("Weak match."), document("Strong match.")]
+    context, _ = pack_context(documents, scores=[{"dense": 0.2}, {"dense": 0.9}], budget=10_000)
+    assert context.index("Strong match.") < context.index("Weak match.")
+    context, _ = pack_context(documents, scores=[{"dense": 0.2}, None], budget=10_000)
+    assert context.index("Weak match.") < context.index("Strong match.")
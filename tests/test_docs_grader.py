@@ -0,0 +1,40 @@
+import types
+
+from langchain_core.runnables import RunnableLambda
+
+import graph_nodes.docs_grader as docs_grader
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def grader(errors, calls):
+    def grade(inputs):
+        calls.append(inputs)
+        if errors:
+            raise errors.pop(0)
+        return types.SimpleNamespace(binary_score="yes")
+
+    return RunnableLambda(grade)
+
+
+def test_retryable_errors_are_retried_after_a_backoff(monkeypatch):
+    calls, sleeps = [], []
+    monkeypatch.setattr(docs_grader, "retrieval_grader", grader([StatusError(429), TimeoutError()], calls))
+    monkeypatch.setattr(docs_grader.time, "sleep", sleeps.append)
+    grades, stats = docs_grader.grade_documents_batch("q", ["a"], retries=2, backoff=1.0)
+    assert grades == ["yes"] and len(calls) == stats["llm_calls"] == 3
+    assert 1.0 <= sleeps[0] <= 2.0 and 2.0 <= sleeps[1] <= 4.0
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    calls, sleeps = [], []
+    error = RuntimeError("bad request")
+    error.__cause__ = StatusError(400)
+    monkeypatch.setattr(docs_grader, "retrieval_grader", grader([error], calls))
+    monkeypatch.setattr(docs_grader.time, "sleep", sleeps.append)
+    grades, _ = docs_grader.grade_documents_batch("q", ["a"], retries=2, backoff=1.0)
+    assert grades == ["no"] and len(calls) == 1 and sleeps == []
@@ -0,0 +1,31 @@
+import pytest
+
+from graph_nodes import local_router
+
+TICKERS = frozenset({"SFBT", "BIAT", "BEST", "STAR", "PGH"})
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(local_router, "known_tickers", lambda: TICKERS)
+    return local_router.LocalRouter(threshold=0.8)
+
+
+@pytest.mark.parametrize("question", [
+    "How did the US stock market do today?",
+    "What is the share price of Apple?",
+    "Tesla stock news",
+    "best price for a used car",
+])
+def test_foreign_and_generic_questions_go_to_the_llm(router, question):
+    assert router.route(question)[0] is None
+
+
+@pytest.mark.parametrize("question, datasource", [
+    ("What was the closing price of SFBT?", "stock_data"),
+    ("Latest news on Poulina", "vectorstore"),
+    ("How did the TUNINDEX close this week?", "vectorstore"),
+    ("Why did Tunisian bank shares fall?", "vectorstore"),
+])
+def test_tunisian_market_questions_are_routed_locally(router, question, datasource):
+    assert router.route(question)[0] == datasource
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from utils.local_vectorstore import LocalVectorStore
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[1.0, float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, float(len(text))]
+
+
+def make_store(tmp_path, **kwargs):
+    return LocalVectorStore(str(tmp_path / "index"), FakeEmbeddings(), **kwargs)
+
+
+def ids(results):
+    return [document.id for document, _ in results]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_nearest_vectors_first(tmp_path, dtype):
+    store = make_store(tmp_path, dtype=dtype)
+    store.add_embeddings(["a", "b", "c"], [[1, 0], [0, 1], [1, 1]], ids=["a", "b", "c"])
+    results = store.similarity_search_by_vector_with_score([1, 0.1], k=2)
+    assert ids(results) == ["a", "c"]
+    assert results[0][1] == pytest.approx(0.995, abs=0.01)
+
+
+def test_upsert_replaces_the_previous_row(tmp_path):
+    store = make_store(tmp_path)
+    store.add_embeddings(["old"], [[1, 0]], ids=["a"])
+    store.add_embeddings(["new"], [[0, 1]], ids=["a"])
+    assert len(store) == 1
+    [(document, score)] = store.similarity_search_by_vector_with_score([0, 1], k=5)
+    assert (document.id, document.page_content) == ("a", "new")
+    assert score == pytest.approx(1.0)
+
+
+def test_delete_survives_a_reopen(tmp_path):
+    store = make_store(tmp_path)
+    store.add_embeddings(["a", "b"], [[1, 0], [0, 1]], ids=["a", "b"])
+    store.delete(["a"])
+    assert ids(store.similarity_search_by_vector_with_score([1, 0], k=5)) == ["b"]
+    assert ids(make_store(tmp_path).similarity_search_by_vector_with_score([1, 0], k=5)) == ["b"]
+
+
+def test_filter_restricts_the_rows_scored(tmp_path):
+    store = make_store(tmp_path)
+    store.add_embeddings(
+        ["a", "b", "c"], [[1, 0], [0.9, 0.1], [0, 1]],
+        metadatas=[{"tickers": ["SFBT"]}, {"tickers": ["BIAT"]}, {"tickers": ["BIAT", "SFBT"]}],
+        ids=["a", "b", "c"],
+    )
+    assert ids(store.similarity_search_by_vector_with_score([1, 0], k=5, filter={"tickers": {"$in": ["BIAT"]}})) == ["b", "c"]
+    assert store.similarity_search_by_vector_with_score([1, 0], k=5, filter={"tickers": "TJARI"}) == []
+
+
+def test_rows_added_by_another_process_are_found(tmp_path):
+    reader = make_store(tmp_path)
+    make_store(tmp_path).add_texts(["SFBT"], ids=["a"])
+    assert ids(reader.similarity_search_with_score("SFBT", k=1)) == ["a"]
+
+
+def test_ivf_is_built_in_the_background_and_exact_search_serves_meanwhile(tmp_path):
+    store = make_store(tmp_path, search_mode="ivf", nprobe=2)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 8))
+    store.add_embeddings([str(i) for i in range(200)], vectors, ids=[str(i) for i in range(200)])
+    # Before the build ends, a query scores every row
+    assert ids(store.similarity_search_by_vector_with_score(vectors[7], k=1)) == ["7"]
+    store._ivf_thread.join()
+    assert int(store._ivf["n_rows"]) == 200
+    assert (tmp_path / "index" / "ivf.npz").exists()
+    assert ids(store.similarity_search_by_vector_with_score(vectors[7], k=1)) == ["7"]
+
+
+def test_rows_of_an_interrupted_write_are_dropped(tmp_path):
+    store = make_store(tmp_path, dtype="int8")
+    store.add_embeddings(["a"], [[1, 0]], ids=["a"])
+    directory = tmp_path / "index"
+    # A write that died after its vectors, with half a record line
+    with open(directory / "vectors.bin", "ab") as f:
+        f.write(np.int8([1, 1]).tobytes())
+    with open(directory / "scales.bin", "ab") as f:
+        f.write(np.float32([1]).tobytes())
+    with open(directory / "records.jsonl", "a") as f:
+        f.write('{"id": "lost", "te')
+    store = make_store(tmp_path)
+    store.add_embeddings(["b"], [[0, 1]], ids=["b"])
+    [(document, score)] = store.similarity_search_by_vector_with_score([0, 1], k=1)
+    assert (document.id, document.page_content) == ("b", "b")
+    assert score == pytest.approx(1.0)
+    assert len(make_store(tmp_path)) == 2
+
+
+def test_many_upserts_and_deletes_keep_the_mask_consistent(tmp_path):
+    store = make_store(tmp_path)
+    for i in range(1500):
+        store.add_embeddings([str(i)], [[1, i % 7]], ids=[str(i % 500)])
+    store.delete(["0", "1"])
+    assert len(store) == 498
+    assert int(store._valid.sum()) == len(make_store(tmp_path)) == 498
@@ -0,0 +1,70 @@
+from langchain_core.documents import Document
+
+from utils.news_dedup import NewsDeduplicator, article_id, canonicalize_url, simhash
+
+ARTICLE = (
+    "La SFBT a annoncé un dividende de 0,800 dinar par action au titre de l'exercice 2023, "
+    "en hausse par rapport à l'année précédente, lors de son assemblée générale ordinaire "
+    "tenue à Tunis. Le conseil d'administration a également présenté les perspectives du groupe."
+)
+
+
+def test_canonical_urls_ignore_tracking_and_host_aliases():
+    url = "https://www.ilboursa.com/marches/sfbt/?utm_source=x&id=3#top"
+    assert canonicalize_url(url) == "https://ilboursa.com/marches/sfbt?id=3"
+    assert article_id(url) == article_id("http://ilboursa.com/marches/sfbt?id=3")
+
+
+def test_near_duplicates_have_close_simhashes():
+    rewrite = ARTICLE + " Source: TAP."
+    assert bin(simhash(ARTICLE) ^ simhash(rewrite)).count("1") <= 3
+    assert bin(simhash(ARTICLE) ^ simhash("BIAT publie ses états financiers semestriels")).count("1") > 3
+
+
+def test_stored_urls_are_not_fetched_again(tmp_path):
+    dedup = NewsDeduplicator(str(tmp_path / "dedup.sqlite"))
+    dedup.mark_stored([Document(page_content=ARTICLE, metadata={"link": "https://ilboursa.com/a"})])
+    articles = [{"link": "https://www.ilboursa.com/a/"}, {"link": "https://ilboursa.com/b"}, {"link": "https://ilboursa.com/b"}]
+    assert dedup.filter_articles(articles) == [{"link": "https://ilboursa.com/b"}]
+
+
+def test_duplicate_texts_are_not_embedded_again(tmp_path):
+    dedup = NewsDeduplicator(str(tmp_path / "dedup.sqlite"))
+    dedup.mark_stored([Document(page_content=ARTICLE, metadata={"link": "https://ilboursa.com/a"})])
+    other = "BIAT publie ses états financiers semestriels avec un produit net bancaire en progression."
+    docs = [
+        Document(page_content=ARTICLE.upper(), metadata={"link": "https://other.tn/1"}),
+        Document(page_content=ARTICLE + " Source: TAP.", metadata={"link": "https://other.tn/2"}),
+        Document(page_content=other, metadata={"link": "https://other.tn/3"}),
+        Document(page_content=other, metadata={"link": "https://other.tn/4"}),
+    ]
+    assert [d.metadata["link"] for d in dedup.filter_docs(docs)] == ["https://other.tn/3"]
+
+
+def test_rejected_duplicates_are_skipped_by_url(tmp_path):
+    dedup = NewsDeduplicator(str(tmp_path / "dedup.sqlite"))
+    dedup.mark_stored([Document(page_content=ARTICLE, metadata={"link": "https://ilboursa.com/a"})])
+    rewrite = Document(page_content=ARTICLE + " Source: TAP.", metadata={"link": "https://other.tn/1?utm_source=x"})
+    assert dedup.filter_docs([rewrite]) == []
+    dedup.mark_duplicates([rewrite])
+    assert dedup.filter_articles([{"link": "https://other.tn/1"}]) == []
+    # A duplicate row is not a content match, and never replaces a stored article
+    dedup.mark_duplicates([Document(page_content="Autre texte.", metadata={"link": "https://other.tn/2"})])
+    other = Document(page_content="Autre texte.", metadata={"link": "https://other.tn/3"})
+    assert dedup.filter_docs([other]) == [other]
+    dedup.mark_duplicates([Document(page_content="Autre texte.", metadata={"link": "https://ilboursa.com/a"})])
+    assert dedup.filter_docs([Document(page_content=ARTICLE, metadata={"link": "https://other.tn/4"})]) == []
+
+
+def test_index_without_the_duplicate_column_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "dedup.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE articles (url TEXT PRIMARY KEY, content_hash TEXT NOT NULL, simhash TEXT NOT NULL, "
+            "band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER, stored_at REAL NOT NULL)"
+        )
+    dedup = NewsDeduplicator(path)
+    dedup.mark_stored([Document(page_content=ARTICLE, metadata={"link": "https://ilboursa.com/a"})])
+    assert dedup.filter_articles([{"link": "https://ilboursa.com/a"}]) == []
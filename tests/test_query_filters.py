@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from utils.query_filters import date_range_metadata, matches_filter, parse_date_range, parse_query_filters
+
+TICKERS = frozenset({"SFBT", "BIAT"})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("closing price on 15/03/2023", (date(2023, 3, 15), date(2023, 3, 15))),
+    ("closing price on 2023-03-15", (date(2023, 3, 15), date(2023, 3, 15))),
+    ("results of March 2023", (date(2023, 3, 1), date(2023, 3, 31))),
+    ("résultats de février 2024", (date(2024, 2, 1), date(2024, 2, 29))),
+    ("dividends in 2021 and 2022", (date(2021, 1, 1), date(2022, 12, 31))),
+    ("closing price on 31/02/2023", None),
+    ("closing price of SFBT", None),
+    ("prix entre 2019 et 2021", (date(2019, 1, 1), date(2021, 12, 31))),
+    ("SFBT performance during the year 2022", (date(2022, 1, 1), date(2022, 12, 31))),
+])
+def test_parse_date_range(text, expected):
+    assert parse_date_range(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "value of 2000 shares of SFBT",
+    "SFBT dividend of 1950 dinars",
+    "what is 2015 + 10",
+    "dividends in 1950",
+    "acheter 2000 actions SFBT",
+])
+def test_numbers_without_date_context_are_not_years(text):
+    assert parse_date_range(text) is None
+
+
+def test_filter_on_tickers_and_dates():
+    assert parse_query_filters("Dividend of SFBT and BIAT in 2023", TICKERS) == {"$and": [
+        {"tickers": {"$in": ["SFBT", "BIAT"]}},
+        {"start": {"$lte": 20231231}},
+        {"end": {"$gte": 20230101}},
+    ]}
+
+
+def test_filter_on_tickers_only_or_nothing():
+    assert parse_query_filters("Latest news about SFBT", TICKERS) == {"tickers": {"$in": ["SFBT"]}}
+    assert parse_query_filters("How does the stock market work?", TICKERS) == {}
+
+
+def test_chunks_match_when_their_range_overlaps_the_question():
+    filter = parse_query_filters("SFBT closing price in March 2023", TICKERS)
+    chunk = {"tickers": ["SFBT"], **date_range_metadata(date(2023, 2, 20), date(2023, 3, 2))}
+    assert matches_filter(chunk, filter)
+    assert not matches_filter({**chunk, "tickers": ["BIAT"]}, filter)
+    assert not matches_filter({"tickers": ["SFBT"], **date_range_metadata(date(2023, 4, 1))}, filter)
+    assert not matches_filter({"tickers": ["SFBT"]}, filter)
+
+
+def test_matches_filter_operators():
+    metadata = {"source": "news", "year": 2023, "tickers": ["SFBT", "BIAT"]}
+    assert matches_filter(metadata, {"source": "news"})
+    assert matches_filter(metadata, {"tickers": "BIAT"})
+    assert matches_filter(metadata, {"year": {"$gt": 2022, "$lt": 2024}})
+    assert matches_filter(metadata, {"$or": [{"source": "web"}, {"tickers": {"$nin": ["TJARI"]}}]})
+    assert matches_filter(metadata, {"link": {"$exists": False}})
+    assert not matches_filter(metadata, {"source": {"$ne": "news"}})
+    with pytest.raises(ValueError):
+        matches_filter(metadata, {"year": {"$regex": "20"}})
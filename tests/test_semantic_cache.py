@@ -0,0 +1,86 @@
+import sqlite3
+
+from langchain_core.documents import Document
+
+from utils.query_filters import parse_query_filters
+from utils.semantic_cache import SemanticCache, classify_freshness
+
+TICKERS = frozenset({"SFBT", "BIAT"})
+
+
+def filters(question):
+    return parse_query_filters(question, TICKERS)
+
+
+def make_cache(tmp_path, **kwargs):
+    return SemanticCache(str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def test_hit_at_or_above_threshold(tmp_path):
+    cache = make_cache(tmp_path, threshold=0.95)
+    cache.store("What does SFBT make?", [1.0, 0.0], "Beverages.", [Document(page_content="SFBT")])
+    hit = cache.lookup([1.0, 0.1])
+    assert hit["generation"] == "Beverages."
+    assert hit["documents"][0].page_content == "SFBT"
+    assert hit["similarity"] >= 0.95
+
+
+def test_miss_below_threshold(tmp_path):
+    cache = make_cache(tmp_path, threshold=0.95)
+    cache.store("What does SFBT make?", [1.0, 0.0], "Beverages.", [])
+    assert cache.lookup([1.0, 0.5]) is None
+    assert make_cache(tmp_path / "empty").lookup([1.0, 0.0]) is None
+
+
+def test_hit_needs_the_same_tickers_and_dates(tmp_path):
+    cache = make_cache(tmp_path)
+    question = "Closing price of SFBT in 2023"
+    cache.store(question, [1.0, 0.0], "12.5 TND", [], filters(question))
+    assert cache.lookup([1.0, 0.0], filters("Closing price of BIAT in 2023")) is None
+    assert cache.lookup([1.0, 0.0], filters("Closing price of SFBT in 2022")) is None
+    assert cache.lookup([1.0, 0.0], filters("Closing price of SFBT")) is None
+    assert cache.lookup([1.0, 0.0], filters("SFBT closing price in 2023"))["generation"] == "12.5 TND"
+
+
+def test_ticker_order_does_not_matter(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("SFBT and BIAT", [1.0, 0.0], "Both.", [], filters("SFBT and BIAT"))
+    assert cache.lookup([1.0, 0.0], filters("BIAT and SFBT"))["generation"] == "Both."
+
+
+def test_entries_without_entities_are_not_served(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            """CREATE TABLE answers (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL,
+            embedding BLOB NOT NULL, generation TEXT NOT NULL, documents TEXT NOT NULL,
+            freshness TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL,
+            last_access REAL NOT NULL)"""
+        )
+        conn.execute(
+            "INSERT INTO answers VALUES (1, 'q', ?, 'old', '[]', 'default', 0, 1e12, 0)",
+            (bytes(8),),
+        )
+    cache = SemanticCache(str(path))
+    assert cache.lookup([0.0, 0.0]) is None
+
+
+def test_expired_entries_are_missed(tmp_path):
+    cache = make_cache(tmp_path, ttls={"news": -1, "default": -1, "historical": -1})
+    cache.store("What does SFBT make?", [1.0, 0.0], "Beverages.", [])
+    assert cache.lookup([1.0, 0.0]) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    for i, embedding in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store(f"question {i}", embedding, f"answer {i}", [])
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([-1.0, 0.0])["generation"] == "answer 2"
+
+
+def test_freshness_classes():
+    assert classify_freshness("latest news on SFBT", []) == "news"
+    assert classify_freshness("SFBT", [Document(page_content="", metadata={"source": "web"})]) == "news"
+    assert classify_freshness("SFBT closing price in 2021", []) == "historical"
+    assert classify_freshness("What does SFBT make?", []) == "default"
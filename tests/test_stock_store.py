@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from utils.stock_store import StockStore, build_stock_store, parse_dates
+
+
+@pytest.fixture
+def store(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    pd.DataFrame({
+        "stock": "SFBT",
+        "date": ["02/01/2023", "03/01/2023", "04/01/2023"],
+        "cloture": [10.0, 11.0, 12.5],
+    }).to_csv(data / "SFBT_history.csv", index=False)
+    build_stock_store(str(data), str(tmp_path / "store"))
+    return StockStore(str(tmp_path / "store"))
+
+
+def test_value_on_a_day(store):
+    assert store.query("SFBT", end_date="2023-01-03")["value"] == 11.0
+
+
+def test_day_first_dates_are_accepted(store):
+    result = store.query("SFBT", aggregation="max", start_date="02/01/2023", end_date="03/01/2023")
+    assert result["value"] == 11.0
+
+
+@pytest.mark.parametrize("day", ["31/12/2023x", "2023-02-30", "yesterday"])
+def test_invalid_dates_give_no_result(store, day):
+    assert store.query("SFBT", end_date=day) is None
+    assert store.query("SFBT", aggregation="mean", start_date=day) is None
+
+
+def test_parse_dates_reads_day_first_then_iso():
+    dates = parse_dates(pd.Series(["05/01/2023", "2023-01-05", "2023-01-05 00:00:00", "not a date"]))
+    assert list(dates[:3].dt.strftime("%Y-%m-%d")) == ["2023-01-05"] * 3
+    assert pd.isna(dates[3])
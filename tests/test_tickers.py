@@ -0,0 +1,23 @@
+from utils.tickers import find_tickers
+
+TICKERS = frozenset({"SFBT", "BIAT", "BEST", "STAR", "CITY", "SMART", "PGH", "SAH"})
+
+
+def test_upper_case_tickers_match():
+    assert find_tickers("Closing price of SFBT and BIAT", TICKERS) == ["SFBT", "BIAT"]
+
+
+def test_ordinary_words_are_not_tickers():
+    assert find_tickers("best price for a used car", TICKERS) == []
+    assert find_tickers("A smart city star", TICKERS) == []
+    assert find_tickers("Best results of Star", TICKERS) == []
+
+
+def test_company_names_match_regardless_of_case():
+    assert find_tickers("latest news on poulina group", TICKERS) == ["PGH"]
+    assert find_tickers("Résultats de SAH Lilas et de sfbt", TICKERS) == ["SAH", "SFBT"]
+
+
+def test_alias_needs_a_listed_ticker():
+    assert find_tickers("Tunisair traffic", TICKERS) == []
+    assert find_tickers("Tunisair traffic", TICKERS | {"TAIR"}) == ["TAIR"]
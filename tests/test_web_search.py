@@ -0,0 +1,27 @@
+from utils.web_search import WebSearch, normalize_query
+
+
+class CountingTool:
+    def __init__(self):
+        self.queries = []
+
+    def invoke(self, inputs):
+        self.queries.append(inputs["query"])
+        return [{"url": f"https://example.com/{len(self.queries)}", "content": inputs["query"]}]
+
+
+def test_normalize_query_keeps_word_order():
+    assert normalize_query("  Dividende   de la  SFBT ?") == "dividende de la sfbt"
+    assert normalize_query("Résultats BIAT!") == normalize_query("resultats biat")
+    assert normalize_query("BIAT buys SFBT") != normalize_query("SFBT buys BIAT")
+
+
+def test_cache_is_keyed_on_freshness_and_query():
+    tool = CountingTool()
+    search = WebSearch(tool, ttls={"news": -1, "default": 60, "historical": 60})
+    search.search("SFBT dividend policy")
+    search.search("sfbt, dividend policy")
+    assert len(tool.queries) == 1
+    search.search("latest SFBT news")
+    search.search("latest SFBT news")
+    assert len(tool.queries) == 3
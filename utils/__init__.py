@@ -1,2 +1,63 @@
-from .pinecone_vectorstore import get_pinecone_vector_store
-from .constants import NEWS_BASE_URL, PAGE_URL
\ No newline at end of file
+from importlib import import_module
+
+# Public names and the submodule defining them. Submodules are imported on first
+# access, so a script using the news helpers does not load Pinecone or the LLM clients.
+_exports = {
+    "get_pinecone_vector_store": ".pinecone_vectorstore",
+    "invalidate_pinecone_vector_store": ".pinecone_vectorstore",
+    "record_query_time": ".pinecone_vectorstore",
+    "get_vector_store_stats": ".pinecone_vectorstore",
+    "LocalVectorStore": ".local_vectorstore",
+    "get_vector_store": ".vector_store",
+    "invalidate_vector_store": ".vector_store",
+    "get_embeddings": ".embeddings",
+    "BulkWriter": ".bulk_writer",
+    "StockStore": ".stock_store",
+    "build_stock_store": ".stock_store",
+    "get_stock_store": ".stock_store",
+    "format_stock_result": ".stock_store",
+    "parse_dates": ".stock_store",
+    "NewsDeduplicator": ".news_dedup",
+    "article_id": ".news_dedup",
+    "canonicalize_url": ".news_dedup",
+    "WebSearch": ".web_search",
+    "get_web_search": ".web_search",
+    "new_budget": ".budget",
+    "charge": ".budget",
+    "exhausted": ".budget",
+    "remaining_llm_calls": ".budget",
+    "record_exhaustion": ".budget",
+    "known_tickers": ".tickers",
+    "find_tickers": ".tickers",
+    "parse_query_filters": ".query_filters",
+    "matches_filter": ".query_filters",
+    "date_range_metadata": ".query_filters",
+    "SemanticCache": ".semantic_cache",
+    "BM25Index": ".bm25_index",
+    "get_bm25_index": ".bm25_index",
+    "reciprocal_rank_fusion": ".bm25_index",
+    "estimate_tokens": ".context_packer",
+    "pack_context": ".context_packer",
+    "RequestTracer": ".tracing",
+    "record_trace": ".tracing",
+    "metrics_summary": ".tracing",
+    "render_metrics": ".tracing",
+    "start_metrics_server": ".tracing",
+    "register_counter": ".tracing",
+    "NEWS_BASE_URL": ".constants",
+    "PAGE_URL": ".constants",
+    "NEWS_PAGE_URL_TEMPLATE": ".constants",
+}
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,415 @@
+from langchain_core.documents import Document
+
+from dotenv import load_dotenv
+from collections import Counter, defaultdict
+from functools import lru_cache
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import unicodedata
+import numpy as np
+
+from .query_filters import matches_filter
+
+
+load_dotenv()
+bm25_index_dir = os.getenv("BM25_INDEX_DIR", ".cache/bm25")
+bm25_max_segments = int(os.getenv("BM25_MAX_SEGMENTS", "8"))
+
+# Dates are kept whole so "12/03/2024" only matches that day, then plain words
+TOKEN = re.compile(r"\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2}|\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-case, accent-free tokens, so 'Société' and 'societe' match."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return TOKEN.findall(text)
+
+
+RANGE_OPERATORS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+
+def _filter_fields(metadatas):
+    """
+    Filter arrays of a segment's documents.
+
+    Returns:
+        starts, ends (np.ndarray): yyyymmdd start and end keys per document, 0 when missing.
+        tickers (dict): Ticker mapped to the slice of ticker_rows holding its documents.
+        ticker_rows (np.ndarray): Documents of each ticker, ticker after ticker.
+    """
+    starts = np.array([m.get("start") or 0 for m in metadatas], dtype=np.int64)
+    ends = np.array([m.get("end") or 0 for m in metadatas], dtype=np.int64)
+    rows = defaultdict(list)
+    for i, metadata in enumerate(metadatas):
+        for ticker in metadata.get("tickers") or []:
+            rows[ticker].append(i)
+    tickers, ticker_rows, position = {}, [], 0
+    for ticker in sorted(rows):
+        tickers[ticker] = [position, len(rows[ticker])]
+        ticker_rows.extend(rows[ticker])
+        position += len(rows[ticker])
+    return starts, ends, tickers, np.asarray(ticker_rows, dtype=np.int32)
+
+
+class _Segment:
+    """
+    Immutable part of the index written by one add call.
+
+    Postings are stored term by term in two flat arrays, doc_ids.npy and tfs.npy, and
+    read through memory maps; terms.json maps each term to its slice. The fields retrieval
+    filters on are kept as arrays too: the start and end date keys of each document, and
+    the documents of each ticker in tickers.json and ticker_rows.npy. Records are read
+    from records.jsonl at their byte offsets only for the returned hits.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.number = int(os.path.basename(directory).split("-")[1])
+        with open(os.path.join(directory, "terms.json"), encoding="utf-8") as f:
+            self.terms = json.load(f)
+        with open(os.path.join(directory, "ids.json"), encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.doc_ids = np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(directory, "tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(directory, "lengths.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "records.jsonl"), "rb") as f:
+            # The map stays readable after a compaction removes the segment, until searches using it end
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.live = np.ones(len(self.ids), dtype=bool)
+        if os.path.exists(os.path.join(directory, "starts.npy")):
+            self.starts = np.load(os.path.join(directory, "starts.npy"), mmap_mode="r")
+            self.ends = np.load(os.path.join(directory, "ends.npy"), mmap_mode="r")
+            with open(os.path.join(directory, "tickers.json"), encoding="utf-8") as f:
+                self.tickers = json.load(f)
+            self.ticker_rows = np.load(os.path.join(directory, "ticker_rows.npy"), mmap_mode="r")
+        else:
+            # Segments written before the filter arrays existed get them from their records once
+            fields = _filter_fields([self.record(i)["metadata"] for i in range(len(self.ids))])
+            self.starts, self.ends, self.tickers, self.ticker_rows = fields
+
+    @staticmethod
+    def write(directory, ids, texts, metadatas):
+        tmp = directory + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        postings = defaultdict(list)
+        lengths = np.empty(len(texts), dtype=np.int32)
+        offsets = np.empty(len(texts), dtype=np.int64)
+        with open(os.path.join(tmp, "records.jsonl"), "wb") as f:
+            for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+                tokens = tokenize(text)
+                lengths[i] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    postings[term].append((i, tf))
+                offsets[i] = f.tell()
+                f.write(json.dumps({"text": text, "metadata": metadata}).encode("utf-8") + b"\n")
+
+        terms, doc_ids, tfs, position = {}, [], [], 0
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [position, len(entries)]
+            doc_ids.extend(i for i, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+            position += len(entries)
+        np.save(os.path.join(tmp, "doc_ids.npy"), np.asarray(doc_ids, dtype=np.int32))
+        np.save(os.path.join(tmp, "tfs.npy"), np.asarray(tfs, dtype=np.float32))
+        np.save(os.path.join(tmp, "lengths.npy"), lengths)
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        starts, ends, tickers, ticker_rows = _filter_fields(metadatas)
+        np.save(os.path.join(tmp, "starts.npy"), starts)
+        np.save(os.path.join(tmp, "ends.npy"), ends)
+        np.save(os.path.join(tmp, "ticker_rows.npy"), ticker_rows)
+        with open(os.path.join(tmp, "tickers.json"), "w", encoding="utf-8") as f:
+            json.dump(tickers, f)
+        with open(os.path.join(tmp, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(os.path.join(tmp, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(list(ids), f)
+        os.replace(tmp, directory)
+
+    def postings(self, term):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None, None
+        start, count = entry
+        return self.doc_ids[start:start + count], self.tfs[start:start + count]
+
+    def record(self, i):
+        start = int(self.offsets[i])
+        end = self._records.find(b"\n", start)
+        return json.loads(self._records[start:end])
+
+    def ticker_mask(self, tickers):
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for ticker in tickers:
+            entry = self.tickers.get(ticker)
+            if entry:
+                mask[self.ticker_rows[entry[0]:entry[0] + entry[1]]] = True
+        return mask
+
+    def filter_mask(self, filter):
+        """
+        Documents of the segment matching a metadata filter, from the filter arrays.
+
+        Returns:
+            np.ndarray | None: Boolean mask, None when the filter uses other fields or operators.
+        """
+        if "$and" in filter or "$or" in filter:
+            if len(filter) > 1:
+                return None
+            masks = [self.filter_mask(clause) for clause in next(iter(filter.values()))]
+            if any(mask is None for mask in masks):
+                return None
+            combine = np.logical_and if "$and" in filter else np.logical_or
+            return combine.reduce(masks) if masks else np.full(len(self.ids), "$and" in filter)
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in filter.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if field == "tickers" and operator in ("$eq", "$in", "$ne", "$nin"):
+                    matched = self.ticker_mask([operand] if operator in ("$eq", "$ne") else operand)
+                    mask &= matched if operator in ("$eq", "$in") else ~matched
+                elif field in ("start", "end") and operator in RANGE_OPERATORS:
+                    values = np.asarray(self.starts if field == "start" else self.ends)
+                    # Documents without the field match no comparison, as in matches_filter
+                    mask &= (values > 0) & RANGE_OPERATORS[operator](values, operand)
+                else:
+                    return None
+        return mask
+
+
+class BM25Index:
+    """
+    Local BM25 index over the same chunks and articles as the vector store.
+
+    The index is a list of memory-mapped segments. Each add call writes a new segment,
+    and ids written again or deleted are masked out of older segments through a
+    tombstone log. Segments are merged into one when there are more than max_segments.
+    Segments written by another process, such as an ingestion job sharing the
+    directory, are picked up by the next search.
+    """
+
+    def __init__(self, directory, k1=1.5, b=0.75, max_segments=bm25_max_segments):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _version(self):
+        # Segments are added and removed by renaming directories, which changes the
+        # directory mtime; deletions append to the tombstone log
+        tombstones = os.path.join(self.directory, "tombstones.jsonl")
+        stat = os.stat(tombstones) if os.path.exists(tombstones) else None
+        return os.stat(self.directory).st_mtime_ns, stat and (stat.st_mtime_ns, stat.st_size)
+
+    def _reload_if_changed(self):
+        if self._version() == self.version:
+            return
+        try:
+            self._load()
+        except OSError as e:
+            # A compaction running elsewhere removed a segment while it was read, the next search retries
+            print(f"BM25 index reload failed, serving the loaded segments: {e}")
+            return
+        print(f"Reloaded the BM25 index, {len(self._locations)} documents in {len(self.segments)} segments")
+
+    def _load(self):
+        version = self._version()
+        segments = [
+            _Segment(os.path.join(self.directory, name))
+            for name in sorted(os.listdir(self.directory))
+            if name.startswith("segment-") and not name.endswith(".tmp")
+        ]
+        # Location of the live copy of each id, later segments win
+        locations = {}
+        for segment in segments:
+            for i, doc_id in enumerate(segment.ids):
+                previous = locations.get(doc_id)
+                if previous:
+                    previous[0].live[previous[1]] = False
+                locations[doc_id] = (segment, i)
+        tombstones = os.path.join(self.directory, "tombstones.jsonl")
+        if os.path.exists(tombstones):
+            with open(tombstones, encoding="utf-8") as f:
+                for line in f:
+                    doc_id, before = json.loads(line)
+                    location = locations.get(doc_id)
+                    if location and location[0].number <= before:
+                        location[0].live[location[1]] = False
+                        del locations[doc_id]
+        self.segments, self._locations, self.version = segments, locations, version
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._locations
+
+    def add(self, ids, texts, metadatas=None):
+        """
+        Index texts as a new segment. Ids already in the index are replaced.
+
+        Args:
+            ids (list[str]): Ids shared with the vector store.
+            texts (list[str]): Texts to index.
+            metadatas (list[dict]): Optional metadata per text.
+        """
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            self._reload_if_changed()
+            number = max((s.number for s in self.segments), default=0) + 1
+            directory = os.path.join(self.directory, f"segment-{number:06d}")
+            _Segment.write(directory, ids, texts, metadatas)
+            segment = _Segment(directory)
+            for i, doc_id in enumerate(segment.ids):
+                previous = self._locations.get(doc_id)
+                if previous:
+                    previous[0].live[previous[1]] = False
+                self._locations[doc_id] = (segment, i)
+            self.segments.append(segment)
+            if len(self.segments) > self.max_segments:
+                self._compact()
+            self.version = self._version()
+
+    def delete(self, ids):
+        """Remove ids from the index."""
+        with self._lock:
+            self._reload_if_changed()
+            before = max((s.number for s in self.segments), default=0)
+            with open(os.path.join(self.directory, "tombstones.jsonl"), "a", encoding="utf-8") as f:
+                for doc_id in ids:
+                    location = self._locations.pop(doc_id, None)
+                    if location:
+                        location[0].live[location[1]] = False
+                        f.write(json.dumps([doc_id, before]) + "\n")
+            self.version = self._version()
+
+    def _compact(self):
+        # Merge the live documents of every segment into one new segment
+        ids, texts, metadatas = [], [], []
+        for doc_id, (segment, i) in self._locations.items():
+            record = segment.record(i)
+            ids.append(doc_id)
+            texts.append(record["text"])
+            metadatas.append(record["metadata"])
+        number = max(s.number for s in self.segments) + 1
+        if ids:
+            _Segment.write(os.path.join(self.directory, f"segment-{number:06d}"), ids, texts, metadatas)
+        # Searches still scoring the old segments keep reading them through their memory maps
+        for segment in self.segments:
+            shutil.rmtree(segment.directory)
+        tombstones = os.path.join(self.directory, "tombstones.jsonl")
+        if os.path.exists(tombstones):
+            os.remove(tombstones)
+        self._load()
+        print(f"Compacted the BM25 index into one segment of {len(ids)} documents")
+
+    def search(self, query, k=5, filter=None):
+        """
+        Rank the indexed documents against a query with BM25.
+
+        The index lock is only held to take a snapshot of the segments; scoring reads
+        the immutable segment arrays, so concurrent searches run in parallel.
+
+        Args:
+            query (str): Query text.
+            k (int): Number of documents to return.
+            filter (dict): Optional metadata filter. Filters on tickers and start/end
+                dates are applied to the segment arrays before ranking; others are
+                checked on the records of the best scored documents until k match.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their BM25 score, best first.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            self._reload_if_changed()
+            segments = list(self.segments)
+            n_docs = len(self._locations)
+        if not terms or not n_docs:
+            return []
+        live = {s.number: s.live.copy() for s in segments}
+        live_length = sum(float(s.lengths[live[s.number]].sum()) for s in segments)
+        average_length = max(live_length / n_docs, 1e-9)
+
+        postings = {term: [(s, *s.postings(term)) for s in segments] for term in terms}
+        scores = {s.number: np.zeros(len(s.ids), dtype=np.float32) for s in segments}
+        for term, entries in postings.items():
+            df = sum(int(live[s.number][ids].sum()) for s, ids, _ in entries if ids is not None)
+            if not df:
+                continue
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for segment, ids, tfs in entries:
+                if ids is None:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * segment.lengths[ids] / average_length)
+                np.add.at(scores[segment.number], ids, idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        candidates, check_records = [], False
+        for segment in segments:
+            allowed = live[segment.number]
+            if filter:
+                mask = segment.filter_mask(filter)
+                if mask is None:
+                    check_records = True
+                else:
+                    allowed = allowed & mask
+            segment_scores = np.where(allowed, scores[segment.number], 0.0)
+            top = np.flatnonzero(segment_scores > 0)
+            if not check_records and len(top) > k:
+                top = top[np.argpartition(-segment_scores[top], k - 1)[:k]]
+            candidates += [(float(segment_scores[i]), segment, int(i)) for i in top]
+
+        candidates.sort(key=lambda c: -c[0])
+        results = []
+        for score, segment, i in candidates:
+            record = segment.record(i)
+            if check_records and not matches_filter(record["metadata"], filter):
+                continue
+            results.append((
+                Document(id=segment.ids[i], page_content=record["text"], metadata=record["metadata"]),
+                score,
+            ))
+            if len(results) == k:
+                break
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_bm25_index(index_name: str) -> BM25Index:
+    """Return the process-wide BM25 index stored under BM25_INDEX_DIR/<index_name>."""
+    return BM25Index(os.path.join(bm25_index_dir, index_name or "default"))
+
+
+def reciprocal_rank_fusion(rankings, k=5, rrf_k=60):
+    """
+    Fuse ranked document lists by reciprocal rank.
+
+    Args:
+        rankings (list[list[Document]]): Ranked lists, best first.
+        k (int): Number of documents to return.
+        rrf_k (int): Rank offset damping the weight of the first ranks.
+
+    Returns:
+        list[tuple[Document, float]]: Documents with their fused score, best first.
+    """
+    scores, documents = defaultdict(float), {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.id or document.page_content
+            scores[key] += 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, document)
+    best = sorted(scores, key=lambda key: -scores[key])[:k]
+    return [(documents[key], scores[key]) for key in best]
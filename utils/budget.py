@@ -0,0 +1,69 @@
+from dotenv import load_dotenv
+import os
+import time
+
+from .tracing import register_counter
+
+
+load_dotenv()
+budget_max_seconds = float(os.getenv("BUDGET_MAX_SECONDS", "60"))
+budget_max_llm_calls = int(os.getenv("BUDGET_MAX_LLM_CALLS", "20"))
+budget_max_loops = int(os.getenv("BUDGET_MAX_LOOPS", "3"))
+
+# Requests that ran out of budget, by reason
+exhaustion_counts = {"time": 0, "llm_calls": 0, "loops": 0}
+register_counter("budget_exhausted", "Requests stopped because their budget ran out.", "reason", exhaustion_counts)
+
+
+def new_budget(max_seconds=None, max_llm_calls=None, max_loops=None):
+    """
+    Create the budget of one request.
+
+    Args:
+        max_seconds (float): Wall-clock limit, defaults to BUDGET_MAX_SECONDS.
+        max_llm_calls (int): LLM call limit, defaults to BUDGET_MAX_LLM_CALLS.
+        max_loops (int): Limit on query rewrites and regenerations, defaults to BUDGET_MAX_LOOPS.
+
+    Returns:
+        budget (dict): Limits and usage counters, stored in the graph state.
+    """
+    return {
+        "started_at": time.time(),
+        "max_seconds": budget_max_seconds if max_seconds is None else max_seconds,
+        "max_llm_calls": budget_max_llm_calls if max_llm_calls is None else max_llm_calls,
+        "max_loops": budget_max_loops if max_loops is None else max_loops,
+        "llm_calls": 0,
+        "loops": 0,
+    }
+
+
+def charge(budget, llm_calls=0, loops=0):
+    """Return a copy of the budget with the given usage added."""
+    return {**budget, "llm_calls": budget["llm_calls"] + llm_calls, "loops": budget["loops"] + loops}
+
+
+def remaining_llm_calls(budget):
+    """Number of LLM calls the request may still make."""
+    return max(0, budget["max_llm_calls"] - budget["llm_calls"])
+
+
+def exhausted(budget):
+    """
+    Check whether a request may run another loop.
+
+    Returns:
+        str | None: 'time', 'llm_calls' or 'loops' when that limit is reached, None otherwise.
+    """
+    if time.time() - budget["started_at"] >= budget["max_seconds"]:
+        return "time"
+    if budget["llm_calls"] >= budget["max_llm_calls"]:
+        return "llm_calls"
+    if budget["loops"] >= budget["max_loops"]:
+        return "loops"
+    return None
+
+
+def record_exhaustion(reason):
+    """Count a request that stopped because its budget ran out."""
+    exhaustion_counts[reason] += 1
+    print(f"---BUDGET EXHAUSTED ({reason}), {sum(exhaustion_counts.values())} requests so far---")
@@ -0,0 +1,127 @@
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import sys
+import time
+
+
+load_dotenv()
+bulk_batch_size = int(os.getenv("BULK_BATCH_SIZE", "100"))
+bulk_max_workers = int(os.getenv("BULK_MAX_WORKERS", "4"))
+bulk_max_retries = int(os.getenv("BULK_MAX_RETRIES", "3"))
+bulk_backoff = float(os.getenv("BULK_BACKOFF_SECONDS", "1.0"))
+
+
+class BulkWriter:
+    """
+    Embed and upsert documents into a vector store in parallel batches.
+
+    Each batch is embedded once and its vectors upserted as they are, so embedding and
+    upsert latencies are measured separately. Stores that only take texts embed them
+    in add_texts, and the whole time counts as upsert. Failed batches are retried on
+    their own with exponential backoff; the other batches are kept.
+    """
+
+    def __init__(self, vector_store, batch_size=bulk_batch_size, max_workers=bulk_max_workers,
+                 max_retries=bulk_max_retries, backoff=bulk_backoff):
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _add_embeddings(self):
+        # Writer of precomputed vectors for the store, None when it only takes texts
+        if hasattr(self.vector_store, "add_embeddings"):
+            return self.vector_store.add_embeddings
+        # A Pinecone store exists only once langchain_pinecone is loaded, it is not imported here
+        pinecone = sys.modules.get("langchain_pinecone")
+        if pinecone and isinstance(self.vector_store, pinecone.PineconeVectorStore):
+            from .pinecone_vectorstore import add_embeddings
+
+            return lambda *args, **kwargs: add_embeddings(self.vector_store, *args, **kwargs)
+        return None
+
+    def _write_batch(self, number, texts, metadatas, ids):
+        for attempt in range(self.max_retries + 1):
+            try:
+                started = time.perf_counter()
+                add_embeddings = self._add_embeddings()
+                if add_embeddings:
+                    vectors = self.vector_store.embeddings.embed_documents(texts)
+                    embedded = time.perf_counter()
+                    written = add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+                else:
+                    embedded = started
+                    written = self.vector_store.add_texts(texts, metadatas=metadatas, ids=ids)
+                upserted = time.perf_counter()
+                return {
+                    "batch": number,
+                    "ids": written,
+                    "docs": len(texts),
+                    "attempts": attempt + 1,
+                    "embed_seconds": embedded - started,
+                    "upsert_seconds": upserted - embedded,
+                }
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Batch {number} failed after {attempt + 1} attempts: {e}")
+                    return {"batch": number, "ids": [], "docs": len(texts), "attempts": attempt + 1, "error": str(e)}
+                delay = self.backoff * 2 ** attempt
+                print(f"Batch {number} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def write(self, texts, metadatas=None, ids=None):
+        """
+        Write texts to the vector store.
+
+        Args:
+            texts (list[str]): Texts to store.
+            metadatas (list[dict]): Optional metadata per text.
+            ids (list[str]): Optional ids per text.
+
+        Returns:
+            ids: Ids of the stored texts, in input order, without the failed batches.
+            stats (dict): Overall throughput and per-batch embed and upsert latencies.
+        """
+        texts = list(texts)
+        started = time.perf_counter()
+        batches = []
+        for number, start in enumerate(range(0, len(texts), self.batch_size)):
+            end = start + self.batch_size
+            batches.append((
+                number,
+                texts[start:end],
+                metadatas[start:end] if metadatas else None,
+                ids[start:end] if ids else None,
+            ))
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._write_batch, *batch) for batch in batches]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if "error" not in result:
+                    print(
+                        f"Batch {result['batch']}: {result['docs']} docs, "
+                        f"embed {result['embed_seconds']:.2f}s, upsert {result['upsert_seconds']:.2f}s"
+                    )
+
+        results.sort(key=lambda r: r["batch"])
+        elapsed = time.perf_counter() - started
+        stored = sum(r["docs"] for r in results if "error" not in r)
+        stats = {
+            "docs": len(texts),
+            "stored": stored,
+            "failed_batches": [r["batch"] for r in results if "error" in r],
+            "seconds": elapsed,
+            "docs_per_second": stored / elapsed if elapsed else 0.0,
+            "batches": results,
+        }
+        print(f"Stored {stored}/{len(texts)} documents in {elapsed:.2f}s ({stats['docs_per_second']:.1f} docs/s)")
+        return [id_ for r in results for id_ in r["ids"]], stats
+
+    def write_documents(self, docs, ids=None):
+        """Write Documents to the vector store, see write."""
+        return self.write([d.page_content for d in docs], [d.metadata for d in docs], ids)
@@ -1,2 +1,4 @@
 NEWS_BASE_URL = "https://www.ilboursa.com"
-PAGE_URL= NEWS_BASE_URL+"/marches/actualites_bourse_tunis"
\ No newline at end of file
+PAGE_URL= NEWS_BASE_URL+"/marches/actualites_bourse_tunis"
+# Listing pages after the first one
+NEWS_PAGE_URL_TEMPLATE = PAGE_URL + "/{page}"
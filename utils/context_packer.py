@@ -0,0 +1,98 @@
+from dotenv import load_dotenv
+import math
+import os
+import re
+
+
+load_dotenv()
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+context_min_fragment_tokens = int(os.getenv("CONTEXT_MIN_FRAGMENT_TOKENS", "50"))
+
+# Stock chunks are one row per line, articles are split into sentences
+SEGMENT = re.compile(r"\n+|(?<=[.!?])\s+(?=[A-Z0-9\"«])")
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text):
+    """Rough token count of a text, about four characters per token for Gemini and GPT tokenizers."""
+    return math.ceil(len(text) / 4)
+
+
+def _segments(text):
+    return [segment.strip() for segment in SEGMENT.split(text) if segment.strip()]
+
+
+def _segment_key(segment):
+    return " ".join(WORD.findall(segment.lower()))
+
+
+def _header(number, metadata):
+    parts = [metadata.get("source") or "document"]
+    for key in ("ticker", "title", "date", "link"):
+        if metadata.get(key):
+            parts.append(str(metadata[key]))
+    return f"[{number}] " + " | ".join(parts)
+
+
+def pack_context(documents, scores=None, budget=context_token_budget):
+    """
+    Pack documents into one prompt context of at most budget estimated tokens.
+
+    Documents are ordered by dense similarity when every one has a score, otherwise
+    kept in their order, which is best first from retrieval. Rows and sentences already
+    packed from a better document are dropped, so overlapping chunks and duplicate
+    articles are sent once. The document crossing the budget is cut at a segment
+    boundary, or left out when less than CONTEXT_MIN_FRAGMENT_TOKENS would fit.
+
+    Args:
+        documents (list[Document]): Documents for the prompt.
+        scores (list[dict]): Optional retrieval scores per document, in the same order.
+        budget (int): Maximum estimated tokens of the packed context.
+
+    Returns:
+        context (str): Numbered documents, each a one-line header and its text.
+        stats (dict): Documents in and packed, and estimated tokens of the packed
+            context and of the raw document texts.
+    """
+    order = list(range(len(documents)))
+    if scores and len(scores) == len(documents) and all(s and s.get("dense") is not None for s in scores):
+        order.sort(key=lambda i: -scores[i]["dense"])
+
+    seen, blocks, used = set(), [], 0
+    for i in order:
+        document = documents[i]
+        segments = []
+        for segment in _segments(document.page_content):
+            key = _segment_key(segment)
+            if key and key not in seen:
+                seen.add(key)
+                segments.append(segment)
+        if not segments:
+            continue
+
+        header = _header(len(blocks) + 1, document.metadata)
+        separator = "\n" if "\n" in document.page_content else " "
+        remaining = budget - used - estimate_tokens(header) - 1
+        text = separator.join(segments)
+        if estimate_tokens(text) > remaining:
+            kept, size = [], 0
+            for segment in segments:
+                size += estimate_tokens(segment) + 1
+                if size > remaining:
+                    break
+                kept.append(segment)
+            if not kept or remaining < context_min_fragment_tokens:
+                break
+            text = separator.join(kept)
+        block = f"{header}\n{text}"
+        blocks.append(block)
+        used += estimate_tokens(block) + 1
+
+    context = "\n\n".join(blocks)
+    stats = {
+        "documents": len(documents),
+        "packed_documents": len(blocks),
+        "tokens": estimate_tokens(context),
+        "unpacked_tokens": estimate_tokens("\n\n".join(d.page_content for d in documents)),
+    }
+    return context, stats
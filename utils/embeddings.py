@@ -0,0 +1,134 @@
+from langchain_core.embeddings import Embeddings
+
+from dotenv import load_dotenv
+from functools import lru_cache
+import hashlib
+import os
+import sqlite3
+import numpy as np
+
+
+load_dotenv()
+embedding_model = os.environ.get("EMBEDDING_MODEL")
+embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with a persistent on-disk cache.
+
+    Vectors are keyed on a hash of the text, the model name and the task type, so the
+    same text embedded for retrieval queries and for documents is cached separately.
+    Cache misses are embedded in bulk calls of at most batch_size texts.
+    """
+
+    def __init__(self, embeddings, model, task_type, cache_path, batch_size=100):
+        self.embeddings = embeddings
+        self.model = model
+        self.task_type = task_type
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    def _key(self, text):
+        content = f"{self.model}\x00{self.task_type}\x00{text}".encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+        return found
+
+    def embed_documents(self, texts):
+        """
+        Embed texts, only calling the embedding model for texts not in the cache.
+
+        Args:
+            texts (list[str]): Texts to embed.
+
+        Returns:
+            list[list[float]]: One embedding per text.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(list(set(keys)))
+
+        misses = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                misses[key] = text
+        miss_keys = list(misses)
+        for start in range(0, len(miss_keys), self.batch_size):
+            batch_keys = miss_keys[start:start + self.batch_size]
+            batch_vectors = self.embeddings.embed_documents([misses[key] for key in batch_keys])
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [
+                        (key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in zip(batch_keys, batch_vectors)
+                    ],
+                )
+            vectors.update(zip(batch_keys, batch_vectors))
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text):
+        """
+        Embed a single query text through the cache.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            list[float]: Embedding of the text.
+        """
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                (key, np.asarray(vector, dtype=np.float32).tobytes()),
+            )
+        return list(vector)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(task_type: str) -> CachedEmbeddings:
+    """
+    Return the process-wide cached embedding client for a task type.
+
+    Args:
+        task_type (str): Gemini embedding task type, e.g. RETRIEVAL_QUERY or RETRIEVAL_DOCUMENT.
+
+    Returns:
+        CachedEmbeddings: Embedding client backed by the on-disk cache.
+    """
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model, task_type=task_type)
+    return CachedEmbeddings(
+        embeddings,
+        model=embedding_model,
+        task_type=task_type,
+        cache_path=embedding_cache_path,
+        batch_size=embedding_batch_size,
+    )
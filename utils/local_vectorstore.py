@@ -0,0 +1,391 @@
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, a single writing process per index is assumed there
+    fcntl = None
+
+from .query_filters import matches_filter
+
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class LocalVectorStore(VectorStore):
+    """
+    On-disk vector store backed by a memory-mapped NumPy array.
+
+    Normalized embeddings are appended to ``vectors.bin`` and their ids, texts and
+    metadata to the ``records.jsonl`` sidecar; the n-th record describes the n-th row.
+    Writers hold an exclusive lock on ``write.lock``, so several processes can append
+    to one index, and drop rows left without a record by an interrupted write before
+    appending. Adding an existing id supersedes the
+    previous row, so re-adding documents behaves like an upsert. Search is exact by
+    default; ``search_mode="ivf"`` probes the closest k-means lists instead of the
+    whole array; its lists are rebuilt in a background thread once a write leaves a
+    fifth of the rows unindexed, and queries are exact until the first build is done.
+    Vectors can be stored as float32, float16 or int8 with a per-row scale.
+    Searches accept a Pinecone-style metadata ``filter``, which restricts the rows scored.
+    """
+
+    def __init__(self, directory, embedding, dtype=None, search_mode="exact", nprobe=8):
+        if dtype is not None and dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype}, expected one of {list(DTYPES)}")
+        self.directory = directory
+        self.embedding = embedding
+        self.search_mode = search_mode
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if dtype is not None and meta["dtype"] != dtype:
+                print(f"Local index {directory} stores {meta['dtype']} vectors, ignoring dtype={dtype}")
+            self.dim = meta["dim"]
+            self.dtype = meta["dtype"]
+        else:
+            self.dim = None
+            self.dtype = dtype or "float32"
+
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        self._records_offset = 0
+        self._vectors = None
+        self._scales = None
+        # Row validity mask, a view of a buffer grown by doubling as rows are appended
+        self._valid_buffer = np.zeros(1024, dtype=bool)
+        self._valid = self._valid_buffer[:0]
+        self._ivf = None
+        self._ivf_thread = None
+        self._filter_masks = {}
+        self._refresh()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        """Load rows appended since the last refresh, possibly by another process."""
+        with self._lock:
+            records_path = self._path("records.jsonl")
+            if not os.path.exists(records_path) or os.path.getsize(records_path) == self._records_offset:
+                return
+
+            superseded = []
+            with open(records_path, "rb") as f:
+                f.seek(self._records_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._records_offset += len(line)
+                    record = json.loads(line)
+                    previous = self._id_to_row.pop(record["id"], None)
+                    if previous is not None:
+                        superseded.append(previous)
+                    if record.get("deleted"):
+                        continue
+                    self._id_to_row[record["id"]] = len(self._ids)
+                    self._ids.append(record["id"])
+                    self._texts.append(record["text"])
+                    self._metadatas.append(record["metadata"])
+
+            n_rows = len(self._ids)
+            if n_rows > len(self._valid_buffer):
+                buffer = np.zeros(max(n_rows, 2 * len(self._valid_buffer)), dtype=bool)
+                buffer[:len(self._valid)] = self._valid
+                self._valid_buffer = buffer
+            self._valid_buffer[len(self._valid):n_rows] = True
+            self._valid = self._valid_buffer[:n_rows]
+            self._valid[superseded] = False
+            self._filter_masks = {}
+
+            if self.dim is None and os.path.exists(self._path("meta.json")):
+                with open(self._path("meta.json")) as f:
+                    meta = json.load(f)
+                self.dim = meta["dim"]
+                self.dtype = meta["dtype"]
+
+            n_rows = len(self._ids)
+            self._vectors = np.memmap(
+                self._path("vectors.bin"), dtype=DTYPES[self.dtype], mode="r", shape=(n_rows, self.dim)
+            ) if n_rows else None
+            if self.dtype == "int8" and n_rows:
+                self._scales = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r", shape=(n_rows,))
+
+            ivf_path = self._path("ivf.npz")
+            if self._ivf is None and os.path.exists(ivf_path):
+                ivf = np.load(ivf_path)
+                self._ivf = {key: ivf[key] for key in ivf.files}
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """
+        Append precomputed embeddings.
+
+        Args:
+            texts (list[str]): Texts of the documents.
+            embeddings (list[list[float]]): One embedding per text.
+            metadatas (list[dict]): Optional metadata per text.
+            ids (list[str]): Optional ids. Existing ids are replaced.
+
+        Returns:
+            list[str]: Ids of the added documents.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._write_lock():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+
+            if self.dtype == "int8":
+                scales = np.abs(vectors).max(axis=1) / 127
+                scales = np.where(scales == 0, 1, scales).astype(np.float32)
+                stored = np.round(vectors / scales[:, None]).astype(np.int8)
+                with open(self._path("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            else:
+                stored = vectors.astype(DTYPES[self.dtype])
+            with open(self._path("vectors.bin"), "ab") as f:
+                f.write(stored.tobytes())
+            with open(self._path("records.jsonl"), "a", encoding="utf-8") as f:
+                for id_, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": id_, "text": text, "metadata": metadata}, default=str) + "\n")
+            self._refresh()
+            self._schedule_ivf_build()
+
+        return ids
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Lock the index for writing, against other threads and processes, loaded with every
+        record written so far and without the rows of an interrupted write.
+        """
+        with self._lock, open(self._path("write.lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                self._truncate_unrecorded()
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _truncate_unrecorded(self):
+        # Rows pair with records by position: vectors or a partial record line written
+        # by a write that failed before completing must not shift the rows appended next
+        records_path = self._path("records.jsonl")
+        if os.path.exists(records_path) and os.path.getsize(records_path) > self._records_offset:
+            os.truncate(records_path, self._records_offset)
+        if self.dim is None:
+            return
+        n_rows = len(self._ids)
+        row_bytes = self.dim * np.dtype(DTYPES[self.dtype]).itemsize
+        for name, size in (("vectors.bin", n_rows * row_bytes), ("scales.bin", n_rows * 4)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                print(f"Dropping {(os.path.getsize(path) - size)} bytes of {path} without records")
+                os.truncate(path, size)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self._write_lock():
+            with open(self._path("records.jsonl"), "a", encoding="utf-8") as f:
+                for id_ in ids:
+                    f.write(json.dumps({"id": id_, "deleted": True}) + "\n")
+            self._refresh()
+        return True
+
+    def __len__(self):
+        return int(self._valid.sum())
+
+    def build_ivf(self, n_lists=None, iterations=10, sample_size=50000):
+        """
+        Build the inverted-file index used by the approximate search mode.
+
+        The k-means lists are computed outside the store lock, searches keep running on
+        the previous lists or exact search meanwhile.
+
+        Args:
+            n_lists (int): Number of k-means lists, defaults to sqrt(n_rows).
+            iterations (int): Number of k-means iterations.
+            sample_size (int): Number of rows used to train the centroids.
+        """
+        with self._lock:
+            self._refresh()
+            n_rows, vectors, scales = len(self._ids), self._vectors, self._scales
+        if n_rows == 0:
+            return
+
+        def rows(indices):
+            return self._decode(vectors, scales, indices)
+
+        n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+        rng = np.random.default_rng(0)
+        sample = rows(np.sort(rng.choice(n_rows, size=min(n_rows, sample_size), replace=False)))
+        centroids = sample[rng.choice(len(sample), size=min(n_lists, len(sample)), replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[assignments == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        assignments = np.concatenate([
+            np.argmax(rows(np.arange(start, min(start + 65536, n_rows))) @ centroids.T, axis=1)
+            for start in range(0, n_rows, 65536)
+        ])
+        ivf = {"centroids": centroids, "assignments": assignments, "n_rows": np.array(n_rows)}
+        with self._lock:
+            if self._ivf is not None and int(self._ivf["n_rows"]) >= n_rows:
+                return
+            self._ivf = ivf
+            np.savez(self._path("ivf.tmp.npz"), **ivf)
+            os.replace(self._path("ivf.tmp.npz"), self._path("ivf.npz"))
+        print(f"Built IVF index with {len(centroids)} lists over {n_rows} vectors")
+
+    def _ivf_stale(self):
+        return self._ivf is None or int(self._ivf["n_rows"]) < 0.8 * len(self._ids)
+
+    def _schedule_ivf_build(self):
+        # Called under the lock; one build runs at a time and picks up every row written before it starts
+        if self.search_mode != "ivf" or not self._ids or not self._ivf_stale():
+            return
+        if self._ivf_thread is not None and self._ivf_thread.is_alive():
+            return
+        self._ivf_thread = threading.Thread(target=self._build_ivf_in_background, daemon=True)
+        self._ivf_thread.start()
+
+    def _build_ivf_in_background(self):
+        try:
+            self.build_ivf()
+        except Exception as e:
+            print(f"IVF build failed for {self.directory}, searches stay exact: {e}")
+
+    @staticmethod
+    def _decode(vectors, scales, rows):
+        decoded = np.asarray(vectors[rows], dtype=np.float32)
+        if scales is not None:
+            decoded = decoded * scales[rows][:, None]
+        return decoded
+
+    def _rows(self, rows):
+        return self._decode(self._vectors, self._scales, rows)
+
+    def _filter_mask(self, filter):
+        # Masks are cached per filter until rows are added, repeated tickers and dates are common
+        key = json.dumps(filter, sort_keys=True, default=str)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches_filter(m, filter) for m in self._metadatas), dtype=bool, count=len(self._metadatas))
+            if len(self._filter_masks) >= 128:
+                self._filter_masks.pop(next(iter(self._filter_masks)))
+            self._filter_masks[key] = mask
+        return mask
+
+    def _candidate_rows(self, query):
+        n_rows = len(self._ids)
+        if self.search_mode != "ivf":
+            return np.flatnonzero(self._valid)
+
+        # Rows written by another process are indexed in the background, exact search until the first build
+        self._schedule_ivf_build()
+        if self._ivf is None:
+            return np.flatnonzero(self._valid)
+        centroids = self._ivf["centroids"]
+        indexed = int(self._ivf["n_rows"])
+        probes = np.argsort(-(centroids @ query))[:self.nprobe]
+        candidates = np.concatenate([
+            np.flatnonzero(np.isin(self._ivf["assignments"], probes)),
+            np.arange(indexed, n_rows),
+        ])
+        return candidates[self._valid[candidates]]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        """
+        Return the k documents closest to an embedding with their cosine similarity.
+
+        Args:
+            embedding (list[float]): Query embedding.
+            k (int): Number of documents to return.
+            filter (dict): Optional metadata filter the documents must match.
+
+        Returns:
+            list[tuple[Document, float]]: Documents and similarity scores, best first.
+        """
+        self._refresh()
+        if not self._ids:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        with self._lock:
+            candidates = self._candidate_rows(query)
+            if filter:
+                candidates = candidates[self._filter_mask(filter)[candidates]]
+        scores = np.concatenate([
+            self._rows(candidates[start:start + 65536]) @ query
+            for start in range(0, len(candidates), 65536)
+        ]) if len(candidates) else np.zeros(0, dtype=np.float32)
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        top = sorted(top, key=lambda i: -scores[i])
+        return [
+            (
+                Document(
+                    id=self._ids[candidates[i]],
+                    page_content=self._texts[candidates[i]],
+                    metadata=self._metadatas[candidates[i]],
+                ),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, **kwargs):
+        store = cls(directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,168 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+
+TRACKING_PARAMS = re.compile(r"^(utm_.*|fbclid|gclid|ref|xtor)$", re.IGNORECASE)
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def canonicalize_url(url):
+    """
+    Normalize an article URL so that tracking parameters, fragments and host aliases
+    do not make the same article look new.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def article_id(url):
+    """Deterministic vector store id of an article, derived from its canonical URL."""
+    return "news-" + hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()[:32]
+
+
+def content_hash(text):
+    """Exact fingerprint of the article text, ignoring case, punctuation and spacing."""
+    return hashlib.sha256(" ".join(WORD.findall(text.lower())).encode("utf-8")).hexdigest()
+
+
+def simhash(text, ngram=1):
+    """
+    64-bit SimHash over word n-grams weighted by frequency. Near-duplicate texts, such
+    as syndicated rewrites of the same article, differ in only a few bits.
+    """
+    words = WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + ngram]) for i in range(max(len(words) - ngram + 1, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _bands(fingerprint):
+    # Any two fingerprints within 3 bits of each other share at least one of 4 bands
+    return [fingerprint >> (16 * i) & 0xFFFF for i in range(4)]
+
+
+class NewsDeduplicator:
+    """
+    Persistent index of stored news articles, used to skip articles before embedding.
+
+    Articles are matched on their canonical URL before they are fetched, then on an
+    exact content hash and a SimHash within max_distance bits once their text is known.
+    URLs of near-duplicates are recorded too, marked as duplicates, so they are skipped
+    by URL next time without being matched against on content.
+    """
+
+    def __init__(self, path, max_distance=3):
+        self.path = path
+        self.max_distance = max_distance
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS articles (
+                    url TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    simhash TEXT NOT NULL,
+                    band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+                    stored_at REAL NOT NULL,
+                    duplicate INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(articles)")}
+            if "duplicate" not in columns:
+                conn.execute("ALTER TABLE articles ADD COLUMN duplicate INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS articles_hash ON articles (content_hash)")
+            for i in range(4):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS articles_band{i} ON articles (band{i})")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def filter_articles(self, articles):
+        """
+        Drop articles whose canonical URL was already stored or rejected as a duplicate, or
+        appears earlier in the list.
+
+        Args:
+            articles (list[dict]): Articles with a 'link' key.
+
+        Returns:
+            articles: Articles that still need to be fetched.
+        """
+        seen = set()
+        kept = []
+        with self._connect() as conn:
+            for article in articles:
+                url = canonicalize_url(article["link"])
+                if url in seen or conn.execute("SELECT 1 FROM articles WHERE url = ?", (url,)).fetchone():
+                    continue
+                seen.add(url)
+                kept.append(article)
+        print(f"Skipped {len(articles) - len(kept)} already seen articles by URL")
+        return kept
+
+    def _is_duplicate(self, conn, digest, fingerprint):
+        if conn.execute("SELECT 1 FROM articles WHERE content_hash = ? AND NOT duplicate", (digest,)).fetchone():
+            return True
+        bands = _bands(fingerprint)
+        candidates = conn.execute(
+            "SELECT simhash FROM articles WHERE (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?) AND NOT duplicate",
+            bands,
+        ).fetchall()
+        return any(bin(int(other) ^ fingerprint).count("1") <= self.max_distance for (other,) in candidates)
+
+    def filter_docs(self, docs):
+        """
+        Drop documents that are exact or near duplicates of stored articles or of each other.
+
+        Args:
+            docs (list[Document]): Fetched articles with a 'link' metadata key.
+
+        Returns:
+            docs: Documents that still need to be embedded.
+        """
+        kept, batch = [], []
+        with self._connect() as conn:
+            for doc in docs:
+                digest, fingerprint = content_hash(doc.page_content), simhash(doc.page_content)
+                if self._is_duplicate(conn, digest, fingerprint) or any(
+                    digest == d or bin(f ^ fingerprint).count("1") <= self.max_distance for d, f in batch
+                ):
+                    continue
+                batch.append((digest, fingerprint))
+                kept.append(doc)
+        print(f"Skipped {len(docs) - len(kept)} duplicate or near-duplicate articles")
+        return kept
+
+    def _record(self, docs, duplicate):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                # A stored article is never downgraded to a duplicate
+                f"INSERT OR {'IGNORE' if duplicate else 'REPLACE'} INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (canonicalize_url(doc.metadata["link"]), content_hash(doc.page_content), str(fingerprint),
+                     *_bands(fingerprint), now, int(duplicate))
+                    for doc, fingerprint in ((doc, simhash(doc.page_content)) for doc in docs)
+                ],
+            )
+
+    def mark_stored(self, docs):
+        """Record documents that were written to the vector store."""
+        self._record(docs, duplicate=False)
+
+    def mark_duplicates(self, docs):
+        """Record the URLs of documents dropped by filter_docs, so they are not fetched again."""
+        self._record(docs, duplicate=True)
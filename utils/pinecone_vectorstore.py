@@ -1,29 +1,54 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-
-from pinecone import Pinecone, ServerlessSpec     
 import os
+from collections import defaultdict
 from dotenv import load_dotenv
+import threading
 import time
+import uuid
+
+from .embeddings import get_embeddings
 
 
 load_dotenv()
 pinecone_api_key = os.environ.get("PINECONE_API_KEY")
-embedding_model = os.environ.get("EMBEDDING_MODEL")
+health_check_interval = float(os.getenv("PINECONE_HEALTH_CHECK_INTERVAL", "60"))
+pool_threads = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+
+# One client, one store handle per index and one health checker for the whole process
+_client = None
+_stores = {}
+_stats = {}
+_lock = threading.Lock()
+# Held while an index is resolved, so concurrent first calls build it once without blocking other indexes
+_build_locks = defaultdict(threading.Lock)
+_health_thread = None
 
 
+def _get_client():
+    # The Pinecone SDK is imported on first use, processes on the local backend never load it
+    from pinecone import Pinecone
 
-def get_pinecone_vector_store(index_name: str) -> PineconeVectorStore:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Pinecone(api_key=pinecone_api_key, pool_threads=pool_threads)
+        return _client
+
+
+def _build_pinecone_vector_store(index_name: str):
     """
-    Initialize and return a Pinecone index.
+    Resolve the index, creating it if needed, and wrap it in a vector store.
 
     Args:
-        pinecone_api_key (str): Pinecone API key.
+        index_name (str): Name of the Pinecone index.
 
     Returns:
         PineconeVectorStore: Pinecone VectorStore.
+        index: Raw Pinecone index handle, used for health checks.
     """
-    pc = Pinecone(api_key=pinecone_api_key)
+    from langchain_pinecone import PineconeVectorStore
+    from pinecone import ServerlessSpec
+
+    pc = _get_client()
       
     existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
     index_exists = index_name in existing_indexes
@@ -37,8 +62,123 @@ def get_pinecone_vector_store(index_name: str) -> PineconeVectorStore:
         while not pc.describe_index(index_name).status["ready"]:
             time.sleep(1)
 
-    index = pc.Index(index_name)
-    doc_embeddings= GoogleGenerativeAIEmbeddings(model =embedding_model, task_type="RETRIEVAL_DOCUMENT") 
+    index = pc.Index(index_name, pool_threads=pool_threads)
+    doc_embeddings= get_embeddings("RETRIEVAL_DOCUMENT")
     vector_store = PineconeVectorStore(index=index, embedding=doc_embeddings)
 
-    return vector_store
\ No newline at end of file
+    return vector_store, index
+
+
+def _health_check_loop():
+    while True:
+        time.sleep(health_check_interval)
+        with _lock:
+            entries = list(_stores.items())
+        for index_name, (_, index) in entries:
+            started = time.perf_counter()
+            try:
+                index.describe_index_stats()
+                healthy = True
+            except Exception as e:
+                print(f"Health check failed for Pinecone index {index_name}: {e}")
+                healthy = False
+            with _lock:
+                _stats[index_name]["healthy"] = healthy
+                _stats[index_name]["last_health_check_seconds"] = time.perf_counter() - started
+                if not healthy:
+                    _stores.pop(index_name, None)
+
+
+def get_pinecone_vector_store(index_name: str) -> "PineconeVectorStore":
+    """
+    Return the process-wide Pinecone vector store for an index.
+
+    The index is resolved and validated once. Later calls reuse the same handle and
+    HTTP connection pool until a health check or a failed query invalidates it.
+
+    Args:
+        index_name (str): Name of the Pinecone index.
+
+    Returns:
+        PineconeVectorStore: Pinecone VectorStore.
+    """
+    global _health_thread
+    with _lock:
+        if index_name in _stores:
+            return _stores[index_name][0]
+        build_lock = _build_locks[index_name]
+
+    # The index is resolved over the network outside the global lock, which guards the
+    # store handles, their stats and the health checks of every index
+    with build_lock:
+        with _lock:
+            if index_name in _stores:
+                return _stores[index_name][0]
+
+        started = time.perf_counter()
+        vector_store, index = _build_pinecone_vector_store(index_name)
+        setup_seconds = time.perf_counter() - started
+        print(f"Pinecone index {index_name} ready in {setup_seconds:.2f}s")
+
+        with _lock:
+            stats = _stats.setdefault(index_name, {"setups": 0, "queries": 0, "query_seconds": 0.0})
+            stats.update(setup_seconds=setup_seconds, setups=stats["setups"] + 1, healthy=True)
+            _stores[index_name] = (vector_store, index)
+
+            if _health_thread is None and health_check_interval > 0:
+                _health_thread = threading.Thread(target=_health_check_loop, daemon=True)
+                _health_thread.start()
+
+    return vector_store
+
+
+def invalidate_pinecone_vector_store(index_name: str):
+    """Drop the cached handle of an index so the next call rebuilds it."""
+    with _lock:
+        _stores.pop(index_name, None)
+        if index_name in _stats:
+            _stats[index_name]["healthy"] = False
+
+
+def record_query_time(index_name: str, seconds: float):
+    """Record the latency of one query against an index."""
+    with _lock:
+        stats = _stats.setdefault(index_name, {"setups": 0, "queries": 0, "query_seconds": 0.0})
+        stats["queries"] += 1
+        stats["query_seconds"] += seconds
+        stats["last_query_seconds"] = seconds
+
+
+def get_vector_store_stats() -> dict:
+    """
+    Return setup, health and query timings per index.
+
+    Returns:
+        dict: Index name mapped to its setup count, last setup time, health and query latencies.
+    """
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def add_embeddings(vector_store, texts, embeddings, metadatas=None, ids=None):
+    """
+    Upsert precomputed embeddings into a Pinecone vector store, which add_texts would embed again.
+
+    Args:
+        vector_store (PineconeVectorStore): Store to write to.
+        texts (list[str]): Texts of the documents, stored in their metadata like add_texts does.
+        embeddings (list[list[float]]): One embedding per text.
+        metadatas (list[dict]): Optional metadata per text.
+        ids (list[str]): Optional ids. Existing ids are replaced.
+
+    Returns:
+        list[str]: Ids of the upserted documents.
+    """
+    texts = list(texts)
+    ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+    metadatas = [{**(metadata or {}), vector_store._text_key: text}
+                 for metadata, text in zip(metadatas or [{}] * len(texts), texts)]
+    vectors = [(id_, [float(x) for x in embedding], metadata)
+               for id_, embedding, metadata in zip(ids, embeddings, metadatas)]
+    vector_store.index.upsert(vectors=vectors, namespace=vector_store._namespace)
+    return ids
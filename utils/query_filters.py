@@ -0,0 +1,171 @@
+from calendar import monthrange
+from datetime import date
+import re
+import unicodedata
+
+from .tickers import find_tickers
+
+
+MONTHS = {
+    "january": 1, "jan": 1, "janvier": 1,
+    "february": 2, "feb": 2, "fevrier": 2,
+    "march": 3, "mar": 3, "mars": 3,
+    "april": 4, "apr": 4, "avril": 4,
+    "may": 5, "mai": 5,
+    "june": 6, "jun": 6, "juin": 6,
+    "july": 7, "jul": 7, "juillet": 7,
+    "august": 8, "aug": 8, "aout": 8,
+    "september": 9, "sep": 9, "sept": 9, "septembre": 9,
+    "october": 10, "oct": 10, "octobre": 10,
+    "november": 11, "nov": 11, "novembre": 11,
+    "december": 12, "dec": 12, "decembre": 12,
+}
+DAY = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b|\b(\d{4})-(\d{2})-(\d{2})\b")
+MONTH = re.compile(r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?\s+(\d{4})\b")
+# A bare year only counts after a date preposition or "year", so "2000 shares" or
+# "1950 dinars" are not read as dates. Years listed after it ("in 2021 and 2022",
+# "between 2019 et 2021") are taken too.
+YEAR = re.compile(
+    r"\b(?:in|en|year|annee|since|depuis|during|pendant|from|between|entre|until|jusqu'en)\s+"
+    r"((?:19|20)\d{2}(?:\s*(?:,|-|and|et|or|ou|to|a|au)\s*(?:19|20)\d{2})*)\b"
+    r"(?!\s*(?:shares|actions|titres|dinars|dt|tnd|%))"
+)
+# Years the market data can cover, mentions outside it are ignored
+FIRST_YEAR = 1990
+
+
+def date_key(day):
+    """Date as a yyyymmdd integer, the form range filters compare."""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def date_range_metadata(start, end=None):
+    """
+    Date metadata of a chunk or article covering start to end.
+
+    Args:
+        start (date): First day covered.
+        end (date): Last day covered, defaults to start.
+
+    Returns:
+        dict: ISO dates, yyyymmdd integers for range filters and the year of start.
+    """
+    end = end or start
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "start": date_key(start),
+        "end": date_key(end),
+        "year": start.year,
+    }
+
+
+def parse_date_range(text):
+    """
+    Find the days, months and years mentioned in a text.
+
+    Bare years are only read with date context and within FIRST_YEAR to this year.
+
+    Returns:
+        tuple[date, date]: First and last day covered by the mentions, or None.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    ranges = []
+    for match in DAY.finditer(text):
+        day, month, year = match.group(1, 2, 3) if match.group(1) else match.group(6, 5, 4)
+        try:
+            day = date(int(year), int(month), int(day))
+        except ValueError:
+            continue
+        ranges.append((day, day))
+    text = DAY.sub(" ", text)
+    for match in MONTH.finditer(text):
+        year, month = int(match.group(2)), MONTHS[match.group(1)]
+        ranges.append((date(year, month, 1), date(year, month, monthrange(year, month)[1])))
+    text = MONTH.sub(" ", text)
+    for match in YEAR.finditer(text):
+        for year in map(int, re.findall(r"\d{4}", match.group(1))):
+            if FIRST_YEAR <= year <= date.today().year:
+                ranges.append((date(year, 1, 1), date(year, 12, 31)))
+    if not ranges:
+        return None
+    return min(start for start, _ in ranges), max(end for _, end in ranges)
+
+
+def parse_query_filters(question, tickers=None):
+    """
+    Build the metadata filter of a question from the tickers and dates it mentions.
+
+    Chunks and articles match when they mention one of the tickers and their date
+    range overlaps the dates of the question.
+
+    Args:
+        question (str): User question.
+        tickers (Iterable[str]): Tickers to look for, defaults to known_tickers().
+
+    Returns:
+        dict: Filter in the Pinecone syntax, empty when the question names neither.
+    """
+    clauses = []
+    found = find_tickers(question, tickers)
+    if found:
+        clauses.append({"tickers": {"$in": found}})
+    dates = parse_date_range(question)
+    if dates:
+        clauses.append({"start": {"$lte": date_key(dates[1])}})
+        clauses.append({"end": {"$gte": date_key(dates[0])}})
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else {}
+
+
+def _matches_condition(value, condition):
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    values = value if isinstance(value, list) else [value]
+    for operator, operand in condition.items():
+        if operator == "$eq":
+            ok = operand in values
+        elif operator == "$ne":
+            ok = operand not in values
+        elif operator == "$in":
+            ok = any(v in operand for v in values)
+        elif operator == "$nin":
+            ok = not any(v in operand for v in values)
+        elif operator == "$exists":
+            ok = (value is not None) == operand
+        elif value is None or isinstance(value, list):
+            ok = False
+        elif operator == "$gt":
+            ok = value > operand
+        elif operator == "$gte":
+            ok = value >= operand
+        elif operator == "$lt":
+            ok = value < operand
+        elif operator == "$lte":
+            ok = value <= operand
+        else:
+            raise ValueError(f"Unsupported filter operator {operator}")
+        if not ok:
+            return False
+    return True
+
+
+def matches_filter(metadata, filter):
+    """
+    Evaluate a Pinecone-style metadata filter on a metadata dict, for the local indexes.
+
+    Supports $and, $or, $eq, $ne, $in, $nin, $exists, $gt, $gte, $lt and $lte. A
+    list value matches $eq and $in when any of its elements does.
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            ok = all(matches_filter(metadata, clause) for clause in condition)
+        elif key == "$or":
+            ok = any(matches_filter(metadata, clause) for clause in condition)
+        else:
+            ok = _matches_condition(metadata.get(key), condition)
+        if not ok:
+            return False
+    return True
@@ -0,0 +1,182 @@
+from langchain_core.documents import Document
+
+import json
+import os
+import re
+import sqlite3
+import time
+import numpy as np
+
+
+NEWS_KEYWORDS = re.compile(
+    r"\b(news|latest|today|yesterday|this week|recent|actualit[eé]s?|aujourd'hui|hier|derni[eè]res?)\b",
+    re.IGNORECASE,
+)
+HISTORICAL_KEYWORDS = re.compile(r"\b(19|20)\d{2}\b|\b\d{1,2}/\d{1,2}/\d{4}\b")
+
+
+def classify_freshness(question, documents):
+    """
+    Decide how long an answer stays valid.
+
+    Args:
+        question (str): User question.
+        documents (list[Document]): Documents the answer was generated from.
+
+    Returns:
+        str: 'news' for time-sensitive answers, 'historical' for answers about fixed past dates,
+            'default' otherwise.
+    """
+    sources = {d.metadata.get("source") for d in documents}
+    if NEWS_KEYWORDS.search(question) or sources & {"news", "web"}:
+        return "news"
+    if HISTORICAL_KEYWORDS.search(question):
+        return "historical"
+    return "default"
+
+
+def entity_key(filters):
+    """
+    Canonical text of a question's metadata filter, as built by parse_query_filters.
+
+    Questions naming the same tickers and dates get the same key whatever their order.
+    """
+    def canonical(value):
+        if isinstance(value, dict):
+            return {key: canonical(item) for key, item in value.items()}
+        if isinstance(value, list):
+            items = [canonical(item) for item in value]
+            return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+        return value
+
+    return json.dumps(canonical(filters or {}), sort_keys=True)
+
+
+class SemanticCache:
+    """
+    SQLite-backed cache of final answers keyed on the question embedding.
+
+    A lookup returns the stored answer of the most similar cached question when its
+    cosine similarity reaches the threshold and both questions name the same tickers
+    and dates, since questions differing only in those embed almost identically.
+    Entries expire according to their freshness class and the least recently used
+    entries are evicted above max_entries.
+    """
+
+    def __init__(self, path, threshold=0.95, max_entries=1000, ttls=None):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttls = ttls or {"news": 3600, "default": 86400, "historical": 30 * 86400}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    generation TEXT NOT NULL,
+                    documents TEXT NOT NULL,
+                    freshness TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    entities TEXT
+                )"""
+            )
+            # Entries cached before entities were stored keep a NULL key and are never served
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+            if "entities" not in columns:
+                conn.execute("ALTER TABLE answers ADD COLUMN entities TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def lookup(self, embedding, filters=None):
+        """
+        Find a cached answer for a question embedding.
+
+        Args:
+            embedding (list[float]): Embedding of the new question.
+            filters (dict): Metadata filter of the new question from parse_query_filters.
+
+        Returns:
+            dict | None: question, generation, documents and similarity of the best match,
+                or None on a miss.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers WHERE expires_at < ?", (now,))
+            rows = conn.execute(
+                "SELECT id, embedding FROM answers WHERE entities = ?", (entity_key(filters),)
+            ).fetchall()
+            if not rows:
+                return None
+
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            query = np.asarray(embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            similarities = matrix @ query / np.where(norms == 0, 1, norms)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entry_id = rows[best][0]
+            conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (now, entry_id))
+            question, generation, documents = conn.execute(
+                "SELECT question, generation, documents FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+
+        return {
+            "question": question,
+            "generation": generation,
+            "documents": [Document(**d) for d in json.loads(documents)],
+            "similarity": float(similarities[best]),
+        }
+
+    def store(self, question, embedding, generation, documents, filters=None):
+        """
+        Cache the final answer of a question.
+
+        Args:
+            question (str): Original user question.
+            embedding (list[float]): Embedding of the question.
+            generation (str): Final answer.
+            documents (list[Document]): Documents the answer was generated from.
+            filters (dict): Metadata filter of the question from parse_query_filters.
+        """
+        now = time.time()
+        freshness = classify_freshness(question, documents)
+        serialized = json.dumps(
+            [{"page_content": d.page_content, "metadata": d.metadata} for d in documents],
+            default=str,
+        )
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO answers
+                (question, embedding, generation, documents, freshness, created_at, expires_at, last_access, entities)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    question,
+                    np.asarray(embedding, dtype=np.float32).tobytes(),
+                    generation,
+                    serialized,
+                    freshness,
+                    now,
+                    now + self.ttls[freshness],
+                    now,
+                    entity_key(filters),
+                ),
+            )
+            conn.execute(
+                """DELETE FROM answers WHERE id NOT IN (
+                    SELECT id FROM answers ORDER BY last_access DESC LIMIT ?
+                )""",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        """Remove every cached answer."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
@@ -0,0 +1,237 @@
+from datetime import datetime
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+import numpy as np
+
+
+load_dotenv()
+stock_store_dir = os.getenv("STOCK_STORE_DIR", ".cache/stock_store")
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+COLUMN_ALIASES = {
+    "date": ["date", "seance", "séance"],
+    "open": ["open", "ouverture"],
+    "high": ["high", "plus_haut", "haut"],
+    "low": ["low", "plus_bas", "bas"],
+    "close": ["close", "cloture", "clôture"],
+    "volume": ["volume"],
+    "stock": ["stock", "ticker", "valeur"],
+}
+STOCK_DTYPE = np.dtype([("date", "M8[D]")] + [(field, "f8") for field in FIELDS])
+# Day-first dates of the BVMT exports, then ISO dates
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d"]
+
+
+def parse_day(value):
+    """
+    Parse a date given as DD/MM/YYYY or YYYY-MM-DD.
+
+    Returns:
+        np.datetime64 | None: The day, or None when the value is not a valid date.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.strptime(str(value).strip(), date_format).date(), "D")
+        except ValueError:
+            continue
+    return None
+
+
+def parse_dates(values):
+    """
+    Parse a column of DD/MM/YYYY dates, falling back to ISO dates for the values that are not.
+
+    Each format is given explicitly: a day-first guess would read ISO dates such as
+    2023-01-05 as 1 May.
+
+    Args:
+        values (Series): Date strings.
+
+    Returns:
+        Series: Timestamps, NaT where neither format applies.
+    """
+    import pandas as pd
+
+    values = values.astype(str).str.strip()
+    dates = pd.to_datetime(values, format=DATE_FORMATS[0], errors="coerce")
+    missing = dates.isna()
+    if missing.any():
+        dates[missing] = pd.to_datetime(values[missing], format="ISO8601", errors="coerce")
+    return dates
+
+
+def load_stock_csv(file_path):
+    """
+    Load a stock CSV into a frame with normalized column names.
+
+    Args:
+        file_path (str): Path to the CSV file.
+
+    Returns:
+        df: DataFrame with date, open, high, low, close, volume and stock columns, sorted by date.
+    """
+    # pandas is only needed to build the store, queries run on the NumPy arrays
+    import pandas as pd
+
+    df = pd.read_csv(file_path)
+    lower = {column.lower().strip(): column for column in df.columns}
+    renamed = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lower:
+                renamed[lower[alias]] = name
+                break
+    df = df.rename(columns=renamed)
+    if "stock" not in df.columns:
+        df["stock"] = os.path.basename(file_path).split("_")[0]
+    for field in FIELDS:
+        if field not in df.columns:
+            df[field] = np.nan
+    df["date"] = parse_dates(df["date"])
+    df = df.dropna(subset=["date"]).sort_values("date")
+    return df
+
+
+def build_stock_store(stock_data_dir, store_dir=stock_store_dir):
+    """
+    Convert stock CSVs into one memory-mappable NumPy array per ticker.
+
+    Args:
+        stock_data_dir (str): Directory containing stock data CSV files.
+        store_dir (str): Output directory of the columnar store.
+
+    Returns:
+        tickers: List of tickers written to the store.
+    """
+    import pandas as pd
+
+    os.makedirs(store_dir, exist_ok=True)
+    tickers = []
+    for file in sorted(os.listdir(stock_data_dir)):
+        df = load_stock_csv(os.path.join(stock_data_dir, file))
+        for ticker, rows in df.groupby("stock"):
+            ticker = str(ticker).upper()
+            array = np.empty(len(rows), dtype=STOCK_DTYPE)
+            array["date"] = rows["date"].to_numpy(dtype="datetime64[D]")
+            for field in FIELDS:
+                array[field] = pd.to_numeric(rows[field], errors="coerce").to_numpy(dtype="f8")
+            np.save(os.path.join(store_dir, f"{ticker}.npy"), array)
+            tickers.append(ticker)
+    print(f"Stored {len(tickers)} tickers in {store_dir}")
+    return tickers
+
+
+class StockStore:
+    """
+    Read-only columnar store of daily OHLCV rows, one memory-mapped array per ticker.
+
+    Answers lookup, range and aggregate questions with vectorized NumPy operations over
+    the rows between two dates.
+    """
+
+    AGGREGATIONS = ["value", "first", "last", "mean", "min", "max", "sum", "change", "count"]
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._arrays = {}
+
+    @property
+    def tickers(self):
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(file[:-4] for file in os.listdir(self.store_dir) if file.endswith(".npy"))
+
+    def load(self, ticker):
+        ticker = ticker.upper()
+        if ticker not in self._arrays:
+            path = os.path.join(self.store_dir, f"{ticker}.npy")
+            if not os.path.exists(path):
+                return None
+            self._arrays[ticker] = np.load(path, mmap_mode="r")
+        return self._arrays[ticker]
+
+    def query(self, ticker, field="close", aggregation="value", start_date=None, end_date=None):
+        """
+        Run an aggregate, range or lookup query for one ticker.
+
+        Args:
+            ticker (str): Stock ticker.
+            field (str): One of open, high, low, close, volume.
+            aggregation (str): One of StockStore.AGGREGATIONS. 'value' returns the row on
+                end_date, or the last trading day before it.
+            start_date (str): First date of the range (YYYY-MM-DD or DD/MM/YYYY), defaults to the first row.
+            end_date (str): Last date of the range (YYYY-MM-DD or DD/MM/YYYY), defaults to the last row.
+
+        Returns:
+            dict | None: Result value with the dates it covers, or None when no rows match
+                or a date is invalid.
+        """
+        array = self.load(ticker)
+        if array is None or field not in FIELDS or aggregation not in self.AGGREGATIONS:
+            return None
+
+        dates = array["date"]
+        # Dates come from the LLM query parser, an invalid one gives no result rather than an error
+        start = parse_day(start_date) if start_date else dates[0]
+        end = parse_day(end_date) if end_date else dates[-1]
+        if start is None or end is None:
+            return None
+        if aggregation == "value":
+            position = np.searchsorted(dates, end, side="right") - 1
+            if position < 0:
+                return None
+            return {
+                "ticker": ticker.upper(), "field": field, "aggregation": aggregation,
+                "value": float(array[field][position]), "date": str(dates[position]),
+            }
+
+        lo, hi = np.searchsorted(dates, start, side="left"), np.searchsorted(dates, end, side="right")
+        values = np.asarray(array[field][lo:hi])
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return None
+        values, window = values[valid], np.asarray(dates[lo:hi])[valid]
+
+        result = {
+            "ticker": ticker.upper(), "field": field, "aggregation": aggregation,
+            "start_date": str(window[0]), "end_date": str(window[-1]), "rows": int(len(values)),
+        }
+        if aggregation in ("min", "max"):
+            position = int(np.argmin(values) if aggregation == "min" else np.argmax(values))
+            result.update(value=float(values[position]), date=str(window[position]))
+        elif aggregation == "first":
+            result["value"] = float(values[0])
+        elif aggregation == "last":
+            result["value"] = float(values[-1])
+        elif aggregation == "mean":
+            result["value"] = float(values.mean())
+        elif aggregation == "sum":
+            result["value"] = float(values.sum())
+        elif aggregation == "count":
+            result["value"] = int(len(values))
+        elif aggregation == "change":
+            result["value"] = float(values[-1] - values[0])
+            result["percent"] = float((values[-1] - values[0]) / values[0] * 100) if values[0] else None
+        return result
+
+
+def format_stock_result(result):
+    """Render a StockStore.query result as a sentence for the generator."""
+    period = (
+        f"on {result['date']}" if result["aggregation"] == "value"
+        else f"from {result['start_date']} to {result['end_date']} ({result['rows']} trading days)"
+    )
+    label = {"value": "", "mean": "average "}.get(result["aggregation"], f"{result['aggregation']} ")
+    text = f"{result['ticker']} {label}{result['field']} {period}: {result['value']:,.2f}"
+    if result["aggregation"] in ("min", "max"):
+        text += f", reached on {result['date']}"
+    if result.get("percent") is not None:
+        text += f" ({result['percent']:+.2f}%)"
+    return text + "."
+
+
+@lru_cache(maxsize=None)
+def get_stock_store(store_dir: str = stock_store_dir) -> StockStore:
+    """Return the process-wide columnar stock store."""
+    return StockStore(store_dir)
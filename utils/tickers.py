@@ -0,0 +1,108 @@
+from dotenv import load_dotenv
+from functools import lru_cache
+import json
+import os
+import re
+import unicodedata
+
+from .stock_store import get_stock_store
+
+
+load_dotenv()
+data_path = os.getenv("DATA_PATH")
+ticker_aliases_path = os.getenv("TICKER_ALIASES_PATH")
+
+TOKEN = re.compile(r"[\w&.-]+", re.UNICODE)
+
+# Company names matched regardless of case, with the tickers they may be listed under.
+# Only names that are not ordinary words belong here; an alias counts when one of its
+# tickers is in the ingested data. TICKER_ALIASES_PATH can add more as a JSON object.
+COMPANY_ALIASES = {
+    "sfbt": ["SFBT"],
+    "biat": ["BIAT"],
+    "poulina": ["PGH", "POULINA"],
+    "poulina group": ["PGH", "POULINA"],
+    "delice holding": ["DH", "DELICE"],
+    "sah lilas": ["SAH", "LILAS"],
+    "attijari bank": ["TJARI", "ATTIJARI"],
+    "amen bank": ["AB", "AMEN"],
+    "tunisair": ["TAIR", "TUNISAIR"],
+    "carthage cement": ["CC"],
+    "ennakl": ["NAKL", "ENNAKL"],
+    "sotuver": ["SOTUV", "SOTUVER"],
+    "one tech": ["OTH"],
+    "telnet": ["TLNET", "TELNET"],
+    "sotipapier": ["STPAP", "SOTIPAPIER"],
+    "euro-cycles": ["ECYCL"],
+    "unimed": ["UMED", "UNIMED"],
+    "tunisie leasing": ["TLS"],
+    "monoprix": ["MNP", "MONOPRIX"],
+}
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=None)
+def known_tickers():
+    """
+    Tickers of the ingested stock data, from the columnar store and the raw CSV file names.
+
+    Returns:
+        frozenset: Upper-case tickers.
+    """
+    tickers = set(get_stock_store().tickers)
+    if data_path and os.path.isdir(data_path):
+        tickers.update(file.split("_")[0].upper() for file in os.listdir(data_path) if file.endswith(".csv"))
+    return frozenset(tickers)
+
+
+@lru_cache(maxsize=None)
+def company_aliases():
+    """COMPANY_ALIASES extended with the JSON object at TICKER_ALIASES_PATH, if any."""
+    aliases = dict(COMPANY_ALIASES)
+    if ticker_aliases_path and os.path.exists(ticker_aliases_path):
+        with open(ticker_aliases_path, encoding="utf-8") as f:
+            aliases.update({_fold(name): list(tickers) for name, tickers in json.load(f).items()})
+    return aliases
+
+
+def find_tickers(text, tickers=None, aliases=None):
+    """
+    Find the known tickers mentioned in a text.
+
+    Tickers match as upper-case tokens only, so words such as 'best' or 'star' are not
+    taken for tickers. Company names of the alias list match regardless of case.
+
+    Args:
+        text (str): Question or document text.
+        tickers (Iterable[str]): Tickers to look for, defaults to known_tickers().
+        aliases (dict): Company name to candidate tickers, defaults to company_aliases().
+
+    Returns:
+        list[str]: Tickers in order of first mention.
+    """
+    tickers = known_tickers() if tickers is None else tickers
+    aliases = company_aliases() if aliases is None else aliases
+    mentions = []
+    for match in TOKEN.finditer(text):
+        token = match.group().strip(".-")
+        if token and token == token.upper() and token in tickers:
+            mentions.append((match.start(), token))
+
+    folded = _fold(text)
+    for name, candidates in aliases.items():
+        listed = [ticker for ticker in candidates if ticker in tickers]
+        if not listed:
+            continue
+        match = re.search(r"(?<![\w-])" + re.escape(name) + r"(?![\w-])", folded)
+        if match:
+            mentions.append((match.start(), listed[0]))
+
+    found = []
+    for _, ticker in sorted(mentions):
+        if ticker not in found:
+            found.append(ticker)
+    return found
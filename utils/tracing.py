@@ -0,0 +1,282 @@
+from dotenv import load_dotenv
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+load_dotenv()
+trace_path = os.getenv("TRACE_PATH", ".cache/traces.jsonl")
+metrics_window = int(os.getenv("METRICS_WINDOW", "1000"))
+
+_lock = threading.Lock()
+# Latest span durations per node or edge, used for the p50/p95 summaries
+_latencies = defaultdict(lambda: deque(maxlen=metrics_window))
+_counters = defaultdict(float)
+# Counters kept by other modules as dicts of counts, exported with one label
+_labelled_counters = {}
+_metrics_server = None
+
+
+def register_counter(name, help_text, label, counts):
+    """
+    Export a dict of counts kept by another module as the counter rag_{name}_total.
+
+    Args:
+        name (str): Metric name, without the rag_ prefix and _total suffix.
+        help_text (str): Metric description.
+        label (str): Label holding the keys of counts.
+        counts (dict): Live counts by label value, read at every scrape.
+    """
+    _labelled_counters[name] = (help_text, label, counts)
+
+
+class RequestTracer(BaseCallbackHandler):
+    """
+    Callback handler that traces one request through the LangGraph workflow.
+
+    Graph nodes and the named routing edges become spans with their wall time; chat
+    model calls are attributed to the node that made them, with their token usage.
+    Nodes may call models from several threads, so updates are locked.
+    """
+
+    def __init__(self, question, edges=()):
+        self.request_id = uuid.uuid4().hex
+        self.question = question
+        self.edges = set(edges)
+        self.started_at = time.time()
+        self.spans = []
+        self.retries = 0
+        self._open = {}
+        self._llm_nodes = {}
+        self._lock = threading.Lock()
+
+    def _span(self, node):
+        return {"node": node, "seconds": 0.0, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        node = (metadata or {}).get("langgraph_node")
+        if name and (name == node or name in self.edges):
+            with self._lock:
+                self._open[run_id] = (self._span(name), time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._close(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=str(error))
+
+    def _close(self, run_id, error=None):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return
+            span, started = opened
+            span["seconds"] = time.perf_counter() - started
+            if error:
+                span["error"] = error
+            self.spans.append(span)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start_llm(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start_llm(run_id, metadata)
+
+    def _start_llm(self, run_id, metadata):
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            self._llm_nodes[run_id] = node
+            span = self._node_span(node)
+            if span is not None:
+                span["llm_calls"] += 1
+
+    def _node_span(self, node):
+        # Models run while their node's span is still open
+        for span, _ in self._open.values():
+            if span["node"] == node:
+                return span
+        return None
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            span = self._node_span(self._llm_nodes.pop(run_id, None))
+            if span is not None:
+                span["prompt_tokens"] += prompt_tokens
+                span["completion_tokens"] += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._llm_nodes.pop(run_id, None)
+            self.retries += 1
+
+    def on_retry(self, retry_state, **kwargs):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self, final_state=None):
+        """
+        Close the trace, record its metrics and append it to the trace file.
+
+        Args:
+            final_state (dict): Final graph state, for the loop count, the budget outcome and the context tokens.
+
+        Returns:
+            trace (dict): Request totals and the spans in execution order.
+        """
+        final_state = final_state or {}
+        budget = final_state.get("budget") or {}
+        context_tokens = final_state.get("context_tokens") or {}
+        spans = list(self.spans)
+        trace = {
+            "request_id": self.request_id,
+            "question": self.question,
+            "started_at": self.started_at,
+            "seconds": time.time() - self.started_at,
+            "llm_calls": sum(s["llm_calls"] for s in spans),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in spans),
+            "completion_tokens": sum(s["completion_tokens"] for s in spans),
+            "context_tokens": context_tokens.get("packed", 0),
+            "context_tokens_saved": max(context_tokens.get("unpacked", 0) - context_tokens.get("packed", 0), 0),
+            "retries": self.retries,
+            "loops": budget.get("loops", 0),
+            "budget_exhausted": final_state.get("budget_exhausted", ""),
+            "spans": spans,
+        }
+        record_trace(trace)
+        return trace
+
+
+def record_trace(trace):
+    """Add a finished trace to the process metrics and to the JSONL trace file."""
+    with _lock:
+        _latencies["request"].append(trace["seconds"])
+        _counters["requests"] += 1
+        _counters["retries"] += trace["retries"]
+        _counters["loops"] += trace["loops"]
+        _counters["context_tokens"] += trace.get("context_tokens", 0)
+        _counters["context_tokens_saved"] += trace.get("context_tokens_saved", 0)
+        for span in trace["spans"]:
+            node = span["node"]
+            _latencies[node].append(span["seconds"])
+            _counters[("seconds", node)] += span["seconds"]
+            _counters[("count", node)] += 1
+            _counters[("llm_calls", node)] += span["llm_calls"]
+            _counters[("prompt_tokens", node)] += span["prompt_tokens"]
+            _counters[("completion_tokens", node)] += span["completion_tokens"]
+
+    if trace_path:
+        if os.path.dirname(trace_path):
+            os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        with _lock, open(trace_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace) + "\n")
+
+
+def metrics_summary():
+    """
+    Latency percentiles over the latest METRICS_WINDOW spans.
+
+    Returns:
+        summary (dict): Per node, and for whole requests under 'request', the count, p50 and p95 in seconds.
+    """
+    with _lock:
+        latencies = {node: np.array(values) for node, values in _latencies.items() if values}
+    return {
+        node: {
+            "count": len(values),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+        }
+        for node, values in latencies.items()
+    }
+
+
+def render_metrics():
+    """Render the process metrics in the Prometheus text exposition format."""
+    summary = metrics_summary()
+    with _lock:
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP rag_node_latency_seconds Wall time of graph nodes and routing edges.",
+        "# TYPE rag_node_latency_seconds summary",
+    ]
+    nodes = sorted(node for node in summary if node != "request")
+    for node in nodes:
+        for quantile, label in (("p50", "0.5"), ("p95", "0.95")):
+            lines.append(f'rag_node_latency_seconds{{node="{node}",quantile="{label}"}} {summary[node][quantile]}')
+        lines.append(f'rag_node_latency_seconds_sum{{node="{node}"}} {counters.get(("seconds", node), 0.0)}')
+        lines.append(f'rag_node_latency_seconds_count{{node="{node}"}} {counters.get(("count", node), 0.0)}')
+    for name, help_text in (
+        ("llm_calls", "LLM calls made by graph nodes."),
+        ("prompt_tokens", "Prompt tokens sent by graph nodes."),
+        ("completion_tokens", "Completion tokens received by graph nodes."),
+    ):
+        lines.append(f"# HELP rag_node_{name}_total {help_text}")
+        lines.append(f"# TYPE rag_node_{name}_total counter")
+        for node in nodes:
+            lines.append(f'rag_node_{name}_total{{node="{node}"}} {counters.get((name, node), 0.0)}')
+
+    lines += ["# HELP rag_request_latency_seconds End-to-end wall time of requests.",
+              "# TYPE rag_request_latency_seconds summary"]
+    if "request" in summary:
+        lines.append(f'rag_request_latency_seconds{{quantile="0.5"}} {summary["request"]["p50"]}')
+        lines.append(f'rag_request_latency_seconds{{quantile="0.95"}} {summary["request"]["p95"]}')
+    lines.append(f"rag_request_latency_seconds_count {counters.get('requests', 0.0)}")
+    for name, help_text in (
+        ("requests", "Requests traced."),
+        ("retries", "Failed LLM calls that were retried."),
+        ("loops", "Query rewrites and regenerations."),
+        ("context_tokens", "Estimated document context tokens sent to the generation and its graders."),
+        ("context_tokens_saved", "Estimated context tokens removed by deduplication and the token budget."),
+    ):
+        lines += [f"# HELP rag_{name}_total {help_text}", f"# TYPE rag_{name}_total counter",
+                  f"rag_{name}_total {counters.get(name, 0.0)}"]
+    for name, (help_text, label, counts) in sorted(_labelled_counters.items()):
+        lines += [f"# HELP rag_{name}_total {help_text}", f"# TYPE rag_{name}_total counter"]
+        lines += [f'rag_{name}_total{{{label}="{key}"}} {float(value)}' for key, value in dict(counts).items()]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port):
+    """
+    Serve the metrics on http://0.0.0.0:<port>/metrics from a daemon thread.
+
+    The server is started once per process; later calls return the running server.
+    """
+    global _metrics_server
+    with _lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"Serving metrics on port {port}")
+    return _metrics_server
@@ -0,0 +1,61 @@
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+
+from .embeddings import get_embeddings
+from .local_vectorstore import LocalVectorStore
+
+
+load_dotenv()
+vector_store_backend = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+local_index_dir = os.getenv("LOCAL_INDEX_DIR", ".cache/local_index")
+local_index_dtype = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+local_index_search = os.getenv("LOCAL_INDEX_SEARCH", "exact")
+local_index_nprobe = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+
+@lru_cache(maxsize=None)
+def get_local_vector_store(index_name: str) -> LocalVectorStore:
+    """
+    Return the process-wide local vector store for an index.
+
+    Args:
+        index_name (str): Name of the index, used as a directory under LOCAL_INDEX_DIR.
+
+    Returns:
+        LocalVectorStore: Memory-mapped local VectorStore.
+    """
+    return LocalVectorStore(
+        os.path.join(local_index_dir, index_name),
+        get_embeddings("RETRIEVAL_DOCUMENT"),
+        dtype=local_index_dtype,
+        search_mode=local_index_search,
+        nprobe=local_index_nprobe,
+    )
+
+
+def get_vector_store(index_name: str):
+    """
+    Return the vector store of the backend selected by VECTOR_STORE_BACKEND.
+
+    Args:
+        index_name (str): Name of the index.
+
+    Returns:
+        VectorStore: Pinecone or local VectorStore.
+    """
+    if vector_store_backend == "local":
+        return get_local_vector_store(index_name)
+    from .pinecone_vectorstore import get_pinecone_vector_store
+
+    return get_pinecone_vector_store(index_name)
+
+
+def invalidate_vector_store(index_name: str):
+    """Drop the cached handle of an index so the next call rebuilds it."""
+    if vector_store_backend == "local":
+        get_local_vector_store.cache_clear()
+    else:
+        from .pinecone_vectorstore import invalidate_pinecone_vector_store
+
+        invalidate_pinecone_vector_store(index_name)
@@ -0,0 +1,114 @@
+from langchain_core.documents import Document
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from .news_dedup import canonicalize_url
+from .semantic_cache import classify_freshness
+
+
+load_dotenv()
+web_search_results = int(os.getenv("WEB_SEARCH_RESULTS", "3"))
+web_search_cache_ttls = {
+    "news": int(os.getenv("WEB_SEARCH_CACHE_TTL", "900")),
+    "default": int(os.getenv("WEB_SEARCH_CACHE_TTL", "900")),
+    "historical": int(os.getenv("WEB_SEARCH_CACHE_TTL_HISTORICAL", "86400")),
+}
+web_search_cache_max_entries = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "512"))
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_query(query):
+    """
+    Query text the cache is keyed on: lower-case and accent-free, without punctuation and
+    with whitespace collapsed. Word order is kept, "BIAT buys SFBT" is not "SFBT buys BIAT".
+    """
+    query = unicodedata.normalize("NFKD", query.lower())
+    query = "".join(c for c in query if not unicodedata.combining(c))
+    return " ".join(WORD.findall(query))
+
+
+class WebSearch:
+    """
+    Web search client shared by every request, with a TTL cache of results.
+
+    Results are cached per freshness class and normalized query, for the TTL of the
+    class in seconds, at most max_entries queries, least recently used first out. Each
+    result becomes its own Document.
+    """
+
+    def __init__(self, tool, ttls=web_search_cache_ttls, max_entries=web_search_cache_max_entries):
+        self.tool = tool
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or time.time() - entry[0] > self.ttls[key[0]]:
+                self._cache.pop(key, None)
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key, results):
+        with self._lock:
+            self._cache[key] = (time.time(), results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def search(self, query):
+        """
+        Search the web, answering from the cache when the same query was run recently.
+
+        Args:
+            query (str): Search query.
+
+        Returns:
+            list[Document]: One document per result with a distinct URL, in result order.
+        """
+        key = (classify_freshness(query, []), normalize_query(query))
+        results = self._lookup(key)
+        if results is None:
+            self.misses += 1
+            results = self.tool.invoke({"query": query})
+            # Failed searches come back as an error string and are not cached
+            if not isinstance(results, list):
+                print(f"Web search failed: {results}")
+                return []
+            self._store(key, results)
+        else:
+            self.hits += 1
+            print(f"---WEB SEARCH CACHE HIT ({self.hits} hits, {self.misses} misses)---")
+
+        documents, seen = [], set()
+        for result in results:
+            url = canonicalize_url(result["url"])
+            if url in seen:
+                continue
+            seen.add(url)
+            documents.append(Document(
+                page_content=result["content"],
+                metadata={"link": result["url"], "source": "web", "title": result.get("title", "")},
+            ))
+        return documents
+
+
+@lru_cache(maxsize=None)
+def get_web_search() -> WebSearch:
+    """Return the process-wide web search client."""
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    return WebSearch(TavilySearchResults(max_results=web_search_results))